@@ -2,6 +2,8 @@
 ASGI config for gatabank project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are served by v1.asgi.AsyncReadHandler on its bounded pool of worker
+threads, any other scope is passed on to Django's ASGI handler.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -13,4 +15,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gatabank.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from v1.asgi import AsyncReadHandler  # noqa: E402, needs the app registry loaded above
+from v1.pool import prewarm_database_pools  # noqa: E402
+
+application = AsyncReadHandler(django_application)
+
+prewarm_database_pools()
@@ -27,6 +27,9 @@ SECRET_KEY = 'y*1r2!g2rq3or2*6^*bjq2dav@%x5m3p^^k0q0(!vww22mnht6'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# 'production' serves JSON only, without the browsable and admin HTML renderers
+DJANGO_ENV = os.environ.get('DJANGO_ENV', 'development')
+
 ALLOWED_HOSTS = []
 
 
@@ -41,11 +44,15 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'phonenumber_field',
     'rest_framework',
+    'django_filters',
     'v1'
 ]
 
 MIDDLEWARE = [
+    'v1.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'v1.middleware.CompressionMiddleware',
+    'v1.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,18 +85,72 @@ WSGI_APPLICATION = 'gatabank.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
-DATABASES = {
+# threads serving requests in each ASGI worker process (V1_ASYNC); each can hold one
+# connection per database, so the MySQL pools never have fewer slots than this
+ASYNC_WORKERS = int(os.environ.get('ASYNC_READ_WORKERS', 16))
+
+DB_ENGINE = os.getenv('DB_ENGINE', 'mysql')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME') or os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
+    }
+    # local stand-ins: extra connections to the same file, i.e. replicas without lag
+    DB_REPLICA_HOSTS = ['sqlite'] * int(os.getenv('DB_SQLITE_REPLICAS', 0))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'v1.backends.mysql',
+            'OPTIONS': {
+                'database': os.getenv('DB_NAME'),
+                'user': os.getenv('DB_USER'),
+                'password': os.getenv('DB_PASSWORD'),
+                'host': 'gatabank-db',
+                'charset': 'utf8mb4'
+            },
+            # connections per worker process, see v1.backends.mysql
+            'POOL': {
+                'MAX_SIZE': max(int(os.getenv('DB_POOL_SIZE', 0)), ASYNC_WORKERS),
+                'MIN_SIZE': int(os.getenv('DB_POOL_PREWARM', 2)),
+                'TIMEOUT': 10,
+            },
+        }
+    }
+    # comma separated hosts of MySQL replicas of gatabank-db
+    DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+
+for index, host in enumerate(DB_REPLICA_HOSTS):
+    replica = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if 'OPTIONS' in replica:
+        replica['OPTIONS'] = dict(replica['OPTIONS'], host=host)
+    DATABASES['replica%d' % index] = replica
+
+DATABASE_ROUTERS = ['v1.routers.ReplicaRouter']
+
+# safe v1 requests read from these aliases; a client that writes reads from the primary
+# for STICKY_SECONDS, replicas lagging more than MAX_LAG seconds are skipped; token clients are
+# pinned in the PIN_CACHE alias, which must be shared by all workers (see CACHE_BACKEND) once there are ALIASES
+V1_REPLICAS = {
+    'ALIASES': ['replica%d' % index for index in range(len(DB_REPLICA_HOSTS))],
+    'STICKY_SECONDS': 10,
+    'PIN_CACHE': 'default',
+    'MAX_LAG': 5,
+    'CHECK_INTERVAL': 5,
+}
+
+# cache invalidation versions live in the cache_versions table; processes re-read them every
+# V1_VERSION_TIMEOUT seconds, or at once when CACHE_BACKEND points at a cache they share
+# (e.g. django.core.cache.backends.memcached.PyLibMCCache with CACHE_LOCATION=memcached:11211)
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'OPTIONS': {
-            'database': os.getenv('DB_NAME'),
-            'user': os.getenv('DB_USER'),
-            'password': os.getenv('DB_PASSWORD'),
-            'host': 'gatabank-db',
-            'charset': 'utf8mb4'
-        },
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
+V1_VERSION_TIMEOUT = int(os.getenv('CACHE_VERSION_TIMEOUT', 10))
 
 
 # Password validation
@@ -131,8 +192,12 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 REST_FRAMEWORK = {
+    # per client IP, for the anonymous batch schedule endpoint
+    'DEFAULT_THROTTLE_RATES': {
+        'schedules': '30/minute',
+    },
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'v1.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
@@ -143,14 +208,73 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.MultiPartParser',
     ),
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'v1.renderers.FastJSONRenderer',
+    ] + ([] if DJANGO_ENV == 'production' else [
         'rest_framework.renderers.AdminRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer'
-    ],
+    ]),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100
 }
 
+# shared cache for anonymous bank/card reads; BACKEND is 'lru' for an in-process LRU or a CACHES alias
+V1_RESPONSE_CACHE = {
+    'BACKEND': 'lru',
+    'MAX_ENTRIES': 2048,
+    'TIMEOUT': 300,
+}
+
+# brotli or gzip by the client's Accept-Encoding; responses smaller than MIN_SIZE bytes are sent uncompressed
+V1_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+}
+
+# banks/schedules/ with includeSchedule: most months, summed over the items, one request may ask for
+V1_SCHEDULE_MAX_MONTHS = 12000
+
+# seconds an authenticated user and its permissions are reused across requests
+V1_AUTH_CACHE_TIMEOUT = 60
+
+# password hashing process pool, WORKERS = 0 hashes in the request thread; at most
+# WORKERS + QUEUE hashes run at once, callers wait WAIT seconds for a slot before a 503
+V1_PASSWORD_HASHING = {
+    'WORKERS': int(os.environ.get('PASSWORD_HASHING_WORKERS', os.cpu_count() or 1)),
+    'QUEUE': 64,
+    'WAIT': 2,
+    'TIMEOUT': 30,
+    'ITERATIONS': int(os.environ.get('PASSWORD_HASHING_ITERATIONS', 0)) or None,
+}
+
+PASSWORD_HASHERS = [
+    'v1.hashing.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# ASGI serving (gatabank.asgi): requests that miss the in-memory paths run on WORKERS threads
+V1_ASYNC = {
+    'WORKERS': ASYNC_WORKERS,
+}
+
+# per-view histograms at /api/v1/metrics/ for staff and the bearer TOKEN, if set; SAMPLE_RATE of requests keep
+# their SQL, and those slower than SLOW_SECONDS are listed under slow_requests in /api/v1/stats/
+V1_METRICS = {
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+    'SLOW_SECONDS': float(os.environ.get('METRICS_SLOW_SECONDS', 0.5)),
+    'SAMPLE_RATE': float(os.environ.get('METRICS_SAMPLE_RATE', 0.1)),
+    'TRACES': 50,
+}
+
+# bank/card image variants made on upload: SIZES fit within (width, height), None keeps the
+# original size; each is saved in the original format plus FORMATS Pillow can write
+V1_IMAGES = {
+    'SIZES': {'thumb': (150, 100), 'card': (480, 300), 'full': None},
+    'FORMATS': ['webp', 'avif'],
+}
+
 PHONENUMBER_DB_FORMAT = 'NATIONAL'
 PHONENUMBER_DEFAULT_REGION = 'VN'
 AUTH_USER_MODEL = 'v1.User'
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gatabank.settings')
 
 application = get_wsgi_application()
+
+from v1.pool import prewarm_database_pools  # noqa: E402, needs the app registry loaded above
+
+prewarm_database_pools()
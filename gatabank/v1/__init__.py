@@ -0,0 +1 @@
+default_app_config = 'v1.apps.V1Config'
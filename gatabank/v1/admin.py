@@ -8,11 +8,19 @@ from .models import (
 from django.forms import ModelForm, PasswordInput
 
 class AbstractModelAdmin():
-    exclude = ('status','created_at', 'updated_at',)
+    exclude = ('created_at', 'updated_at',)
+
+    def get_queryset(self, request):
+        # deleted and inactive rows stay editable, so they can be restored
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
 
 @admin.register(City, District, Village)
 class AreaAdmin(AbstractModelAdmin, admin.ModelAdmin):
-    pass
+    list_filter = ('status',)
 
 class BankDiscountInline(AbstractModelAdmin, admin.TabularInline):
     model = BankDiscount
@@ -25,6 +33,7 @@ class BankRequirementInline(AbstractModelAdmin, admin.TabularInline):
 
 @admin.register(Bank)
 class BankAdmin(AbstractModelAdmin, admin.ModelAdmin):
+    list_filter = ('status',)
     inlines = [
         BankDiscountInline, BankFeeInline, BankRequirementInline
     ]
@@ -55,6 +64,7 @@ class UserForm(ModelForm):
 @admin.register(Card)
 class CardAdmin(AbstractModelAdmin, admin.ModelAdmin):
     list_display = ['name', 'image_tag',]
+    list_filter = ('status',)
     inlines = [
         CardBasicInline, CardBenefitInline, CardDiscountInline, CardFeeInline, CardRequirementInline
     ]
@@ -65,7 +75,7 @@ class UserAdmin(admin.ModelAdmin):
     form = UserForm
 
     def get_queryset(self, request):
-        return super().get_queryset(request).filter(is_staff=True)
+        return self.model.all_objects.filter(is_staff=True)
 
     def save_model(self, request, obj, form, change):
         obj.is_staff = True
@@ -89,7 +99,7 @@ class CollaboratorAdmin(admin.ModelAdmin):
     form = UserForm
 
     def get_queryset(self, request):
-        return super().get_queryset(request).filter(is_staff=False)
+        return self.model.all_objects.filter(is_staff=False)
 
     def save_model(self, request, obj, form, change):
         obj.is_staff = False
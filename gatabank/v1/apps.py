@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class V1Config(AppConfig):
     name = 'v1'
+
+    def ready(self):
+        from v1 import signals  # noqa: F401
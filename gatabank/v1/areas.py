@@ -0,0 +1,90 @@
+import gzip
+import hashlib
+from collections import defaultdict
+from v1.renderers import FastJSONRenderer
+from v1.caches import VersionedSnapshot
+from v1.models import City, District, Village
+from v1.serializers import CitySerializer, DistrictSerializer, VillageSerializer
+
+class AreaIndex(object):
+    """
+    Serialized City -> District -> Village hierarchy keyed by parent id.
+    """
+
+    def __init__(self, cities, districts, villages):
+        self.cities = cities
+        self.districts_by_city = self._group(districts, 'city')
+        self.villages_by_district = self._group(villages, 'district')
+        self.city_ids = set(city['id'] for city in cities)
+        self.district_cities = {district['id']: district['city'] for district in districts}
+        self.village_districts = {village['id']: village['district'] for village in villages}
+        self._tree = None
+
+    @staticmethod
+    def _group(rows, key):
+        groups = defaultdict(list)
+        for row in rows:
+            groups[row[key]].append(row)
+        return dict(groups)
+
+    def districts(self, city_id):
+        return self.districts_by_city.get(city_id, [])
+
+    def villages(self, district_id):
+        return self.villages_by_district.get(district_id, [])
+
+    def resolve(self, city_id=None, district_id=None, village_id=None):
+        """
+        (city_id, district_id, village_id) completed from the most specific code given,
+        raising ValueError for unknown codes or codes from different branches.
+        """
+        if village_id:
+            if village_id not in self.village_districts:
+                raise ValueError('Unknown village: %s' % village_id)
+            if district_id and district_id != self.village_districts[village_id]:
+                raise ValueError('Village %s is not in district %s' % (village_id, district_id))
+            district_id = self.village_districts[village_id]
+        if district_id:
+            if district_id not in self.district_cities:
+                raise ValueError('Unknown district: %s' % district_id)
+            if city_id and city_id != self.district_cities[district_id]:
+                raise ValueError('District %s is not in city %s' % (district_id, city_id))
+            city_id = self.district_cities[district_id]
+        if city_id and city_id not in self.city_ids:
+            raise ValueError('Unknown city: %s' % city_id)
+        return city_id or None, district_id or None, village_id or None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = AreaTree(self)
+        return self._tree
+
+class AreaTree(object):
+    """
+    The full hierarchy rendered once to JSON and gzip bytes, with strong ETags
+    for both encodings.
+    """
+
+    def __init__(self, index):
+        tree = [
+            dict(city, districts=[
+                dict(district, villages=index.villages(district['id']))
+                for district in index.districts(city['id'])
+            ])
+            for city in index.cities
+        ]
+        self.content = FastJSONRenderer().render(tree)
+        self.gzip_content = gzip.compress(self.content, compresslevel=9)
+        digest = hashlib.sha1(self.content).hexdigest()
+        self.etag = '"%s"' % digest
+        self.gzip_etag = '"%s-gzip"' % digest
+
+def build_area_index():
+    return AreaIndex(
+        list(CitySerializer(City.objects.order_by('id'), many=True).data),
+        list(DistrictSerializer(District.objects.order_by('id'), many=True).data),
+        list(VillageSerializer(Village.objects.order_by('id'), many=True).data),
+    )
+
+area_index = VersionedSnapshot('areas', build_area_index)
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core import signals
+from django.core.exceptions import RequestAborted
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.base import BaseHandler
+from django.urls import Resolver404, get_resolver, set_script_prefix
+from django.utils.module_loading import import_string
+from v1 import metrics
+
+def get_config():
+    config = {
+        'WORKERS': 16,
+        'PREFIX': '/api/v1/',
+        'RESPONSE_MIDDLEWARE': [
+            'django.middleware.clickjacking.XFrameOptionsMiddleware',
+            'v1.middleware.CompressionMiddleware',
+            'django.middleware.security.SecurityMiddleware',
+        ],
+    }
+    config.update(getattr(settings, 'V1_ASYNC', {}))
+    return config
+
+class AsyncReadHandler(ASGIHandler):
+    """
+    ASGI entry point for HTTP. GET/HEAD/OPTIONS requests under PREFIX are answered on the
+    event loop when a view can serve them from memory (a response cache hit, the area
+    tree); every other request runs through the regular synchronous middleware and views
+    on a pool of WORKERS threads, which also bounds the number of database connections.
+    Responses are sent from the loop, so slow clients hold no thread, except streaming
+    ones, which are iterated on the thread that owns their database connection. Other
+    scope types go to `application`, Django's own ASGI handler.
+    """
+
+    def __init__(self, application=None, executor=None):
+        BaseHandler.__init__(self)
+        self.load_middleware()
+        config = get_config()
+        self.application = application or ASGIHandler()
+        self.prefix = config['PREFIX']
+        self.executor = executor or ThreadPoolExecutor(config['WORKERS'], thread_name_prefix='v1-read')
+        # only their process_response runs, in this order, on responses served from memory
+        self.response_middleware = [import_string(path)(self.get_response)
+                                    for path in config['RESPONSE_MIDDLEWARE']]
+
+    def is_read(self, scope):
+        return (scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD', 'OPTIONS')
+                and scope['path'].startswith(self.prefix))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.application(scope, receive, send)
+            return
+        try:
+            body_file = await self.read_body(receive)
+        except RequestAborted:
+            return
+        script_prefix = self.get_script_prefix(scope)
+        response = self.memory_response(scope, body_file) if self.is_read(scope) else None
+        if response is not None:
+            body = response.content
+        else:
+            loop = asyncio.get_event_loop()
+            response, body = await loop.run_in_executor(
+                self.executor, self.thread_response, scope, body_file, script_prefix, send, loop)
+            if body is None:
+                # already streamed by the worker
+                return
+        await self.send_body(response, body, send)
+
+    def memory_response(self, scope, body_file):
+        if scope['method'] == 'OPTIONS':
+            return None
+        started = time.perf_counter()
+        request, error_response = self.create_request(scope, body_file)
+        if request is None:
+            return None
+        try:
+            match = get_resolver().resolve(request.path_info)
+        except Resolver404:
+            return None
+        request.resolver_match = match
+        serve = getattr(getattr(match.func, 'cls', None), 'memory_response', None)
+        try:
+            response = serve(request, match.kwargs) if serve is not None else None
+            if response is None:
+                return None
+            for middleware in self.response_middleware:
+                response = middleware.process_response(request, response)
+        except Exception:
+            # e.g. DisallowedHost from the cache key: the full handler turns it into the right response
+            return None
+        metrics.observe(request, response, time.perf_counter() - started)
+        return response
+
+    def thread_response(self, scope, body_file, script_prefix, send=None, loop=None):
+        """
+        (response, body) of a request run on a worker thread; body is None when the
+        response was streamed to `send` from this thread.
+        """
+        set_script_prefix(script_prefix)
+        signals.request_started.send(sender=self.__class__, scope=scope)
+        request, response = self.create_request(scope, body_file)
+        if request is not None:
+            response = self.get_response(request)
+        response._handler_class = self.__class__
+        try:
+            if response.streaming and send is not None:
+                self.stream_body(response, send, loop)
+                body = None
+            else:
+                body = b''.join(response) if response.streaming else response.content
+        finally:
+            # fires request_finished, which releases this thread's database connection
+            response.close()
+        return response, body
+
+    def stream_body(self, response, send, loop):
+        def call(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+        call({'type': 'http.response.start', 'status': response.status_code,
+              'headers': self.response_headers(response)})
+        for part in response:
+            for chunk, last in self.chunk_bytes(part):
+                call({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        call({'type': 'http.response.body'})
+
+    @staticmethod
+    def response_headers(response):
+        headers = []
+        for header, value in response.items():
+            headers.append((header.encode('ascii'), value.encode('latin1')))
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+        return headers
+
+    async def send_body(self, response, body, send):
+        await send({'type': 'http.response.start', 'status': response.status_code,
+                    'headers': self.response_headers(response)})
+        for chunk, last in self.chunk_bytes(body):
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': not last})
@@ -0,0 +1,49 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from v1.caches import VERSION_KEY, get_version
+from v1.routers import primary_reads
+
+AUTH_USER_KEY = 'v1:auth:%s:%s:%s:%s'
+# bumped for group/permission changes that can affect any user
+PERMISSIONS_VERSION = 'permissions'
+
+def user_version_name(user_id):
+    return 'users:%s' % user_id
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication keeping the authenticated user, with its permission caches already
+    filled, in the Django cache for V1_AUTH_CACHE_TIMEOUT seconds or until the token expires.
+    Entries are keyed by user id, token jti and the user and permission versions that
+    v1.signals bumps, so saves and group changes take effect on the next request.
+    """
+
+    def get_cache_key(self, user_id, validated_token):
+        names = [user_version_name(user_id), PERMISSIONS_VERSION]
+        versions = cache.get_many([VERSION_KEY % name for name in names])
+        user_version, permissions_version = [
+            versions.get(VERSION_KEY % name) or get_version(name) for name in names]
+        return AUTH_USER_KEY % (user_id, validated_token.get(api_settings.JTI_CLAIM),
+                                user_version, permissions_version)
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super(CachedJWTAuthentication, self).get_user(validated_token)
+        key = self.get_cache_key(user_id, validated_token)
+        user = cache.get(key)
+        if user is None:
+            # cached under the current versions, so read what the primary has now
+            with primary_reads():
+                user = super(CachedJWTAuthentication, self).get_user(validated_token)
+                user.get_all_permissions()
+            timeout = getattr(settings, 'V1_AUTH_CACHE_TIMEOUT', 60)
+            expires = validated_token.get('exp')
+            if expires is not None:
+                timeout = min(timeout, int(expires - time.time()))
+            if timeout > 0:
+                cache.set(key, user, timeout)
+        return user
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db.backends.mysql.base import Database, DatabaseWrapper as MySQLDatabaseWrapper
+from v1.pool import Pool, get_pool
+
+class DatabaseWrapper(MySQLDatabaseWrapper):
+    """
+    MySQL backend whose connections come from a per-process pool, configured by the
+    POOL dict of the database settings (MAX_SIZE, by default the number of V1_ASYNC
+    worker threads, MIN_SIZE, TIMEOUT). Closing a
+    connection, which Django does after every request while CONN_MAX_AGE is 0, returns
+    it to the pool; a checkout pings it first and replaces it if the server dropped it.
+    """
+
+    def get_pool(self):
+        workers = getattr(settings, 'V1_ASYNC', {}).get('WORKERS', 16)
+        config = {'MAX_SIZE': workers, 'MIN_SIZE': 2, 'TIMEOUT': 10}
+        config.update(self.settings_dict.get('POOL', {}))
+        conn_params = self.get_connection_params()
+        def factory():
+            return Pool(self.alias, lambda: Database.connect(**conn_params), validate=self.ping,
+                        max_size=config['MAX_SIZE'], min_size=config['MIN_SIZE'], timeout=config['TIMEOUT'])
+        return get_pool(self.alias, factory)
+
+    @staticmethod
+    def ping(connection):
+        try:
+            connection.ping()
+        except Database.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        return self.get_pool().checkout()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        discard = self.in_atomic_block
+        if not discard and not self.autocommit:
+            try:
+                self.connection.rollback()
+            except Database.Error:
+                discard = True
+        self.get_pool().checkin(self.connection, discard=discard)
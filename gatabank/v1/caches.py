@@ -0,0 +1,249 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.functional import cached_property
+from django.utils.http import parse_http_date_safe
+from v1 import stats
+from v1.models import CacheVersion
+from v1.routers import primary_reads
+
+VERSION_KEY = 'v1:version:%s'
+# token of a name that was never bumped, so reads never have to write a row
+INITIAL_VERSION = 'initial'
+
+def get_version_timeout():
+    # seconds a process trusts its cached copy of a version before re-reading the table
+    return getattr(settings, 'V1_VERSION_TIMEOUT', 10)
+
+def read_version(name):
+    token = CacheVersion.objects.using(DEFAULT_DB_ALIAS).filter(name=name).values_list('token', flat=True).first()
+    return INITIAL_VERSION if token is None else token
+
+def get_version(name):
+    """
+    Token for `name` from the cache, falling back to the cache_versions table on the
+    primary, which only bump_version writes.
+    """
+    key = VERSION_KEY % name
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, read_version(name), get_version_timeout())
+        version = cache.get(key)
+    return version
+
+def peek_version(name):
+    """
+    The cached token for `name`, None when only the table has it.
+    """
+    return cache.get(VERSION_KEY % name)
+
+def set_version(name):
+    token = uuid.uuid4().hex
+    CacheVersion.objects.using(DEFAULT_DB_ALIAS).update_or_create(name=name, defaults={'token': token})
+    cache.set(VERSION_KEY % name, token, get_version_timeout())
+
+def bump_version(name):
+    set_version(name)
+    connection = transaction.get_connection(DEFAULT_DB_ALIAS)
+    if connection.in_atomic_block:
+        # again once committed: what was built from the uncommitted state is dropped too
+        transaction.on_commit(lambda: set_version(name), using=DEFAULT_DB_ALIAS)
+
+def versions_in_process():
+    """
+    Whether version tokens live in this process, so reading them never blocks on I/O.
+    """
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+class VersionedSnapshot(object):
+    """
+    Process-local copy of data built by `builder`, rebuilt whenever the shared
+    version stored in the Django cache for `name` changes.
+    """
+
+    def __init__(self, name, builder):
+        self.name = name
+        self.builder = builder
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+
+    def get(self):
+        version = get_version(self.name)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    with primary_reads():
+                        self._value = self.builder()
+                    self._version = version
+        return self._value
+
+    @property
+    def version(self):
+        return get_version(self.name)
+
+    def is_current(self):
+        # cache only, peek() is used where a table read would block the event loop
+        return self._version is not None and self._version == peek_version(self.name)
+
+    def peek(self):
+        """
+        The current value, or None when it is missing or stale and would have to be rebuilt.
+        """
+        return self._value if self.is_current() else None
+
+    def invalidate(self):
+        bump_version(self.name)
+
+class LRUCache(object):
+    """
+    Minimal thread-safe in-process LRU with the get/set/clear subset of the Django cache API.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class CachedResponse(object):
+    HEADERS = ('Allow', 'Vary', 'ETag', 'Last-Modified', 'Cache-Control', 'Content-Language')
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.content = response.content
+        self.content_type = response['Content-Type']
+        self.headers = [(name, response[name]) for name in self.HEADERS if response.has_header(name)]
+
+    def to_response(self, request):
+        headers = dict(self.headers)
+        last_modified = headers.get('Last-Modified')
+        response = get_conditional_response(
+            request, etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(last_modified) if last_modified else None)
+        if response is None:
+            response = HttpResponse(self.content, content_type=self.content_type, status=self.status_code)
+        for name, value in self.headers:
+            response[name] = value
+        return response
+
+class ResponseCache(object):
+    """
+    Rendered responses to anonymous GET requests for one resource namespace, keyed by
+    absolute URI (scheme, host, path and query string) and Accept header. List entries
+    hang off a namespace version and detail entries off a per-object version, so a change
+    to one object only drops the lists and that object's own entries.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+
+    @cached_property
+    def config(self):
+        config = {'BACKEND': 'lru', 'MAX_ENTRIES': 2048, 'TIMEOUT': 300}
+        config.update(getattr(settings, 'V1_RESPONSE_CACHE', {}))
+        return config
+
+    @cached_property
+    def backend(self):
+        if self.config['BACKEND'] == 'lru':
+            return LRUCache(self.config['MAX_ENTRIES'])
+        return caches[self.config['BACKEND']]
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def is_cacheable(request):
+        return request.method in ('GET', 'HEAD') and 'HTTP_AUTHORIZATION' not in request.META
+
+    def get_key(self, request, object_id=None, peek=False):
+        """
+        Cache key for `request`; with `peek`, None when a version is not cached yet.
+        """
+        read = peek_version if peek else get_version
+        version = read(self.namespace)
+        if object_id is not None:
+            version = read('%s:%s' % (self.namespace, object_id))
+        if version is None:
+            return None
+        request_key = '%s|%s' % (request.build_absolute_uri(), request.META.get('HTTP_ACCEPT', ''))
+        return 'v1:response:%s:%s:%s:%s' % (self.namespace, object_id or '', version,
+                                            hashlib.sha1(request_key.encode('utf-8')).hexdigest())
+
+    @property
+    def in_process(self):
+        return versions_in_process() and isinstance(self.backend, (LRUCache, LocMemCache))
+
+    def get(self, key, count_miss=True):
+        entry = self.backend.get(key)
+        if entry is not None or count_miss:
+            self.count('misses' if entry is None else 'hits')
+        return entry
+
+    def set(self, key, response):
+        self.backend.set(key, CachedResponse(response), self.config['TIMEOUT'])
+        self.count('stores')
+
+    def invalidate(self, object_id=None):
+        bump_version(self.namespace)
+        if object_id is not None:
+            bump_version('%s:%s' % (self.namespace, object_id))
+        self.count('invalidations')
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = float(stats['hits']) / lookups if lookups else 0.0
+        if isinstance(self.backend, LRUCache):
+            stats['entries'] = len(self.backend)
+        return stats
+
+response_caches = {
+    'areas': ResponseCache('areas'),
+    'banks': ResponseCache('banks'),
+    'cards': ResponseCache('cards'),
+}
+
+stats.register('response_cache', lambda: {name: cache.stats() for name, cache in response_caches.items()})
@@ -0,0 +1,230 @@
+"""
+Conversion of text uuid primary keys, and the foreign keys pointing at them, to the
+BINARY(16) columns of v1.fields.CompactUUIDField on MySQL, in phases that keep the
+tables writable:
+
+  prepare   add a `<column>__bin` shadow column next to every converted column and
+            triggers that fill it on INSERT and UPDATE
+  backfill  fill the shadow columns of existing rows, `batch_size` rows per UPDATE
+  swap      drop the foreign key constraints, rename the shadow columns into place
+            with in-place ALTERs that rebuild the primary key and the indexes using
+            them, then add the constraints back
+  cleanup   copy keys written between the last trigger and the swap, drop the old
+            `<column>__old` text columns
+
+Every phase only does what is left for it, so each can be rerun after a failure.
+"""
+import time
+from collections import OrderedDict
+
+SUFFIX_NEW = '__bin'
+SUFFIX_OLD = '__old'
+COMPACT_TYPE = 'binary(16)'
+
+def get_plan(models):
+    """
+    OrderedDict of table: (primary key column, [columns to convert]) for the primary
+    keys of `models` and every foreign key pointing at them.
+    """
+    plan = OrderedDict()
+    def add(model, column):
+        plan.setdefault(model._meta.db_table, (model._meta.pk.column, []))[1].append(column)
+    for model in models:
+        add(model, model._meta.pk.column)
+        for field in model._meta.get_fields(include_hidden=True):
+            if field.auto_created and not field.concrete and (field.one_to_many or field.one_to_one):
+                add(field.related_model, field.field.column)
+    return plan
+
+def get_columns(cursor, table):
+    cursor.execute('SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE FROM information_schema.COLUMNS '
+                   'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [table])
+    return {name: (column_type.lower(), nullable == 'YES') for name, column_type, nullable in cursor.fetchall()}
+
+def column_state(columns, column):
+    if columns.get(column, ('',))[0] == COMPACT_TYPE:
+        return 'swapped' if column + SUFFIX_OLD in columns else 'done'
+    return 'prepared' if column + SUFFIX_NEW in columns else 'text'
+
+def status(connection, plan):
+    result = OrderedDict()
+    with connection.cursor() as cursor:
+        for table, (pk, columns) in plan.items():
+            existing = get_columns(cursor, table)
+            result[table] = OrderedDict((column, column_state(existing, column)) for column in columns)
+    return result
+
+def unhex(expression):
+    return "UNHEX(REPLACE(%s, '-', ''))" % expression
+
+def trigger_names(table):
+    return '%s_compact_ids_insert' % table, '%s_compact_ids_update' % table
+
+def drop_triggers(cursor, quote, table):
+    for name in trigger_names(table):
+        cursor.execute('DROP TRIGGER IF EXISTS %s' % quote(name))
+
+def prepare(connection, plan, log=None):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for table, (pk, columns) in plan.items():
+            existing = get_columns(cursor, table)
+            pending = [column for column in columns if column_state(existing, column) in ('text', 'prepared')]
+            if not pending:
+                continue
+            missing = [column for column in pending if column_state(existing, column) == 'text']
+            if missing:
+                cursor.execute('ALTER TABLE %s %s, ALGORITHM=INPLACE, LOCK=NONE' % (quote(table), ', '.join(
+                    'ADD COLUMN %s BINARY(16) NULL' % quote(column + SUFFIX_NEW) for column in missing)))
+            assignments = ', '.join('NEW.%s = %s' % (quote(column + SUFFIX_NEW), unhex('NEW.' + quote(column)))
+                                    for column in pending)
+            drop_triggers(cursor, quote, table)
+            for name, event in zip(trigger_names(table), ('INSERT', 'UPDATE')):
+                cursor.execute('CREATE TRIGGER %s BEFORE %s ON %s FOR EACH ROW SET %s' % (
+                    quote(name), event, quote(table), assignments))
+            if log:
+                log('%s: prepared %s' % (table, ', '.join(pending)))
+
+def backfill(connection, plan, batch_size=1000, sleep=0, log=None):
+    quote = connection.ops.quote_name
+    total = 0
+    with connection.cursor() as cursor:
+        for table, (pk, columns) in plan.items():
+            existing = get_columns(cursor, table)
+            pending = [column for column in columns if column_state(existing, column) == 'prepared']
+            if not pending:
+                continue
+            assignments = ', '.join('%s = %s' % (quote(column + SUFFIX_NEW), unhex(quote(column)))
+                                    for column in pending)
+            updated, last = 0, None
+            while True:
+                # keyset batches: (last, upper] by primary key, the final one open ended
+                cursor.execute('SELECT %s FROM %s %s ORDER BY %s LIMIT 1 OFFSET %d' % (
+                    quote(pk), quote(table), '' if last is None else 'WHERE %s > %%s' % quote(pk), quote(pk),
+                    batch_size - 1), [] if last is None else [last])
+                row = cursor.fetchone()
+                bounds, params = [], []
+                if last is not None:
+                    bounds.append('%s > %%s' % quote(pk))
+                    params.append(last)
+                if row is not None:
+                    bounds.append('%s <= %%s' % quote(pk))
+                    params.append(row[0])
+                cursor.execute('UPDATE %s SET %s%s' % (quote(table), assignments,
+                               ' WHERE ' + ' AND '.join(bounds) if bounds else ''), params)
+                updated += cursor.rowcount
+                if row is None:
+                    break
+                last = row[0]
+                if sleep:
+                    time.sleep(sleep)
+            total += updated
+            if log:
+                log('%s: backfilled %d rows' % (table, updated))
+    return total
+
+def get_constraints(cursor, plan):
+    """
+    (table, name, column, referenced table, referenced column) of the foreign key
+    constraints on converted columns.
+    """
+    cursor.execute('SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME '
+                   'FROM information_schema.KEY_COLUMN_USAGE '
+                   'WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL')
+    return [row for row in cursor.fetchall() if row[0] in plan and row[2] in plan[row[0]][1]]
+
+def get_indexes(cursor, table):
+    """
+    OrderedDict of secondary index name: (unique, [(column, prefix length)]).
+    """
+    cursor.execute('SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME, SUB_PART FROM information_schema.STATISTICS '
+                   'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME != %s '
+                   'ORDER BY INDEX_NAME, SEQ_IN_INDEX', [table, 'PRIMARY'])
+    indexes = OrderedDict()
+    for name, non_unique, column, sub_part in cursor.fetchall():
+        indexes.setdefault(name, (not non_unique, []))[1].append((column, sub_part))
+    return indexes
+
+def swap(connection, plan, log=None):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        constraints = get_constraints(cursor, plan)
+        for table, name, column, referenced_table, referenced_column in constraints:
+            # logged, a rerun after a failure further down no longer finds them
+            if log:
+                log('%s: dropping %s (%s) REFERENCES %s (%s)' % (table, name, column, referenced_table, referenced_column))
+            cursor.execute('ALTER TABLE %s DROP FOREIGN KEY %s' % (quote(table), quote(name)))
+        for table, (pk, columns) in plan.items():
+            existing = get_columns(cursor, table)
+            pending = [column for column in columns if column_state(existing, column) == 'prepared']
+            drop_triggers(cursor, quote, table)
+            if not pending:
+                continue
+            # rows written after the backfill and before the triggers went away
+            cursor.execute('UPDATE %s SET %s WHERE %s' % (quote(table), ', '.join(
+                '%s = %s' % (quote(column + SUFFIX_NEW), unhex(quote(column))) for column in pending), ' OR '.join(
+                '(%s IS NULL AND %s IS NOT NULL)' % (quote(column + SUFFIX_NEW), quote(column)) for column in pending)))
+            clauses = []
+            if pk in pending:
+                clauses.append('DROP PRIMARY KEY')
+            for column in pending:
+                column_type, nullable = existing[column]
+                clauses.append('CHANGE COLUMN %s %s %s NULL' % (quote(column), quote(column + SUFFIX_OLD), column_type))
+                clauses.append('CHANGE COLUMN %s %s BINARY(16) %s' % (
+                    quote(column + SUFFIX_NEW), quote(column), 'NULL' if nullable and column != pk else 'NOT NULL'))
+            # indexes follow a renamed column, so the ones on the text keys are rebuilt
+            for name, (unique, parts) in get_indexes(cursor, table).items():
+                if any(column in pending for column, sub_part in parts):
+                    clauses.append('DROP INDEX %s' % quote(name))
+                    clauses.append('ADD %sINDEX %s (%s)' % ('UNIQUE ' if unique else '', quote(name), ', '.join(
+                        quote(column) + ('(%d)' % sub_part if sub_part else '') for column, sub_part in parts)))
+            if pk in pending:
+                clauses.append('ADD PRIMARY KEY (%s)' % quote(pk))
+            cursor.execute('ALTER TABLE %s %s, ALGORITHM=INPLACE, LOCK=NONE' % (quote(table), ', '.join(clauses)))
+            if log:
+                log('%s: swapped %s' % (table, ', '.join(pending)))
+        # in place, without re-reading the tables, while checks are off
+        cursor.execute('SET foreign_key_checks = 0')
+        try:
+            for table, name, column, referenced_table, referenced_column in constraints:
+                cursor.execute('ALTER TABLE %s ADD CONSTRAINT %s FOREIGN KEY (%s) REFERENCES %s (%s)' % (
+                    quote(table), quote(name), quote(column), quote(referenced_table), quote(referenced_column)))
+        finally:
+            cursor.execute('SET foreign_key_checks = 1')
+
+def cleanup(connection, plan, log=None):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for table, (pk, columns) in plan.items():
+            existing = get_columns(cursor, table)
+            swapped = [column for column in columns if column_state(existing, column) == 'swapped']
+            if not swapped:
+                continue
+            for column in swapped:
+                if column != pk:
+                    cursor.execute('UPDATE %s SET %s = %s WHERE %s IS NULL AND %s IS NOT NULL' % (
+                        quote(table), quote(column), unhex(quote(column + SUFFIX_OLD)), quote(column),
+                        quote(column + SUFFIX_OLD)))
+            cursor.execute('ALTER TABLE %s %s, ALGORITHM=INPLACE, LOCK=NONE' % (quote(table), ', '.join(
+                'DROP COLUMN %s' % quote(column + SUFFIX_OLD) for column in swapped)))
+            if log:
+                log('%s: dropped %s' % (table, ', '.join(column + SUFFIX_OLD for column in swapped)))
+
+PHASES = OrderedDict([('prepare', prepare), ('backfill', backfill), ('swap', swap), ('cleanup', cleanup)])
+
+def convert(schema_editor, models, field):
+    """
+    Migration entry point: run every phase that is left on MySQL, elsewhere alter the
+    primary keys of `models` to `field` (a CompactUUIDField) with the schema editor.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'mysql':
+        for model in models:
+            new_field = field.clone()
+            new_field.set_attributes_from_name(model._meta.pk.name)
+            new_field.model = model
+            schema_editor.alter_field(model, model._meta.pk, new_field)
+        return
+    plan = get_plan(models)
+    for phase in PHASES.values():
+        phase(connection, plan)
@@ -0,0 +1,116 @@
+from collections import OrderedDict, defaultdict
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.fields.reverse_related import ForeignObjectRel
+from rest_framework import serializers, relations
+from rest_framework.settings import api_settings
+
+class Unsupported(Exception):
+    pass
+
+class CompiledSerializer(object):
+    """
+    Read-only twin of a bound ModelSerializer that renders rows straight from `.values()`,
+    loading every nested list with one query per relation and grouping it in Python.
+    It produces the same output as the serializer it was compiled from.
+    """
+
+    def __init__(self, serializer, request=None):
+        self.model = serializer.Meta.model
+        self.request = request
+        self.pk = self.model._meta.pk.attname
+        self.columns = []
+        self.nested = []
+        # (output name, attname, converter, nested index) in serializer field order
+        self.layout = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self.layout.append((name, None, None, len(self.nested)))
+                self.nested.append(self._compile_nested(name, field))
+            else:
+                column = self._compile_field(name, field)
+                self.layout.append(column + (None,))
+                self.columns.append(column)
+        self.attnames = list(OrderedDict.fromkeys([self.pk] + [column[1] for column in self.columns]))
+
+    def _compile_field(self, name, field):
+        if isinstance(field, relations.ManyRelatedField) or '.' in field.source or field.source == '*':
+            raise Unsupported(name)
+        try:
+            model_field = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise Unsupported(name)
+        if model_field.is_relation:
+            if not isinstance(field, relations.PrimaryKeyRelatedField) or field.pk_field is not None:
+                raise Unsupported(name)
+            return name, model_field.attname, None
+        if isinstance(field, serializers.FileField):
+            return name, model_field.attname, self._file_converter(field, model_field)
+        return name, model_field.attname, field.to_representation
+
+    def _compile_nested(self, name, field):
+        try:
+            relation = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise Unsupported(name)
+        if not isinstance(relation, ForeignObjectRel) or relation.many_to_many:
+            raise Unsupported(name)
+        child = CompiledSerializer(field.child, self.request)
+        fk = relation.field.attname
+        if fk not in child.attnames:
+            child.attnames.append(fk)
+        return name, child, fk
+
+    def _file_converter(self, field, model_field):
+        storage = model_field.storage
+        request = self.request
+        use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+        def convert(value):
+            if not value:
+                return None
+            if not use_url:
+                return value
+            url = storage.url(value)
+            return request.build_absolute_uri(url) if request is not None else url
+        return convert
+
+    def values(self, queryset):
+        return queryset.prefetch_related(None).values(*self.attnames)
+
+    def serialize(self, rows):
+        rows = list(rows)
+        children = []
+        for name, child, fk in self.nested:
+            ids = [row[self.pk] for row in rows]
+            grouped = defaultdict(list)
+            if ids:
+                child_rows = child.values(child.model._default_manager.filter(**{'%s__in' % fk: ids}))
+                for child_row, data in zip(*child.serialize_rows(child_rows)):
+                    grouped[child_row[fk]].append(data)
+            children.append((name, grouped))
+        data = []
+        for row in rows:
+            item = OrderedDict()
+            for name, attname, convert, nested in self.layout:
+                if nested is None:
+                    value = row[attname]
+                    item[name] = value if value is None or convert is None else convert(value)
+                else:
+                    item[name] = children[nested][1].get(row[self.pk], [])
+            data.append(item)
+        return data
+
+    def serialize_rows(self, rows):
+        rows = list(rows)
+        return rows, self.serialize(rows)
+
+def compile_serializer(serializer):
+    """
+    CompiledSerializer for a bound serializer, or None when one of its fields cannot be read
+    from `.values()` and the regular serializer has to be used.
+    """
+    try:
+        return CompiledSerializer(serializer, serializer.context.get('request'))
+    except Unsupported:
+        return None
@@ -1,16 +1,13 @@
 from enum import Enum
-import inspect
 
 class ChoiceEnum(Enum):
     @classmethod
     def choices(cls):
-        # get all members of the class
-        members = inspect.getmembers(cls, lambda m: not(inspect.isroutine(m)))
-        # filter down to just properties
-        props = [m for m in members if not(m[0][:2] == '__')]
-        # format into django choice tuple
-        choices = tuple([(str(p[1].value), p[0]) for p in props])
-        return choices
+        # django choice tuples, by member name as inspect.getmembers used to list them;
+        # built once per enum since every model field and form asks for them
+        if '_choices' not in cls.__dict__:
+            cls._choices = tuple((str(member.value), name) for name, member in sorted(cls.__members__.items()))
+        return cls._choices
 
 class Status(ChoiceEnum):
     ACTIVE = 'ACTIVE'
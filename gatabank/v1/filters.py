@@ -0,0 +1,124 @@
+from collections import OrderedDict, defaultdict
+from django.db.models import Count, OuterRef, Q, Subquery
+from django_filters import rest_framework as filters
+from django_filters.constants import EMPTY_VALUES
+from v1.enum import Status
+from v1.models import Card, CardBasic, CardRequirement
+
+## CARD
+# numeric attributes a card can be searched, sorted and faceted on, by the child table holding them
+CARD_NUMERIC_FIELDS = OrderedDict([
+    ('yearlyFee', CardBasic),
+    ('interest', CardBasic),
+    ('interestFreeDay', CardBasic),
+    ('averageRefund', CardBasic),
+    ('freeAirportLounge', CardBasic),
+    ('incomeRequirement', CardRequirement),
+    ('age', CardRequirement),
+])
+
+# (label, lower bound, upper bound) buckets, bounds are inclusive and None is open
+CARD_FACET_BUCKETS = OrderedDict([
+    ('yearlyFee', [
+        ('0', 0, 0), ('1-500000', 1, 500000), ('500001-1000000', 500001, 1000000),
+        ('1000001+', 1000001, None),
+    ]),
+    ('interest', [('0-20', 0, 20), ('21-25', 21, 25), ('26-30', 26, 30), ('31+', 31, None)]),
+    ('interestFreeDay', [('0-45', 0, 45), ('46-55', 46, 55), ('56+', 56, None)]),
+    ('averageRefund', [('0', 0, 0), ('1-5', 1, 5), ('6+', 6, None)]),
+    ('freeAirportLounge', [('0', 0, 0), ('1-4', 1, 4), ('5+', 5, None)]),
+    ('incomeRequirement', [
+        ('0-5000000', 0, 5000000), ('5000001-10000000', 5000001, 10000000),
+        ('10000001-20000000', 10000001, 20000000), ('20000001+', 20000001, None),
+    ]),
+    ('age', [('0-18', 0, 18), ('19-21', 19, 21), ('22+', 22, None)]),
+])
+
+CARD_RELATED_NAMES = {
+    CardBasic: 'card_basic_set',
+    CardRequirement: 'card_requirement_set',
+}
+
+class CardFilter(filters.FilterSet):
+    cardOrg = filters.CharFilter(field_name='cardOrg')
+    yearlyFee_min = filters.NumberFilter(field_name='yearlyFee', lookup_expr='gte')
+    yearlyFee_max = filters.NumberFilter(field_name='yearlyFee', lookup_expr='lte')
+    interest_min = filters.NumberFilter(field_name='interest', lookup_expr='gte')
+    interest_max = filters.NumberFilter(field_name='interest', lookup_expr='lte')
+    interestFreeDay_min = filters.NumberFilter(field_name='interestFreeDay', lookup_expr='gte')
+    interestFreeDay_max = filters.NumberFilter(field_name='interestFreeDay', lookup_expr='lte')
+    averageRefund_min = filters.NumberFilter(field_name='averageRefund', lookup_expr='gte')
+    averageRefund_max = filters.NumberFilter(field_name='averageRefund', lookup_expr='lte')
+    freeAirportLounge_min = filters.NumberFilter(field_name='freeAirportLounge', lookup_expr='gte')
+    freeAirportLounge_max = filters.NumberFilter(field_name='freeAirportLounge', lookup_expr='lte')
+    incomeRequirement_min = filters.NumberFilter(field_name='incomeRequirement', lookup_expr='gte')
+    incomeRequirement_max = filters.NumberFilter(field_name='incomeRequirement', lookup_expr='lte')
+    age_min = filters.NumberFilter(field_name='age', lookup_expr='gte')
+    age_max = filters.NumberFilter(field_name='age', lookup_expr='lte')
+    ordering = filters.CharFilter(method='filter_ordering')
+
+    class Meta:
+        model = Card
+        fields = []
+
+    def filter_queryset(self, queryset):
+        # conditions on the same child table must hold for the same child row, so they are
+        # grouped into one `id IN (SELECT card_id ...)` per table instead of one join per filter
+        lookups = defaultdict(dict)
+        for name, value in self.form.cleaned_data.items():
+            if name == 'ordering' or value in EMPTY_VALUES:
+                continue
+            f = self.filters[name]
+            model = CARD_NUMERIC_FIELDS.get(f.field_name, CardBasic)
+            lookups[model]['%s__%s' % (f.field_name, f.lookup_expr)] = value
+        for model, conditions in lookups.items():
+            queryset = queryset.filter(id__in=model.objects.filter(**conditions).values('card_id'))
+        ordering = self.form.cleaned_data.get('ordering')
+        if ordering:
+            queryset = self.filter_ordering(queryset, 'ordering', ordering)
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        order_by = []
+        for term in value.split(','):
+            term = term.strip()
+            field = term.lstrip('-')
+            if field == 'rating':
+                order_by.append(term)
+            elif field in CARD_NUMERIC_FIELDS:
+                alias = 'sort_%s' % field
+                child = CARD_NUMERIC_FIELDS[field].objects.filter(card=OuterRef('pk')).exclude(**{field: None})
+                queryset = queryset.annotate(**{alias: Subquery(child.order_by(field).values(field)[:1])})
+                order_by.append(term.replace(field, alias))
+        if order_by:
+            queryset = queryset.order_by(*(order_by + ['id']))
+        return queryset
+
+def card_facets(queryset):
+    """
+    Count matching cards per bucket of every numeric facet in a single aggregate query,
+    plus one grouped query for the cardOrg terms. Only ACTIVE child rows are counted.
+    """
+    cards = Card.objects.filter(pk__in=queryset.values('pk'))
+    aggregates = {}
+    for field, buckets in CARD_FACET_BUCKETS.items():
+        related_name = CARD_RELATED_NAMES[CARD_NUMERIC_FIELDS[field]]
+        for index, (label, low, high) in enumerate(buckets):
+            # the joins see every child row, the default manager's filter does not apply
+            condition = Q(**{'%s__status' % related_name: Status.ACTIVE.name})
+            if low is not None:
+                condition &= Q(**{'%s__%s__gte' % (related_name, field): low})
+            if high is not None:
+                condition &= Q(**{'%s__%s__lte' % (related_name, field): high})
+            aggregates['%s_%d' % (field, index)] = Count('pk', distinct=True, filter=condition)
+    counts = cards.aggregate(**aggregates)
+    facets = OrderedDict()
+    for field, buckets in CARD_FACET_BUCKETS.items():
+        facets[field] = [
+            {'label': label, 'min': low, 'max': high, 'count': counts['%s_%d' % (field, index)]}
+            for index, (label, low, high) in enumerate(buckets)
+        ]
+    card_orgs = (CardBasic.objects.filter(card__in=cards).exclude(cardOrg=None)
+                 .values('cardOrg').annotate(count=Count('card', distinct=True)).order_by('cardOrg'))
+    facets['cardOrg'] = [{'label': row['cardOrg'], 'count': row['count']} for row in card_orgs]
+    return facets
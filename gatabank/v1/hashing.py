@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many logins in progress, try again shortly.'
+    default_code = 'hashing_unavailable'
+
+def get_config():
+    config = {'WORKERS': 0, 'QUEUE': 0, 'WAIT': 2, 'TIMEOUT': 30, 'ITERATIONS': None}
+    config.update(getattr(settings, 'V1_PASSWORD_HASHING', {}))
+    return config
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the iteration count taken from V1_PASSWORD_HASHING['ITERATIONS'];
+    hashes made with another count are upgraded on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return get_config()['ITERATIONS'] or hashers.PBKDF2PasswordHasher.iterations
+
+# pool workers started with spawn rather than fork begin without Django set up
+def _setup_worker():
+    if not settings.configured:
+        django.setup()
+
+def _make_password(password):
+    _setup_worker()
+    return hashers.make_password(password)
+
+def _check_password(password, encoded):
+    _setup_worker()
+    updated = []
+    return hashers.check_password(password, encoded, setter=updated.append), bool(updated)
+
+class HashingPool(object):
+    """
+    Runs password hashing on a process pool of WORKERS processes. At most WORKERS + QUEUE
+    hashes are in flight; callers wait up to WAIT seconds for a slot and then get a 503
+    instead of piling up behind the pool. WORKERS = 0 hashes inline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._size = None
+
+    def get_executor(self, config):
+        with self._lock:
+            size = (config['WORKERS'], config['QUEUE'])
+            if self._size != size:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._size = size
+                self._slots = threading.BoundedSemaphore(config['WORKERS'] + config['QUEUE'])
+                self._executor = ProcessPoolExecutor(config['WORKERS'])
+            return self._executor, self._slots
+
+    def run(self, function, *args):
+        config = get_config()
+        if not config['WORKERS']:
+            return function(*args)
+        executor, slots = self.get_executor(config)
+        if not slots.acquire(timeout=config['WAIT']):
+            raise HashingUnavailable()
+        try:
+            return executor.submit(function, *args).result(timeout=config['TIMEOUT'])
+        except FutureTimeoutError:
+            raise HashingUnavailable()
+        finally:
+            slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._executor = self._slots = self._size = None
+
+pool = HashingPool()
+
+def make_password(password):
+    if password is None:
+        return hashers.make_password(None)
+    return pool.run(_make_password, password)
+
+def check_password(password, encoded):
+    """
+    (is_correct, must_update) for a raw password against a stored hash.
+    """
+    if password is None or not hashers.is_password_usable(encoded):
+        return False, False
+    return pool.run(_check_password, password, encoded)
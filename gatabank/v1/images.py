@@ -0,0 +1,119 @@
+"""
+Pre-generated image variants: every uploaded Bank/Card image is resized to the SIZES of
+V1_IMAGES and saved in its own format plus WebP and, when Pillow can write it, AVIF,
+under content-hashed names that are served as immutable.
+"""
+import hashlib
+import io
+import os
+import posixpath
+import re
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.views.static import serve
+from PIL import Image
+
+try:
+    # registers AVIF with Pillow versions that cannot write it themselves
+    import pillow_avif
+except ImportError:
+    pillow_avif = None
+
+HASH_LENGTH = 12
+re_hashed = re.compile(r'\.[0-9a-f]{%d}\.(?:png|jpe?g|gif|webp|avif)$' % HASH_LENGTH)
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+def get_config():
+    config = {
+        # name: (max width, max height), None keeps the original dimensions
+        'SIZES': {'thumb': (150, 100), 'card': (480, 300), 'full': None},
+        'FORMATS': ['webp', 'avif'],
+        'QUALITY': {'jpeg': 85, 'webp': 80, 'avif': 60},
+    }
+    config.update(getattr(settings, 'V1_IMAGES', {}))
+    return config
+
+def can_write(format):
+    Image.init()
+    return format.upper() in Image.SAVE
+
+def encode(image, format, quality):
+    if format == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    options = {'quality': quality[format]} if format in quality else {'optimize': True}
+    image.save(buffer, format=format.upper(), **options)
+    return buffer.getvalue()
+
+def variant_name(source, size, content, extension):
+    directory, filename = posixpath.split(source)
+    stem = os.path.splitext(filename)[0]
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    return posixpath.join(directory, 'variants', '%s.%s.%s.%s' % (stem, size, digest, extension))
+
+def generate_variants(field_file, config=None):
+    """
+    Writes the variants of a committed image FieldFile and returns the dict stored in
+    `image_variants`: {'source': name, size: {'width', 'height', format: name, ...}}.
+    Names change with the content, so a variant is only written once.
+    """
+    config = config or get_config()
+    storage = field_file.storage
+    field_file.open('rb')
+    try:
+        original = Image.open(field_file)
+        original.load()
+    finally:
+        field_file.close()
+    source_format = (original.format or 'PNG').lower()
+    if source_format not in ('jpeg', 'png', 'gif'):
+        source_format = 'png'
+    if original.mode not in ('RGB', 'RGBA'):
+        # palette and grayscale images resize poorly, and only some encoders take them
+        transparent = original.mode in ('LA', 'PA') or 'transparency' in original.info
+        original = original.convert('RGBA' if transparent else 'RGB')
+    formats = [source_format] + [format for format in config['FORMATS'] if format != source_format and can_write(format)]
+    variants = {'source': field_file.name}
+    for size, box in config['SIZES'].items():
+        image = original
+        if box is not None and (original.width > box[0] or original.height > box[1]):
+            image = original.copy()
+            image.thumbnail(box, Image.LANCZOS)
+        variant = {'width': image.width, 'height': image.height}
+        for format in formats:
+            content = encode(image, format, config['QUALITY'])
+            extension = 'jpg' if format == 'jpeg' else format
+            name = variant_name(field_file.name, size, content, extension)
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(content))
+            variant[extension] = name
+        variants[size] = variant
+    return variants
+
+def update_variants(instance, field='image'):
+    """
+    Regenerates `image_variants` when the image of `instance` changed since they were
+    made. Uncommitted uploads are saved first, as FileField.pre_save would.
+    """
+    image = getattr(instance, field)
+    if not image:
+        instance.image_variants = {}
+        return
+    if image._committed and (instance.image_variants or {}).get('source') == image.name:
+        return
+    if not image._committed:
+        image.save(image.name, image.file, save=False)
+    try:
+        instance.image_variants = generate_variants(image)
+    except (IOError, OSError, SyntaxError, ValueError):
+        # missing or unreadable file: clients keep using the original
+        instance.image_variants = {'source': image.name}
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    django.views.static.serve, marking content-hashed variants as immutable.
+    """
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if response.status_code in (200, 304) and re_hashed.search(path):
+        response['Cache-Control'] = IMMUTABLE
+    return response
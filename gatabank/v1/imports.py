@@ -0,0 +1,189 @@
+import codecs
+import csv
+import io
+import json
+import secrets
+from itertools import islice
+import phonenumbers
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_date
+from phonenumber_field.phonenumber import PhoneNumber
+from v1.areas import area_index
+from v1.models import User
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+def iter_csv_rows(lines):
+    for row in csv.DictReader(lines):
+        yield {key.strip(): (value or '').strip() for key, value in row.items() if key}
+
+def iter_ndjson_rows(lines):
+    for line in lines:
+        line = line.strip()
+        if line:
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {'_error': 'Invalid JSON: %s' % e}
+            yield row if isinstance(row, dict) else {'_error': 'Expected a JSON object'}
+
+def check_encoding(stream, chunk_size=65536):
+    """
+    Raise ValueError unless the binary `stream` decodes as UTF-8, reading it in chunks and
+    rewinding it afterwards, so a bad byte is reported before any row is imported.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError as e:
+        raise ValueError('The file is not UTF-8 encoded: %s' % e)
+    finally:
+        stream.seek(0)
+
+def iter_import_rows(stream, format):
+    """
+    Rows of a CSV (with a header line) or NDJSON file as dicts, read one line at a time
+    from a text or binary stream.
+    """
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if format == 'csv':
+        return iter_csv_rows(stream)
+    if format == 'ndjson':
+        return iter_ndjson_rows(stream)
+    raise ValueError('Unknown import format: %s' % format)
+
+class ParsedPhoneNumber(PhoneNumber):
+    """
+    PhoneNumber that remembers its validity and formatted forms, so the lookup and the
+    INSERT reuse the normalization done while reading the row.
+    """
+
+    def is_valid(self):
+        if not hasattr(self, '_is_valid'):
+            self._is_valid = super(ParsedPhoneNumber, self).is_valid()
+        return self._is_valid
+
+    def format_as(self, format):
+        if not hasattr(self, '_formatted'):
+            self._formatted = {}
+        if format not in self._formatted:
+            self._formatted[format] = super(ParsedPhoneNumber, self).format_as(format)
+        return self._formatted[format]
+
+def guess_format(name):
+    return 'ndjson' if name and name.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+class UserImporter(object):
+    """
+    Creates users from `phone_number`, `city`, `district`, `village`, `address` and
+    `date_of_birth` columns, `batch_size` rows at a time: numbers are normalized to
+    PHONENUMBER_DB_FORMAT, area codes are resolved against the area index, numbers already
+    registered are found with one query and the rest are inserted with one bulk_create.
+    Imported users get an unusable password.
+    """
+
+    def __init__(self, batch_size=1000, region=None):
+        self.batch_size = batch_size
+        self.region = region or getattr(settings, 'PHONENUMBER_DEFAULT_REGION', None)
+        self.db_format = PhoneNumber.format_map[getattr(settings, 'PHONENUMBER_DB_FORMAT', 'E164')]
+        self.seen = set()
+        self.areas = None
+        self.counts = {'created': 0, 'duplicate': 0, 'invalid': 0, 'failed': 0}
+
+    def run(self, rows):
+        """
+        Yield one result per input row, in input order.
+        """
+        self.areas = area_index.get()
+        rows = enumerate(rows, 1)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            for result in self.import_batch(batch):
+                self.counts[result['status']] += 1
+                yield result
+
+    def parse_phone_number(self, raw):
+        phone_number = ParsedPhoneNumber()
+        phonenumbers.parse(raw, self.region, numobj=phone_number)
+        if not phone_number.is_valid():
+            raise ValueError('Invalid phone number: %s' % raw)
+        return phone_number
+
+    def build_user(self, row):
+        if '_error' in row:
+            raise ValueError(row['_error'])
+        raw = str(row.get('phone_number') or '').strip()
+        if not raw:
+            raise ValueError('Missing phone number')
+        try:
+            phone_number = self.parse_phone_number(raw)
+        except phonenumbers.NumberParseException:
+            raise ValueError('Invalid phone number: %s' % raw)
+        city_id, district_id, village_id = self.areas.resolve(
+            row.get('city') or None, row.get('district') or None, row.get('village') or None)
+        date_of_birth = None
+        if row.get('date_of_birth'):
+            date_of_birth = parse_date(str(row['date_of_birth']))
+            if date_of_birth is None:
+                raise ValueError('Invalid date_of_birth: %s' % row['date_of_birth'])
+        return User(phone_number=phone_number, city_id=city_id, district_id=district_id,
+                    village_id=village_id, address=row.get('address') or None,
+                    date_of_birth=date_of_birth, is_staff=False,
+                    password=UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(30))
+
+    def import_batch(self, batch):
+        results = []
+        pending = []
+        for line, row in batch:
+            result = {'row': line, 'phone_number': row.get('phone_number') if isinstance(row, dict) else None}
+            results.append(result)
+            try:
+                user = self.build_user(row)
+            except ValueError as e:
+                result.update(status='invalid', error=str(e))
+                continue
+            key = user.phone_number.format_as(self.db_format)
+            result['phone_number'] = key
+            if key in self.seen:
+                result.update(status='duplicate', error='Repeated in this file')
+                continue
+            self.seen.add(key)
+            pending.append((result, user))
+        self.insert(pending)
+        return results
+
+    def insert(self, pending, retry=True):
+        if not pending:
+            return
+        numbers = [user.phone_number for result, user in pending]
+        # values_list returns the stored strings, already in PHONENUMBER_DB_FORMAT; deleted
+        # users keep their number, so they count as registered too
+        existing = dict((phone_number, pk) for pk, phone_number in
+                        User.all_objects.filter(phone_number__in=numbers).values_list('pk', 'phone_number'))
+        new = []
+        for result, user in pending:
+            if result['phone_number'] in existing:
+                result.update(status='duplicate', id=existing[result['phone_number']],
+                              error='Already registered')
+            else:
+                new.append((result, user))
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([user for result, user in new])
+        except IntegrityError as e:
+            # numbers registered concurrently since the lookup, look them up again
+            if retry:
+                return self.insert(new, retry=False)
+            # still conflicting: report the batch rather than abort the rest of the file
+            for result, user in new:
+                result.update(status='failed', error='Could not be created: %s' % e)
+            return
+        for result, user in new:
+            result.update(status='created', id=str(user.pk))
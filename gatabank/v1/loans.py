@@ -0,0 +1,235 @@
+import re
+import uuid
+import numpy as np
+from v1.caches import VersionedSnapshot
+from v1.models import Bank
+
+NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)?')
+YEAR_RE = re.compile(r'năm|nam|year', re.IGNORECASE)
+MONTH_RE = re.compile(r'tháng|thang|month', re.IGNORECASE)
+# interestCalMethod values meaning interest is charged on the original principal every month
+FLAT_RATE_KEYWORDS = ('flat', 'ban đầu', 'ban dau', 'cố định trên dư nợ gốc')
+
+def parse_numbers(text):
+    return [float(number.replace(',', '.')) for number in NUMBER_RE.findall(text or '')]
+
+def parse_term(text):
+    """
+    Loan term in months from free text such as "12 tháng" or "5 năm".
+    """
+    numbers = parse_numbers(text)
+    if not numbers:
+        return np.nan
+    return numbers[0] * 12 if YEAR_RE.search(text) else numbers[0]
+
+def parse_age_range(texts):
+    numbers = [number for text in texts for number in parse_numbers(text)]
+    if not numbers:
+        return np.nan, np.nan
+    if len(numbers) == 1:
+        return numbers[0], np.nan
+    return min(numbers), max(numbers)
+
+def is_monthly_rate(interest_type):
+    """
+    Whether interestType quotes interestPercentage per month ("%/tháng"); anything else,
+    including fixed/floating labels without a period, is an annual rate.
+    """
+    return bool(MONTH_RE.search(interest_type or ''))
+
+def is_flat_rate(method):
+    method = (method or '').lower()
+    return any(keyword in method for keyword in FLAT_RATE_KEYWORDS)
+
+def monthly_payments(amounts, annual_rates, terms, flat):
+    """
+    Monthly instalment for every (amount, rate, term) row. Flat-rate loans pay a fixed share
+    of principal plus interest on the original amount; the others are reducing-balance annuities.
+    """
+    monthly_rates = annual_rates / 1200.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = amounts * monthly_rates / (1 - (1 + monthly_rates) ** -terms)
+        annuity = np.where(monthly_rates == 0, amounts / terms, annuity)
+        return np.where(flat, amounts / terms + amounts * monthly_rates, annuity)
+
+def totals(amounts, annual_rates, terms, flat):
+    """
+    (total repayment, total interest) of every loan in closed form, the sums of its
+    amortize() schedule without building it.
+    """
+    payments = monthly_payments(amounts, annual_rates, terms, flat) * terms
+    return payments, payments - amounts
+
+def parse_percentage(texts):
+    for text in texts:
+        numbers = parse_numbers(text)
+        if numbers:
+            return numbers[0]
+    return np.nan
+
+def amortize(amounts, annual_rates, terms, flat, early_fees):
+    """
+    Month-by-month schedules for a batch of loans in one pass. Every argument is an array with
+    one entry per loan; the returned arrays have one row per loan and one column per month up
+    to the longest term, zero after a loan is repaid.
+    """
+    months = np.arange(1, int(terms.max()) + 1, dtype=float)
+    monthly_rates = (annual_rates / 1200.0)[:, None]
+    payments = monthly_payments(amounts, annual_rates, terms, flat)[:, None]
+    principal = amounts[:, None]
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        growth = (1 + monthly_rates) ** months
+        reducing = np.where(monthly_rates == 0, principal - payments * months,
+                            principal * growth - payments * (growth - 1) / monthly_rates)
+    balance = np.where(flat[:, None], principal * (1 - months / terms[:, None]), reducing)
+    active = months <= terms[:, None]
+    balance = np.where(active, np.clip(balance, 0, None), 0)
+    opening = np.hstack([principal, balance[:, :-1]])
+    interest = np.where(active, np.where(flat[:, None], principal * monthly_rates, opening * monthly_rates), 0)
+    repaid = np.where(active, opening - balance, 0)
+    early_fee = np.nan_to_num(early_fees)[:, None] / 100.0
+    return {
+        'months': months,
+        'active': active,
+        'payment': repaid + interest,
+        'principal': repaid,
+        'interest': interest,
+        'balance': balance,
+        'earlyPayoffFee': np.where(active, balance * early_fee, 0),
+    }
+
+class BankTerms(object):
+    """
+    Array-backed snapshot of the lending terms of every bank, one position per bank.
+    Missing limits are NaN and never exclude a bank.
+    """
+
+    def __init__(self, banks):
+        # text ids, as requests name banks
+        self.ids = [str(bank.id) for bank in banks]
+        self.names = [bank.name for bank in banks]
+        self.methods = [bank.interestCalMethod for bank in banks]
+        self.interest_types = [bank.interestType for bank in banks]
+        self.penalties = [[{'penaltyFee': fee.penaltyFee, 'penaltyInterest': fee.penaltyInterest}
+                           for fee in bank.bank_fee_set.all()] for bank in banks]
+        self.min_amount = self._array(bank.minLoanAmount for bank in banks)
+        self.max_amount = self._array(bank.maxLoanAmount for bank in banks)
+        self.min_income = self._array(bank.minIncome for bank in banks)
+        self.rate = self._array(bank.interestPercentage for bank in banks)
+        # what the payment formulas take, whatever period interestType quotes the rate in
+        self.annual_rate = self.rate * np.array([12 if is_monthly_rate(interest_type) else 1
+                                                 for interest_type in self.interest_types], dtype=float)
+        self.min_term = self._array(parse_term(bank.minLoanTerm) for bank in banks)
+        self.max_term = self._array(parse_term(bank.maxLoanTerm) for bank in banks)
+        ages = [parse_age_range(requirement.age for requirement in bank.bank_requirement_set.all())
+                for bank in banks]
+        self.min_age = self._array(age[0] for age in ages)
+        self.max_age = self._array(age[1] for age in ages)
+        self.early_fee = self._array(parse_percentage(fee.earlierPaymentFee for fee in bank.bank_fee_set.all())
+                                     for bank in banks)
+        self.flat = np.array([is_flat_rate(method) for method in self.methods], dtype=bool)
+        self.positions = {bank_id: position for position, bank_id in enumerate(self.ids)}
+
+    def position(self, bank_id):
+        """
+        Position of the bank with `bank_id` in any uuid spelling, None when there is none.
+        """
+        try:
+            return self.positions.get(str(uuid.UUID(str(bank_id))))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _array(values):
+        return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def eligible(self, income, amount, term, age=None):
+        mask = ~(self.min_amount > amount) & ~(self.max_amount < amount)
+        mask &= ~(self.min_income > income)
+        mask &= ~(self.min_term > term) & ~(self.max_term < term)
+        if age is not None:
+            mask &= ~(self.min_age > age) & ~(self.max_age < age)
+        return mask
+
+    def match(self, income, amount, term, age=None):
+        """
+        Banks whose terms accept the request, cheapest estimated total repayment first.
+        Banks without an interest rate are listed last.
+        """
+        positions = np.flatnonzero(self.eligible(income, amount, term, age))
+        payments = monthly_payments(float(amount), self.annual_rate[positions], float(term), self.flat[positions])
+        totals = payments * term
+        order = np.argsort(totals, kind='stable')
+        results = []
+        for position, payment, total in zip(positions[order], payments[order], totals[order]):
+            known = not np.isnan(total)
+            results.append({
+                'id': self.ids[position],
+                'name': self.names[position],
+                'interestPercentage': None if np.isnan(self.rate[position]) else int(self.rate[position]),
+                'interestCalMethod': self.methods[position],
+                'monthlyPayment': int(round(payment)) if known else None,
+                'totalCost': int(round(total)) if known else None,
+                'totalInterest': int(round(total - amount)) if known else None,
+            })
+        return results
+
+    def schedules(self, loans, include_schedule=True):
+        """
+        Repayment schedules and totals for (bank position, amount, term) tuples, computed together.
+        `earlyPayoffFee` is what settling the remaining balance after that month would cost
+        under the bank's earlierPaymentFee percentage. Without `include_schedule` only the
+        totals are computed, in closed form.
+        """
+        positions = np.array([position for position, amount, term in loans], dtype=int)
+        amounts = np.array([amount for position, amount, term in loans], dtype=float)
+        terms = np.array([term for position, amount, term in loans], dtype=float)
+        rates = np.nan_to_num(self.annual_rate[positions])
+        if include_schedule:
+            result = amortize(amounts, rates, terms, self.flat[positions], self.early_fee[positions])
+            payments, interests = result['payment'].sum(axis=1), result['interest'].sum(axis=1)
+        else:
+            payments, interests = totals(amounts, rates, terms, self.flat[positions])
+        columns = ('payment', 'principal', 'interest', 'balance', 'earlyPayoffFee')
+        schedules = []
+        for row, position in enumerate(positions):
+            early_fee = self.early_fee[position]
+            item = {
+                'bank': self.ids[position],
+                'name': self.names[position],
+                'amount': int(amounts[row]),
+                'term': int(terms[row]),
+                'interestPercentage': None if np.isnan(self.rate[position]) else int(self.rate[position]),
+                'interestType': self.interest_types[position],
+                'interestCalMethod': self.methods[position],
+                'earlierPaymentFee': None if np.isnan(early_fee) else float(early_fee),
+                'penalties': self.penalties[position],
+                'totalPayment': int(round(payments[row])),
+                'totalInterest': int(round(interests[row])),
+            }
+            if include_schedule:
+                count = int(terms[row])
+                values = np.rint(np.stack([result[column][row, :count] for column in columns], axis=1)).astype(int)
+                item['schedule'] = [
+                    dict(zip(columns, month_values.tolist()), month=month + 1)
+                    for month, month_values in enumerate(values)
+                ]
+            schedules.append(item)
+        return schedules
+
+    def iter_schedules(self, loans, include_schedule=True, chunk_size=100):
+        """
+        schedules() `chunk_size` loans at a time, so the month matrices of a large batch
+        are never all in memory at once.
+        """
+        for start in range(0, len(loans), chunk_size):
+            for item in self.schedules(loans[start:start + chunk_size], include_schedule):
+                yield item
+
+def build_bank_terms():
+    return BankTerms(list(Bank.objects.prefetch_related('bank_fee_set', 'bank_requirement_set')))
+
+bank_terms = VersionedSnapshot('bank_terms', build_bank_terms)
@@ -0,0 +1,201 @@
+import itertools
+import json
+import platform
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+from django import get_version
+from django.core.files.base import ContentFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, teardown_databases
+from rest_framework.throttling import ScopedRateThrottle
+from v1.caches import response_caches
+from v1.models import Bank, Card, City, District, User
+from v1.seed import seed_areas, seed_catalogue, seed_users
+from v1.stats import percentile
+
+ADMIN_PHONE = '+84980000000'
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic catalogue, area tree and users into a scratch test database, then drive every '
+            'v1 route and api/token/ at each concurrency level and report latency percentiles, requests per '
+            'second and queries per request; cached routes run once warm and once with the cache cleared '
+            'before every request (-cold)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=200)
+        parser.add_argument('--banks', type=int, default=20)
+        parser.add_argument('--children', type=int, default=2)
+        parser.add_argument('--cities', type=int, default=63)
+        parser.add_argument('--districts', type=int, default=10, help='districts per city')
+        parser.add_argument('--villages', type=int, default=10, help='villages per district')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=200, help='requests per route and concurrency level')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--route', nargs='+', help='only run the routes with these names')
+        parser.add_argument('--keepdb', action='store_true', help='reuse and keep the scratch database')
+        parser.add_argument('--output', help='write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        self.options = options
+        # no rate limits, or the throttled routes would mostly measure 429s
+        rates = dict.fromkeys(ScopedRateThrottle.THROTTLE_RATES)
+        with override_settings(ALLOWED_HOSTS=['localhost']), \
+                mock.patch.object(ScopedRateThrottle, 'THROTTLE_RATES', rates):
+            old_config = setup_databases(0, interactive=False, keepdb=options['keepdb'])
+            try:
+                report = self.run()
+            finally:
+                teardown_databases(old_config, 0, keepdb=options['keepdb'])
+        if options['output']:
+            with open(options['output'], 'w') as stream:
+                json.dump(report, stream, indent=2)
+            self.stderr.write('Report written to %s' % options['output'])
+
+    def seed(self):
+        options = self.options
+        if User.objects.filter(is_superuser=True).exists():
+            return
+        self.stderr.write('Seeding...')
+        seed_catalogue(options['cards'], options['banks'], options['children'])
+        cities, districts, villages = seed_areas(options['cities'], options['districts'], options['villages'])
+        seed_users(options['users'], villages)
+        User.objects.create_superuser(ADMIN_PHONE, 'secret')
+
+    def run(self):
+        self.seed()
+        self.handler = WSGIHandler()
+        self.factory = RequestFactory(HTTP_HOST='localhost')
+        routes = self.get_routes()
+        if self.options['route']:
+            routes = [route for route in routes if route[0] in self.options['route']]
+        results = []
+        self.stdout.write('%-16s %5s %9s %9s %9s %9s %8s %7s' % (
+            'route', 'conc', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'errors'))
+        for concurrency in self.options['concurrency']:
+            for name, build in routes:
+                result = self.measure(name, build, concurrency)
+                results.append(result)
+                self.stdout.write('%-16s %5d %9.1f %9.2f %9.2f %9.2f %8.1f %7d' % (
+                    name, concurrency, result['rps'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                    result['queries'], result['errors']))
+        options = self.options
+        return {
+            'environment': {'vendor': connection.vendor, 'python': platform.python_version(), 'django': get_version()},
+            'dataset': {name: options[name] for name in (
+                'cards', 'banks', 'children', 'cities', 'districts', 'villages', 'users')},
+            'requests': options['requests'],
+            'results': results,
+        }
+
+    def call(self, environ):
+        """
+        (status, seconds, queries) of one request through the full middleware stack.
+        """
+        statuses = []
+        with ExitStack() as stack:
+            contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            started = time.perf_counter()
+            response = self.handler(environ, lambda status, headers: statuses.append(int(status.split()[0])))
+            b''.join(response)
+            response.close()
+            elapsed = time.perf_counter() - started
+        return statuses[0], elapsed, sum(len(context) for context in contexts)
+
+    def measure(self, name, build, concurrency):
+        # one untimed request, so caches and lazily built indexes start out warm
+        self.call(build())
+        requests = self.options['requests']
+        with ThreadPoolExecutor(concurrency) as executor:
+            started = time.perf_counter()
+            calls = list(executor.map(lambda _: self.call(build()), range(requests)))
+            elapsed = time.perf_counter() - started
+        timings = [seconds for status, seconds, queries in calls]
+        return {
+            'route': name,
+            'concurrency': concurrency,
+            'requests': requests,
+            'rps': round(requests / elapsed, 1),
+            'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+            'queries': round(sum(queries for status, seconds, queries in calls) / float(requests), 2),
+            'errors': sum(1 for status, seconds, queries in calls if status >= 400),
+        }
+
+    def token_environ(self):
+        return self.factory.post('/api/token/', {'phone_number': ADMIN_PHONE, 'password': 'secret'},
+                                 content_type='application/json').environ
+
+    def get_token(self):
+        response = self.handler(self.token_environ(), lambda status, headers: None)
+        try:
+            return json.loads(b''.join(response)).get('access')
+        except ValueError:
+            return None
+        finally:
+            response.close()
+
+    def get_routes(self):
+        """
+        (name, build) pairs, `build` returning a fresh WSGI environ for the route.
+        """
+        card = Card.objects.values_list('pk', flat=True).first()
+        bank = Bank.objects.values_list('pk', flat=True).first()
+        customer = User.objects.filter(is_staff=False).values_list('pk', flat=True).first()
+        staff = User.objects.filter(is_staff=True).values_list('pk', flat=True).first()
+        city = City.objects.values_list('pk', flat=True).first()
+        district = District.objects.values_list('pk', flat=True).first()
+        token = self.get_token()
+        if token is None:
+            self.stderr.write('Could not obtain a token, authenticated routes will fail')
+        auth = {'HTTP_AUTHORIZATION': 'Bearer %s' % token}
+        get = lambda path, data=None, **extra: lambda: self.factory.get(path, data, **extra).environ
+        # new phone numbers on every request, so each import inserts 20 users
+        batches = itertools.count()
+        def import_users():
+            first = next(batches) * 20
+            leads = ''.join(['phone_number,address\n'] +
+                            ['+8491%07d,Imported street\n' % index for index in range(first, first + 20)])
+            upload = ContentFile(leads.encode('utf-8'), name='leads.csv')
+            return self.factory.post('/api/v1/users/import/', {'file': upload}, **auth).environ
+        def schedules():
+            items = [{'bank': str(bank), 'amount': 120000000, 'term': term} for term in (12, 24, 36)]
+            return self.factory.post('/api/v1/banks/schedules/', {'items': items},
+                                     content_type='application/json').environ
+        def cold(namespace, build):
+            def build_cold():
+                response_caches[namespace].clear()
+                return build()
+            return build_cold
+        return [
+            ('root', get('/api/v1/')),
+            ('cards', get('/api/v1/cards/')),
+            ('cards-cold', cold('cards', get('/api/v1/cards/'))),
+            ('card', get('/api/v1/cards/%s/' % card)),
+            ('card-cold', cold('cards', get('/api/v1/cards/%s/' % card))),
+            ('cards-search', get('/api/v1/cards/search/', {'cardOrg': 'VISA'})),
+            ('banks', get('/api/v1/banks/')),
+            ('banks-cold', cold('banks', get('/api/v1/banks/'))),
+            ('bank', get('/api/v1/banks/%s/' % bank)),
+            ('bank-cold', cold('banks', get('/api/v1/banks/%s/' % bank))),
+            ('banks-match', get('/api/v1/banks/match/', {'income': 20000000, 'amount': 100000000, 'term': 12})),
+            ('bank-schedule', get('/api/v1/banks/%s/schedule/' % bank, {'amount': 100000000, 'term': 24})),
+            ('banks-schedules', schedules),
+            ('users', get('/api/v1/users/', **auth)),
+            ('user', get('/api/v1/users/%s/' % customer, **auth)),
+            ('users-import', import_users),
+            ('collaborators', get('/api/v1/collaborators/', **auth)),
+            ('collaborator', get('/api/v1/collaborators/%s/' % staff, **auth)),
+            ('cities', get('/api/v1/cities/')),
+            ('districts', get('/api/v1/districts/%s' % city)),
+            ('villages', get('/api/v1/villages/%s' % district)),
+            ('areas', get('/api/v1/areas/')),
+            ('stats', get('/api/v1/stats/', **auth)),
+            ('metrics', get('/api/v1/metrics/', **auth)),
+            ('token', self.token_environ),
+        ]
@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from v1.hashing import HashingUnavailable, check_password, get_config, pool
+
+class Command(BaseCommand):
+    help = 'Measure password checks per second, inline and on the hashing process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+
+    def handle(self, *args, **options):
+        config = get_config()
+        encoded = make_password('secret')
+        self.stdout.write('%s, %d logins, %d concurrent clients' % (
+            encoded.rsplit('$', 2)[0], options['logins'], options['concurrency']))
+        for workers in [0] + options['workers']:
+            with override_settings(V1_PASSWORD_HASHING=dict(config, WORKERS=workers)):
+                self.measure(workers, encoded, options['logins'], options['concurrency'])
+                pool.shutdown()
+
+    def measure(self, workers, encoded, logins, concurrency):
+        def login(_):
+            try:
+                return check_password('secret', encoded)[0]
+            except HashingUnavailable:
+                return None
+        # warm the pool so process start-up is not measured
+        with ThreadPoolExecutor(max(workers, 1)) as executor:
+            list(executor.map(login, range(max(workers, 1))))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(login, range(logins)))
+        elapsed = time.perf_counter() - started
+        rate = results.count(True) / elapsed
+        self.stdout.write('  %-8s %8.1f logins/s %8.1f per core %5d refused' % (
+            'inline' if not workers else '%d procs' % workers, rate, rate / max(workers, 1),
+            results.count(None)))
@@ -0,0 +1,91 @@
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, models, transaction
+from v1.fields import CompactUUIDField, uuid7
+
+VARIANTS = [
+    ('varchar uuid4', lambda: models.CharField(max_length=255), uuid.uuid4),
+    ('varchar uuid7', lambda: models.CharField(max_length=255), uuid7),
+    ('compact uuid7', CompactUUIDField, uuid7),
+]
+
+class Command(BaseCommand):
+    help = ('Insert rows keyed by random text uuids, time-ordered text uuids and CompactUUIDField into '
+            'scratch tables with a foreign-key-like secondary index, and compare insert rate and size')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        self.stdout.write('%d rows on %s' % (options['rows'], connection.vendor))
+        for index, (name, make_field, generate) in enumerate(VARIANTS):
+            table = 'v1_bench_pks_%d' % index
+            field = make_field()
+            try:
+                self.create(connection, table, field)
+                elapsed = self.insert(connection, table, field, generate, options['rows'], options['batch_size'])
+                data, indexes = self.size(connection, table)
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('DROP TABLE IF EXISTS %s' % connection.ops.quote_name(table))
+            self.stdout.write('  %-14s %10.0f rows/s   data %s   indexes %s' % (
+                name, options['rows'] / elapsed, self.format_size(data), self.format_size(indexes)))
+
+    def create(self, connection, table, field):
+        quote = connection.ops.quote_name
+        column_type = field.db_type(connection)
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS %s' % quote(table))
+            cursor.execute('CREATE TABLE %s (id %s NOT NULL PRIMARY KEY, parent_id %s NULL, payload VARCHAR(64))' % (
+                quote(table), column_type, column_type))
+            cursor.execute('CREATE INDEX %s ON %s (parent_id)' % (quote(table + '_parent'), quote(table)))
+
+    def insert(self, connection, table, field, generate, rows, batch_size):
+        quote = connection.ops.quote_name
+        prepare = lambda value: field.get_db_prep_value(value if isinstance(field, CompactUUIDField) else str(value),
+                                                         connection)
+        sql = 'INSERT INTO %s (id, parent_id, payload) VALUES (%%s, %%s, %%s)' % quote(table)
+        parent = None
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            for start in range(0, rows, batch_size):
+                batch = []
+                for number in range(start, min(start + batch_size, rows)):
+                    key = generate()
+                    batch.append((prepare(key), parent, 'row %d' % number))
+                    # a handful of children per parent, like cards and their fees
+                    if number % 5 == 0:
+                        parent = prepare(key)
+                with transaction.atomic(using=connection.alias):
+                    cursor.executemany(sql, batch)
+        return time.perf_counter() - started
+
+    def size(self, connection, table):
+        """
+        Bytes of (table data, indexes), None where the backend does not say.
+        """
+        with connection.cursor() as cursor:
+            try:
+                if connection.vendor == 'mysql':
+                    cursor.execute('ANALYZE TABLE %s' % connection.ops.quote_name(table))
+                    cursor.fetchall()
+                    cursor.execute('SELECT DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES '
+                                   'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [table])
+                    return cursor.fetchone()
+                if connection.vendor == 'sqlite':
+                    cursor.execute('SELECT master.name = %s, SUM(stat.pgsize) FROM dbstat stat '
+                                   'JOIN sqlite_master master ON master.name = stat.name '
+                                   'WHERE master.tbl_name = %s GROUP BY 1', [table, table])
+                    sizes = dict(cursor.fetchall())
+                    return sizes.get(1), sizes.get(0)
+            except DatabaseError:
+                pass
+        return None, None
+
+    @staticmethod
+    def format_size(size):
+        return '%8.1f MB' % (size / 1048576.0) if size is not None else '       n/a'
@@ -0,0 +1,60 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from v1.compiled import compile_serializer
+from v1.models import Bank, Card
+from v1.seed import seed_catalogue
+from v1.serializers import BankSerializer, CardSerializer
+
+class Command(BaseCommand):
+    help = ('Compare DRF and compiled serialization of the card and bank catalogue on synthetic data '
+            'seeded into a scratch test database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=1000)
+        parser.add_argument('--banks', type=int, default=200)
+        parser.add_argument('--children', type=int, default=2)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keepdb', action='store_true', help='reuse and keep the scratch database')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        request = Request(APIRequestFactory().get('/api/v1/cards/', HTTP_HOST='localhost'))
+        old_config = setup_databases(0, interactive=False, keepdb=options['keepdb'])
+        try:
+            if not Card.objects.exists():
+                seed_catalogue(options['cards'], options['banks'], options['children'])
+            for model, serializer_class in ((Card, CardSerializer), (Bank, BankSerializer)):
+                self.compare(model, serializer_class, request)
+        finally:
+            teardown_databases(old_config, 0, keepdb=options['keepdb'])
+
+    def measure(self, render):
+        timings = []
+        for _ in range(self.repeat):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                content = JSONRenderer().render(render())
+                timings.append(time.perf_counter() - started)
+        return min(timings), len(context.captured_queries), content
+
+    def compare(self, model, serializer_class, request):
+        context = {'request': request}
+        queryset = serializer_class.setup_eager_loading(model.objects.all())
+        compiled = compile_serializer(serializer_class(context=context))
+        drf_time, drf_queries, drf_content = self.measure(
+            lambda: serializer_class(queryset.all(), many=True, context=context).data)
+        fast_time, fast_queries, fast_content = self.measure(
+            lambda: compiled.serialize(compiled.values(queryset.all())))
+        rows = model.objects.count()
+        self.stdout.write('%s: %d rows, identical output: %s' % (
+            model._meta.db_table, rows, json.loads(drf_content) == json.loads(fast_content)))
+        self.stdout.write('  drf       %8.1f ms %8d rows/s %3d queries' % (
+            drf_time * 1000, rows / drf_time, drf_queries))
+        self.stdout.write('  compiled  %8.1f ms %8d rows/s %3d queries  (%.1fx)' % (
+            fast_time * 1000, rows / fast_time, fast_queries, drf_time / fast_time))
@@ -0,0 +1,89 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from v1.asgi import AsyncReadHandler
+from v1.stats import percentile
+
+class Command(BaseCommand):
+    help = ('Compare read throughput of the WSGI handler on a fixed pool of sync workers with the '
+            'ASGI read handler, optionally with slow clients, against the data already in the database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', nargs='+', default=['/api/v1/cards/', '/api/v1/banks/', '/api/v1/cities/'])
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--client-delay', type=float, default=0.05,
+                            help='seconds a client takes to receive a response body')
+
+    def handle(self, *args, **options):
+        self.paths = options['path']
+        self.requests = options['requests']
+        self.delay = options['client_delay']
+        self.stdout.write('%d requests, %d concurrent clients, %d workers, %.0f ms client delay' % (
+            self.requests, options['concurrency'], options['workers'], self.delay * 1000))
+        self.report('wsgi', *self.bench_wsgi(options['concurrency'], options['workers']))
+        self.report('asgi', *self.bench_asgi(options['concurrency'], options['workers']))
+
+    def report(self, name, elapsed, timings, statuses):
+        self.stdout.write('  %s  %8.1f req/s  p50 %7.1f ms  p99 %7.1f ms  non-200: %d' % (
+            name, len(timings) / elapsed, percentile(timings, 0.5) * 1000,
+            percentile(timings, 0.99) * 1000, sum(1 for status in statuses if status != 200)))
+
+    def bench_wsgi(self, concurrency, workers):
+        handler = WSGIHandler()
+        statuses = []
+        def serve(path):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+                'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http',
+            }
+            response = handler(environ, lambda status, headers: statuses.append(int(status.split()[0])))
+            b''.join(response)
+            # a sync worker stays busy until the client has read the whole body
+            time.sleep(self.delay)
+            response.close()
+        def client(index):
+            started = time.perf_counter()
+            pool.submit(serve, self.paths[index % len(self.paths)]).result()
+            return time.perf_counter() - started
+        with ThreadPoolExecutor(workers) as pool, ThreadPoolExecutor(concurrency) as clients:
+            started = time.perf_counter()
+            timings = list(clients.map(client, range(self.requests)))
+            return time.perf_counter() - started, timings, statuses
+
+    def bench_asgi(self, concurrency, workers):
+        handler = AsyncReadHandler(executor=ThreadPoolExecutor(workers))
+        statuses = []
+        async def request(path, slots):
+            async with slots:
+                started = time.perf_counter()
+                scope = {
+                    'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'root_path': '',
+                    'scheme': 'http', 'server': ('localhost', 80), 'headers': [(b'host', b'localhost')],
+                }
+                async def receive():
+                    return {'type': 'http.request', 'body': b''}
+                async def send(message):
+                    if message['type'] == 'http.response.start':
+                        statuses.append(message['status'])
+                    elif not message.get('more_body'):
+                        await asyncio.sleep(self.delay)
+                await handler(scope, receive, send)
+                return time.perf_counter() - started
+        async def run():
+            slots = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*[request(self.paths[index % len(self.paths)], slots)
+                                          for index in range(self.requests)])
+        loop = asyncio.new_event_loop()
+        try:
+            started = time.perf_counter()
+            timings = loop.run_until_complete(run())
+            return time.perf_counter() - started, timings, statuses
+        finally:
+            loop.close()
+            handler.executor.shutdown()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from v1 import compact_ids
+from v1.models import Bank, Card, User
+
+class Command(BaseCommand):
+    help = ('Convert the text uuid keys of users, cards and banks, and the foreign keys to them, to '
+            'BINARY(16) on a live MySQL database one phase at a time; see v1.compact_ids')
+
+    def add_arguments(self, parser):
+        parser.add_argument('phase', choices=['status'] + list(compact_ids.PHASES))
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.05, help='seconds between backfill batches')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'mysql':
+            raise CommandError('Only MySQL stores text keys that need an online conversion, '
+                               'elsewhere `migrate` converts them')
+        plan = compact_ids.get_plan([User, Card, Bank])
+        phase = options['phase']
+        if phase == 'status':
+            for table, columns in compact_ids.status(connection, plan).items():
+                self.stdout.write('%s: %s' % (table, ', '.join('%s %s' % item for item in columns.items())))
+            return
+        kwargs = {'log': self.stdout.write}
+        if phase == 'backfill':
+            kwargs.update(batch_size=options['batch_size'], sleep=options['sleep'])
+        compact_ids.PHASES[phase](connection, plan, **kwargs)
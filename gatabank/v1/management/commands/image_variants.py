@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from v1.caches import response_caches
+from v1.images import update_variants
+from v1.models import Bank, Card
+
+class Command(BaseCommand):
+    help = ('Generate the thumbnails and WebP/AVIF variants of existing bank and card images, '
+            'skipping the ones already made for the current image unless --force is given')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='regenerate every variant')
+
+    def handle(self, *args, **options):
+        for model, namespace in ((Bank, 'banks'), (Card, 'cards')):
+            updated = 0
+            for entity in model.all_objects.exclude(image='').exclude(image=None).iterator():
+                if options['force']:
+                    entity.image_variants = {}
+                previous = entity.image_variants
+                update_variants(entity)
+                if entity.image_variants != previous:
+                    # no post_save here, so the cached lists and this object's detail are dropped by hand
+                    model.all_objects.filter(pk=entity.pk).update(image_variants=entity.image_variants)
+                    response_caches[namespace].invalidate(str(entity.pk))
+                    updated += 1
+                    if len(entity.image_variants) == 1:
+                        self.stderr.write('%s %s: could not read %s' % (model.__name__, entity.pk, entity.image.name))
+            self.stdout.write('%s: %d updated' % (model.__name__, updated))
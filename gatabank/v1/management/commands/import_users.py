@@ -0,0 +1,41 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from v1.imports import IMPORT_FORMATS, UserImporter, check_encoding, guess_format, iter_import_rows
+
+class Command(BaseCommand):
+    help = 'Create users from a CSV or NDJSON lead file, writing one NDJSON result per row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=IMPORT_FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--report', help='write per-row results to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or guess_format(path)
+        importer = UserImporter(batch_size=options['batch_size'])
+        started = time.perf_counter()
+        try:
+            stream = open(path, 'rb')
+        except IOError as e:
+            raise CommandError('Cannot read %s: %s' % (path, e))
+        try:
+            check_encoding(stream)
+        except ValueError as e:
+            stream.close()
+            raise CommandError('Cannot read %s: %s' % (path, e))
+        report = open(options['report'], 'w') if options['report'] else self.stdout
+        try:
+            with stream:
+                for result in importer.run(iter_import_rows(stream, format)):
+                    report.write(json.dumps(result) + '\n')
+        finally:
+            if options['report']:
+                report.close()
+        elapsed = time.perf_counter() - started
+        rows = sum(importer.counts.values())
+        self.stderr.write('%d rows in %.1fs (%d rows/s): %d created, %d duplicate, %d invalid, %d failed' % (
+            rows, elapsed, rows / elapsed if elapsed else 0, importer.counts['created'],
+            importer.counts['duplicate'], importer.counts['invalid'], importer.counts['failed']))
@@ -0,0 +1,134 @@
+import io
+import os
+import re
+import time
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from v1.areas import area_index
+from v1.models import City, District, Village
+
+INSERT_RE = re.compile(r'\s*INSERT INTO `(\w+)` \(([^)]*)\) VALUES', re.IGNORECASE)
+ESCAPES = {'n': '\n', 'r': '\r', 't': '\t', '0': '\0'}
+
+TABLES = {
+    'cities': City,
+    'districts': District,
+    'villages': Village,
+}
+
+def iter_dump_rows(lines):
+    """
+    Yield (table, columns, values) for every tuple of every INSERT statement
+    in a mysqldump/phpMyAdmin dump, reading it one line at a time.
+    """
+    table = columns = row = value = None
+    quoted = in_string = escape = just_closed = False
+    for line in lines:
+        if table is None:
+            match = INSERT_RE.match(line)
+            if not match:
+                continue
+            table = match.group(1)
+            columns = [column.strip(' `') for column in match.group(2).split(',')]
+            line = line[match.end():]
+        for char in line:
+            if in_string:
+                if escape:
+                    value.append(ESCAPES.get(char, char))
+                    escape = False
+                elif char == '\\':
+                    escape = True
+                elif char == "'":
+                    in_string = False
+                    just_closed = True
+                    continue
+                else:
+                    value.append(char)
+            elif char == "'":
+                if just_closed:
+                    value.append("'")
+                in_string = quoted = True
+            elif row is None:
+                if char == '(':
+                    row, value, quoted = [], [], False
+                elif char == ';':
+                    table = None
+                    break
+            elif char in ',)':
+                text = ''.join(value)
+                row.append(None if not quoted and text.upper() == 'NULL' else text)
+                value, quoted = [], False
+                if char == ')':
+                    yield table, columns, row
+                    row = None
+            elif not char.isspace():
+                value.append(char)
+            just_closed = False
+
+class Command(BaseCommand):
+    help = 'Load or refresh cities, districts and villages from a phpMyAdmin SQL dump'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?',
+                            default=os.path.join(settings.BASE_DIR, 'resources', 'don_vi_hanh_chinh.sql'))
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError('Dump file "%s" does not exist' % path)
+        self.using = options['database']
+        self.batch_size = options['batch_size']
+        self.stats = {table: {'created': 0, 'updated': 0, 'unchanged': 0} for table in TABLES}
+        connection = connections[self.using]
+        started = time.time()
+        total = 0
+        pending = {table: [] for table in TABLES}
+        with transaction.atomic(using=self.using):
+            with connection.constraint_checks_disabled():
+                with io.open(path, encoding='utf-8') as stream:
+                    for table, columns, values in iter_dump_rows(stream):
+                        if table not in TABLES:
+                            continue
+                        pending[table].append(dict(zip(columns, values)))
+                        total += 1
+                        if len(pending[table]) >= self.batch_size:
+                            self.flush(table, pending[table])
+                            pending[table] = []
+                for table, rows in pending.items():
+                    if rows:
+                        self.flush(table, rows)
+            connection.check_constraints(table_names=[model._meta.db_table for model in TABLES.values()])
+        area_index.invalidate()
+        elapsed = max(time.time() - started, 1e-6)
+        for table, counts in self.stats.items():
+            self.stdout.write('%s: %d created, %d updated, %d unchanged' % (
+                table, counts['created'], counts['updated'], counts['unchanged']))
+        self.stdout.write(self.style.SUCCESS('Loaded %d rows in %.2fs (%d rows/s)' % (
+            total, elapsed, total / elapsed)))
+
+    def flush(self, table, rows):
+        model = TABLES[table]
+        fields = [column for column in rows[0] if column != 'id']
+        existing = model.all_objects.using(self.using).in_bulk([row['id'] for row in rows])
+        now = datetime.datetime.now()
+        created, updated = [], []
+        for row in rows:
+            obj = existing.get(row['id'])
+            if obj is None:
+                created.append(model(**row))
+            elif any(getattr(obj, field) != row[field] for field in fields):
+                for field in fields:
+                    setattr(obj, field, row[field])
+                obj.updated_at = now
+                updated.append(obj)
+        # rows are already flushed in --batch-size chunks; let the backend cap the statement size
+        model.objects.using(self.using).bulk_create(created)
+        model.all_objects.using(self.using).bulk_update(updated, fields + ['updated_at'], batch_size=self.batch_size)
+        counts = self.stats[table]
+        counts['created'] += len(created)
+        counts['updated'] += len(updated)
+        counts['unchanged'] += len(rows) - len(created) - len(updated)
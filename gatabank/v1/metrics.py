@@ -0,0 +1,200 @@
+"""
+Per-view request instrumentation: histograms of latency, database queries, serializer
+and render time and response size, keyed by the resolved view, plus sampled traces of
+slow requests with their SQL. Everything is exported in the Prometheus text format.
+"""
+import bisect
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from asgiref.local import Local
+from django.conf import settings
+from v1 import stats
+
+# per request (thread or async task): the RequestMetrics being recorded, if any
+state = Local()
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+def get_config():
+    config = {'SLOW_SECONDS': 0.5, 'SAMPLE_RATE': 0.1, 'TRACES': 50, 'MAX_QUERIES': 100}
+    config.update(getattr(settings, 'V1_METRICS', {}))
+    return config
+
+class Histogram(object):
+    """
+    Cumulative Prometheus histogram with one series per tuple of `labelnames` values.
+    """
+
+    def __init__(self, name, help, labelnames, buckets):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                # per-bucket counts (the last one is +Inf), sum, count
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def reset(self):
+        with self._lock:
+            self.series = {}
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count)
+                            in self.series.items())
+        for labels, (counts, total, count) in series:
+            base = format_labels(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket{%s} %d' % (self.name, ','.join(
+                    filter(None, [base, 'le="%s"' % format_value(bound)])), cumulative))
+            lines.append('%s_sum%s %s' % (self.name, '{%s}' % base if base else '', format_value(total)))
+            lines.append('%s_count%s %d' % (self.name, '{%s}' % base if base else '', count))
+        return lines
+
+def format_value(value):
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(pairs):
+    return ','.join('%s="%s"' % (name, escape_label(value)) for name, value in pairs)
+
+LABELS = ('view', 'method')
+request_duration = Histogram('v1_request_duration_seconds', 'Time from the first to the last middleware.',
+                             LABELS, SECONDS_BUCKETS)
+db_queries = Histogram('v1_db_queries', 'Database queries per request.', LABELS, QUERY_BUCKETS)
+db_duration = Histogram('v1_db_duration_seconds', 'Database time per request.', LABELS, SECONDS_BUCKETS)
+serializer_duration = Histogram('v1_serializer_duration_seconds',
+                                'Serializer time per request, not counting queries it ran.', LABELS, SECONDS_BUCKETS)
+render_duration = Histogram('v1_render_duration_seconds', 'Renderer time per request.', LABELS, SECONDS_BUCKETS)
+response_size = Histogram('v1_response_size_bytes', 'Response body size, after compression.', LABELS, SIZE_BUCKETS)
+HISTOGRAMS = [request_duration, db_queries, db_duration, serializer_duration, render_duration, response_size]
+
+traces = deque(maxlen=get_config()['TRACES'])
+
+class RequestMetrics(object):
+    """
+    Accumulates the timings of one request. Only sampled requests keep their SQL.
+    """
+
+    def __init__(self, sampled=False, max_queries=100):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        self.sampled = sampled
+        self.max_queries = max_queries
+        self.sql = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper for every connection used while the request runs
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if self.sampled and len(self.sql) < self.max_queries:
+                self.sql.append({'sql': sql, 'time': round(elapsed, 6), 'alias': context['connection'].alias})
+
+def current():
+    return getattr(state, 'metrics', None)
+
+@contextmanager
+def serializing():
+    """
+    Adds the time spent in the block, less the queries run in it, to the serializer time
+    of the current request. A no-op outside instrumented requests.
+    """
+    metrics = current()
+    if metrics is None:
+        yield
+        return
+    started, db_time = time.perf_counter(), metrics.db_time
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (metrics.db_time - db_time)
+        metrics.serializer_time += max(elapsed, 0.0)
+
+def start(config):
+    metrics = state.metrics = RequestMetrics(random.random() < config['SAMPLE_RATE'], config['MAX_QUERIES'])
+    return metrics
+
+def observe(request, response, duration, queries=0, db_time=0.0, serializer_time=0.0, render_time=0.0):
+    """
+    Adds one request to the histograms and returns its labels. Called directly for the
+    requests v1.asgi answers from memory, which never reach the middleware.
+    """
+    match = getattr(request, 'resolver_match', None)
+    labels = (match.view_name if match is not None else '<unresolved>', request.method)
+    request_duration.observe(labels, duration)
+    db_queries.observe(labels, queries)
+    db_duration.observe(labels, db_time)
+    serializer_duration.observe(labels, serializer_time)
+    render_duration.observe(labels, render_time)
+    if not response.streaming:
+        response_size.observe(labels, len(response.content))
+    return labels
+
+def finish(metrics, request, response, config):
+    state.metrics = None
+    duration = time.perf_counter() - metrics.started
+    labels = observe(request, response, duration, metrics.queries, metrics.db_time,
+                     metrics.serializer_time, metrics.render_time)
+    if metrics.sampled and duration >= config['SLOW_SECONDS']:
+        traces.append({
+            'view': labels[0], 'method': request.method, 'path': request.path, 'status': response.status_code,
+            'time': round(duration, 6), 'db_time': round(metrics.db_time, 6),
+            'serializer_time': round(metrics.serializer_time, 6), 'render_time': round(metrics.render_time, 6),
+            'queries': metrics.queries, 'sql': metrics.sql,
+        })
+
+stats.register('slow_requests', lambda: list(traces))
+
+re_invalid = re.compile(r'[^a-zA-Z0-9_]')
+
+def flatten(prefix, value):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            for pair in flatten('%s_%s' % (prefix, key), item):
+                yield pair
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield re_invalid.sub('_', prefix), value
+
+def expose():
+    """
+    The request histograms, then every numeric counter of the stats registry as a gauge
+    named `v1_stats_<provider>_<keys>`, in the Prometheus text format.
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    for name, value in flatten('v1_stats', stats.collect()):
+        lines.append('# TYPE %s gauge' % name)
+        lines.append('%s %s' % (name, format_value(value)))
+    return '\n'.join(lines) + '\n'
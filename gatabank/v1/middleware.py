@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import io
+import re
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence
+from v1 import metrics, routers
+from v1.caches import LRUCache
+
+try:
+    # in requirements.txt; without it responses fall back to gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+re_coding = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$')
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'application/xml', 'text/', 'image/svg+xml')
+
+def parse_accept_encoding(header):
+    """
+    {coding: q} from an Accept-Encoding header, leaving out codings refused with q=0.
+    """
+    codings = {}
+    for part in header.split(','):
+        match = re_coding.match(part)
+        if match is None:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        codings[match.group(1).lower()] = quality
+    return {coding: quality for coding, quality in codings.items() if quality > 0}
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Brotli or gzip compression negotiated from the Accept-Encoding q-values, brotli winning
+    ties; streaming responses are only gzipped. Responses below MIN_SIZE, already encoded
+    ones and binary content types are left alone. Compressed bodies are memoized by content
+    hash, so repeated cached responses are compressed once.
+    """
+
+    def __init__(self, get_response=None):
+        super(CompressionMiddleware, self).__init__(get_response)
+        config = {'MIN_SIZE': 1024, 'GZIP_LEVEL': 6, 'BROTLI_QUALITY': 5, 'CACHE_ENTRIES': 256}
+        config.update(getattr(settings, 'V1_COMPRESSION', {}))
+        self.config = config
+        self.compressed = LRUCache(config['CACHE_ENTRIES'])
+
+    def get_encoding(self, request, streaming=False):
+        codings = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        candidates = ['br', 'gzip'] if brotli is not None and not streaming else ['gzip']
+        candidates = [coding for coding in candidates if codings.get(coding, codings.get('*', 0)) > 0]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda coding: codings.get(coding, codings.get('*', 0)))
+
+    def compress(self, content, encoding):
+        key = (hashlib.sha1(content).digest(), encoding)
+        compressed = self.compressed.get(key)
+        if compressed is None:
+            if encoding == 'br':
+                compressed = brotli.compress(content, quality=self.config['BROTLI_QUALITY'])
+            else:
+                buffer = io.BytesIO()
+                with gzip.GzipFile(mode='wb', compresslevel=self.config['GZIP_LEVEL'], fileobj=buffer, mtime=0) as f:
+                    f.write(content)
+                compressed = buffer.getvalue()
+            self.compressed.set(key, compressed)
+        return compressed
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < self.config['MIN_SIZE']:
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.get_encoding(request, response.streaming)
+        if encoding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_sequence(response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = self.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Lets safe requests under the v1 prefix read from replicas, except for clients that
+    wrote in the last STICKY_SECONDS: those are pinned to the primary, browsers through a
+    cookie and token clients through an entry in the PIN_CACHE cache keyed by their
+    Authorization header, so they always read their own writes. That cache has to be shared
+    by every worker, or a token client's next read can land on a worker that never saw the pin.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    PIN_COOKIE = 'v1_primary'
+
+    def __init__(self, get_response=None):
+        super(ReplicaRoutingMiddleware, self).__init__(get_response)
+        config = routers.get_config()
+        if config['ALIASES'] and isinstance(caches[config['PIN_CACHE']], (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured(
+                'the %r cache pins writers to the primary but is not shared between processes; point '
+                'PIN_CACHE in V1_REPLICAS at a shared cache such as memcached' % config['PIN_CACHE'])
+
+    @property
+    def pins(self):
+        return caches[routers.get_config()['PIN_CACHE']]
+
+    @staticmethod
+    def get_pin_key(request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return 'v1:primary:%s' % hashlib.sha1(authorization.encode('utf-8')).hexdigest()
+
+    def is_pinned(self, request):
+        if self.PIN_COOKIE in request.COOKIES:
+            return True
+        key = self.get_pin_key(request)
+        return key is not None and self.pins.get(key) is not None
+
+    def process_request(self, request):
+        config = routers.get_config()
+        routers.use_replicas(request.method in self.SAFE_METHODS and request.path.startswith(config['PREFIX'])
+                             and not self.is_pinned(request))
+
+    def process_response(self, request, response):
+        routers.use_replicas(False)
+        if request.method not in self.SAFE_METHODS and response.status_code < 400:
+            sticky = routers.get_config()['STICKY_SECONDS']
+            response.set_cookie(self.PIN_COOKIE, '1', max_age=sticky, httponly=True, samesite='Lax')
+            key = self.get_pin_key(request)
+            if key is not None:
+                self.pins.set(key, True, sticky)
+        return response
+
+class InstrumentationMiddleware(object):
+    """
+    Records, per resolved view and method, the request duration, database queries and
+    their time, serializer and render time and response size into the histograms of
+    v1.metrics. A SAMPLE_RATE share of requests also keeps its SQL, and those slower
+    than SLOW_SECONDS are kept as traces. Goes first, so the response size is the
+    compressed one and the duration covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = metrics.get_config()
+
+    def __call__(self, request):
+        recorder = metrics.start(self.config)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        except BaseException:
+            metrics.state.metrics = None
+            raise
+        metrics.finish(recorder, request, response, self.config)
+        return response
+
+    def process_template_response(self, request, response):
+        recorder = metrics.current()
+        if recorder is not None:
+            started = time.perf_counter()
+            def rendered(response):
+                recorder.render_time += time.perf_counter() - started
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,45 @@
+# Generated by Django 2.2 on 2026-10-18 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('v1', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cardbasic',
+            index=models.Index(fields=['yearlyFee', 'card'], name='card_basic_fee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardbasic',
+            index=models.Index(fields=['interest', 'card'], name='card_basic_interest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardbasic',
+            index=models.Index(fields=['interestFreeDay', 'card'], name='card_basic_free_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardbasic',
+            index=models.Index(fields=['averageRefund', 'card'], name='card_basic_refund_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardbasic',
+            index=models.Index(fields=['freeAirportLounge', 'card'], name='card_basic_lounge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardbasic',
+            index=models.Index(fields=['cardOrg', 'card'], name='card_basic_org_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardrequirement',
+            index=models.Index(fields=['incomeRequirement', 'card'], name='card_req_income_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardrequirement',
+            index=models.Index(fields=['age', 'card'], name='card_req_age_idx'),
+        ),
+    ]
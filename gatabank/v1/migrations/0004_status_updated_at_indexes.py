@@ -0,0 +1,161 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('v1', '0003_user_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='bank',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='bankdiscount',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='bankfee',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='bankrequirement',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='card',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='cardbasic',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='cardbenefit',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='carddiscount',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='cardfee',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='cardrequirement',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='city',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='district',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='user',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='village',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AddIndex(
+            model_name='bank',
+            index=models.Index(fields=['status', 'updated_at'], name='bank_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankdiscount',
+            index=models.Index(fields=['status', 'updated_at'], name='bankdiscount_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankdiscount',
+            index=models.Index(fields=['bank', 'status'], name='bank_discount_bank_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankfee',
+            index=models.Index(fields=['status', 'updated_at'], name='bankfee_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankfee',
+            index=models.Index(fields=['bank', 'status'], name='bank_fee_bank_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankrequirement',
+            index=models.Index(fields=['status', 'updated_at'], name='bankrequirement_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankrequirement',
+            index=models.Index(fields=['bank', 'status'], name='bank_req_bank_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['status', 'updated_at'], name='card_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardbasic',
+            index=models.Index(fields=['status', 'updated_at'], name='cardbasic_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardbasic',
+            index=models.Index(fields=['card', 'status'], name='card_basic_card_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardbenefit',
+            index=models.Index(fields=['status', 'updated_at'], name='cardbenefit_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardbenefit',
+            index=models.Index(fields=['card', 'status'], name='card_benefit_card_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='carddiscount',
+            index=models.Index(fields=['status', 'updated_at'], name='carddiscount_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='carddiscount',
+            index=models.Index(fields=['card', 'status'], name='card_discount_card_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardfee',
+            index=models.Index(fields=['status', 'updated_at'], name='cardfee_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardfee',
+            index=models.Index(fields=['card', 'status'], name='card_fee_card_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardrequirement',
+            index=models.Index(fields=['status', 'updated_at'], name='cardrequirement_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardrequirement',
+            index=models.Index(fields=['card', 'status'], name='card_req_card_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['status', 'updated_at'], name='city_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='district',
+            index=models.Index(fields=['status', 'updated_at'], name='district_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['status', 'updated_at'], name='user_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_staff', 'updated_at', 'id'], name='users_staff_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='village',
+            index=models.Index(fields=['status', 'updated_at'], name='village_status_upd_idx'),
+        ),
+    ]
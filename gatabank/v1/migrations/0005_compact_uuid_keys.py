@@ -0,0 +1,102 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:30
+
+from django.db import migrations, models
+import v1.fields
+from v1 import compact_ids
+
+
+def convert_keys(apps, schema_editor):
+    # the converted columns include django_admin_log.user_id, hence the admin dependency
+    models = [apps.get_model('v1', name) for name in ('User', 'Card', 'Bank')]
+    compact_ids.convert(schema_editor, models, v1.fields.CompactUUIDField(
+        default=v1.fields.uuid7, editable=False, primary_key=True, serialize=False))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin', '0003_logentry_add_action_flag_choices'),
+        ('v1', '0004_status_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bankdiscount',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='bankfee',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='bankrequirement',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='cardbasic',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='cardbenefit',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='carddiscount',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='cardfee',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='cardrequirement',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='city',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='district',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='village',
+            name='id',
+            field=models.CharField(default=v1.fields.uuid7, editable=False, max_length=255, primary_key=True, serialize=False),
+        ),
+        # on MySQL the keys and every foreign key to them change type, which a plain
+        # AlterField would do by truncating the text; see v1.compact_ids
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(convert_keys, migrations.RunPython.noop),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='bank',
+                    name='id',
+                    field=v1.fields.CompactUUIDField(default=v1.fields.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='card',
+                    name='id',
+                    field=v1.fields.CompactUUIDField(default=v1.fields.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='id',
+                    field=v1.fields.CompactUUIDField(default=v1.fields.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('v1', '0005_compact_uuid_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bank',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
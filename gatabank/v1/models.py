@@ -1,8 +1,11 @@
-from django.db import models
-import uuid
+from collections import Counter
+from django.db import models, router, transaction
+from django.dispatch import Signal
 import datetime
 from django.core.exceptions import ObjectDoesNotExist, FieldError
 from .enum import Status
+from .fields import CompactUUIDField, uuid7
+from . import hashing
 from django.utils import timezone
 from rest_framework import exceptions
 from django.contrib.auth.hashers import make_password, check_password
@@ -12,16 +15,76 @@ from django.contrib.auth.models import PermissionsMixin
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.utils.html import mark_safe
 
+# sent with the model and the primary keys of the rows a soft delete marked DELETED,
+# which happens through UPDATEs that fire no post_save/post_delete
+soft_deleted = Signal()
+
+def soft_delete_cascades(model):
+    """
+    (model, field name) of the entities whose foreign key to `model` cascades deletes.
+    """
+    for relation in model._meta.related_objects:
+        if (relation.on_delete is models.CASCADE and not relation.many_to_many
+                and issubclass(relation.related_model, AbstractEntity)):
+            yield relation.related_model, relation.field.name
+
+class EntityQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """
+        Mark the rows, and the rows that cascade from them, DELETED with one UPDATE per
+        table instead of loading and deleting every related object. Returns the same
+        (total, {model label: count}) as QuerySet.delete().
+        """
+        deleted = Counter()
+        with transaction.atomic(using=self.db):
+            pks = list(self.exclude(status=Status.DELETED.name).order_by().values_list('pk', flat=True))
+            if not pks:
+                return 0, {}
+            for model, field in soft_delete_cascades(self.model):
+                count, counts = model.all_objects.using(self.db).filter(**{'%s__in' % field: pks}).soft_delete()
+                deleted.update(counts)
+            deleted[self.model._meta.label] += self.model.all_objects.using(self.db).filter(pk__in=pks).update(
+                status=Status.DELETED.name, updated_at=datetime.datetime.now())
+        soft_deleted.send(sender=self.model, pks=pks, using=self.db)
+        return sum(deleted.values()), dict(deleted)
+    soft_delete.alters_data = True
+    soft_delete.queryset_only = True
+
+    def delete(self):
+        return self.soft_delete()
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def hard_delete(self):
+        return super(EntityQuerySet, self).delete()
+    hard_delete.alters_data = True
+    hard_delete.queryset_only = True
+
+class ActiveManager(models.Manager.from_queryset(EntityQuerySet)):
+    """
+    Default manager of entities, limited to ACTIVE rows; `all_objects` sees every row.
+    """
+
+    def get_queryset(self):
+        return super(ActiveManager, self).get_queryset().filter(status=Status.ACTIVE.name)
+
 class AbstractEntity(models.Model):
-    id = models.CharField(max_length=255, primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.CharField(max_length=255, primary_key=True, default=uuid7, editable=False)
     created_at = models.DateTimeField('created_at', default=datetime.datetime.now)
     updated_at = models.DateTimeField('updated_at', default=datetime.datetime.now)
     status = models.CharField(max_length=300, choices=Status.choices(), blank=True, null=False,
                             default=Status.ACTIVE.name)
 
+    objects = ActiveManager()
+    all_objects = models.Manager.from_queryset(EntityQuerySet)()
+
     class Meta:
         abstract = True
         ordering = ['-updated_at']
+        # lists and get_active_object_by_id filter on status and sort on updated_at
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='%(class)s_status_upd_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.id:
@@ -29,6 +92,15 @@ class AbstractEntity(models.Model):
         self.updated_at = datetime.datetime.now()
         return super(AbstractEntity, self).save(*args, **kwargs)
 
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        result = type(self).all_objects.using(using).filter(pk=self.pk).soft_delete()
+        self.status = Status.DELETED.name
+        return result
+
+    def hard_delete(self, using=None, keep_parents=False):
+        return super(AbstractEntity, self).delete(using=using, keep_parents=keep_parents)
+
     @classmethod
     def get_object_by_id(cls, pk):
         try:
@@ -48,7 +120,7 @@ class City(AbstractEntity, models.Model):
     name = models.CharField(max_length=300, blank=True, null=False)
     type = models.CharField(max_length=300, blank=True, null=False)
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'cities'
 
 class District(AbstractEntity, models.Model):
@@ -56,7 +128,7 @@ class District(AbstractEntity, models.Model):
     type = models.CharField(max_length=300, blank=True, null=False)
     city = models.ForeignKey('v1.City', null=True, default=None, on_delete=models.CASCADE, db_column='city_id')
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'districts'
 
 class Village(AbstractEntity, models.Model):
@@ -64,11 +136,11 @@ class Village(AbstractEntity, models.Model):
     type = models.CharField(max_length=300, blank=True, null=False)
     district = models.ForeignKey('v1.District', null=True, default=None, on_delete=models.CASCADE, db_column='district_id')
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'villages'
 
 
-class UserManager(BaseUserManager):
+class UserManager(BaseUserManager, ActiveManager):
     use_in_migrations = True
     def _create_user(self, phone_number, password, **extra_fields):
         user = self.model(phone_number=phone_number, **extra_fields)
@@ -88,6 +160,7 @@ class UserManager(BaseUserManager):
         return self._create_user(phone_number, password, **extra_fields)
 
 class User(AbstractEntity, AbstractBaseUser, PermissionsMixin):
+    id = CompactUUIDField(primary_key=True, default=uuid7, editable=False)
     phone_number = PhoneNumberField(null=False, unique=True)
     district = models.ForeignKey('v1.District', null=True, default=None, on_delete=models.CASCADE, db_column='district_id')
     city = models.ForeignKey('v1.City', null=True, default=None, on_delete=models.CASCADE, db_column='city_id')
@@ -103,8 +176,25 @@ class User(AbstractEntity, AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return str(self.phone_number)
 
-    class Meta:
+    # hashing runs on the v1.hashing process pool instead of the request worker
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        is_correct, must_update = hashing.check_password(raw_password, self.password)
+        if is_correct and must_update:
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+        return is_correct
+
+    class Meta(AbstractEntity.Meta):
         db_table = 'users'
+        indexes = AbstractEntity.Meta.indexes + [
+            models.Index(fields=['updated_at', 'id'], name='users_updated_at_id_idx'),
+            models.Index(fields=['is_staff', 'updated_at', 'id'], name='users_staff_updated_idx'),
+        ]
 
 class BankRequirement(AbstractEntity, models.Model):
     bank = models.ForeignKey('v1.Bank', null=True, default=None, on_delete=models.CASCADE, db_column='bank_id', related_name = 'bank_requirement_set')
@@ -114,8 +204,11 @@ class BankRequirement(AbstractEntity, models.Model):
     homeIdentifier = models.CharField(max_length=512, blank=True, null=True)
     other = models.CharField(max_length=512, blank=True, null=True)
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'bank_requirements'
+        indexes = AbstractEntity.Meta.indexes + [
+            models.Index(fields=['bank', 'status'], name='bank_req_bank_status_idx'),
+        ]
 
 class BankFee(AbstractEntity, models.Model):
     bank = models.ForeignKey('v1.Bank', null=True, default=None, on_delete=models.CASCADE, db_column='bank_id', related_name = 'bank_fee_set')
@@ -123,20 +216,33 @@ class BankFee(AbstractEntity, models.Model):
     penaltyInterest = models.CharField(max_length=512, blank=True, null=True)
     earlierPaymentFee = models.CharField(max_length=512, blank=True, null=True)
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'bank_fees'
+        indexes = AbstractEntity.Meta.indexes + [
+            models.Index(fields=['bank', 'status'], name='bank_fee_bank_status_idx'),
+        ]
 
 class BankDiscount(AbstractEntity, models.Model):
     bank = models.ForeignKey('v1.Bank', null=True, default=None, on_delete=models.CASCADE, db_column='bank_id', related_name = 'bank_discount_set')
     label = models.CharField(max_length=512, blank=True, null=True)
     description = models.CharField(max_length=512, blank=True, null=True)
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'bank_discounts'
+        indexes = AbstractEntity.Meta.indexes + [
+            models.Index(fields=['bank', 'status'], name='bank_discount_bank_status_idx'),
+        ]
+
+def image_tag(entity):
+    thumb = (entity.image_variants or {}).get('thumb', {})
+    return mark_safe('<img src="/%s" width="150" height="100" />' % (thumb.get('webp') or entity.image))
 
 class Bank(AbstractEntity, models.Model):
+    id = CompactUUIDField(primary_key=True, default=uuid7, editable=False)
     name = models.CharField(max_length=512, blank=True, null=True)
     image = models.ImageField(upload_to='media/image/banks', blank=True, null=True)
+    # thumbnails and WebP/AVIF copies of image, see v1.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     minLoanAmount = models.IntegerField(blank=True, null=True)
     maxLoanAmount = models.IntegerField(blank=True, null=True)
     interestPercentage = models.IntegerField(blank=True, null=True)
@@ -147,11 +253,11 @@ class Bank(AbstractEntity, models.Model):
     verifiedIn = models.CharField(max_length=512, blank=True, null=True)
     interestCalMethod = models.CharField(max_length=512, blank=True, null=True)
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'banks'
     
     def image_tag(self):
-        return mark_safe('<img src="/%s" width="150" height="100" />' % (self.image))
+        return image_tag(self)
 
     image_tag.short_description = 'Image'
 
@@ -163,16 +269,22 @@ class CardDiscount(AbstractEntity, models.Model):
     label = models.CharField(max_length=512, blank=True, null=True)
     description = models.CharField(max_length=512, blank=True, null=True)
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'card_discounts'
+        indexes = AbstractEntity.Meta.indexes + [
+            models.Index(fields=['card', 'status'], name='card_discount_card_status_idx'),
+        ]
 
 class CardBenefit(AbstractEntity, models.Model):
     card = models.ForeignKey('v1.Card', null=True, default=None, on_delete=models.CASCADE, db_column='card_id', related_name = 'card_benefit_set')
     label = models.CharField(max_length=512, blank=True, null=True)
     description = models.CharField(max_length=512, blank=True, null=True)
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'card_benefits'
+        indexes = AbstractEntity.Meta.indexes + [
+            models.Index(fields=['card', 'status'], name='card_benefit_card_status_idx'),
+        ]
 
 class CardRequirement(AbstractEntity, models.Model):
     card = models.ForeignKey('v1.Card', null=True, default=None, on_delete=models.CASCADE, db_column='card_id', related_name = 'card_requirement_set')
@@ -181,8 +293,13 @@ class CardRequirement(AbstractEntity, models.Model):
     incomeRequirement = models.IntegerField(null=True)
     homeIdentifier = models.CharField(max_length=512, blank=True, null=True)
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'card_requirements'
+        indexes = AbstractEntity.Meta.indexes + [
+            models.Index(fields=['card', 'status'], name='card_req_card_status_idx'),
+            models.Index(fields=['incomeRequirement', 'card'], name='card_req_income_idx'),
+            models.Index(fields=['age', 'card'], name='card_req_age_idx'),
+        ]
 
 class CardFee(AbstractEntity, models.Model):
     card = models.ForeignKey('v1.Card', null=True, default=None, on_delete=models.CASCADE, db_column='card_id', related_name = 'card_fee_set')
@@ -190,8 +307,11 @@ class CardFee(AbstractEntity, models.Model):
     latePayment = models.CharField(max_length=512, blank=True, null=True)
     foreignTransaction = models.CharField(max_length=512, blank=True, null=True)
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'card_fees'
+        indexes = AbstractEntity.Meta.indexes + [
+            models.Index(fields=['card', 'status'], name='card_fee_card_status_idx'),
+        ]
 
 class CardBasic(AbstractEntity, models.Model):
     card = models.ForeignKey('v1.Card', null=True, default=None, on_delete=models.CASCADE, db_column='card_id', related_name = 'card_basic_set')
@@ -205,22 +325,46 @@ class CardBasic(AbstractEntity, models.Model):
     interestFreeDay = models.IntegerField(null=True)
     paymentEachMonth = models.IntegerField(null=True)
 
-    class Meta:
+    class Meta(AbstractEntity.Meta):
         db_table = 'card_basics'
+        indexes = AbstractEntity.Meta.indexes + [
+            models.Index(fields=['card', 'status'], name='card_basic_card_status_idx'),
+            models.Index(fields=['yearlyFee', 'card'], name='card_basic_fee_idx'),
+            models.Index(fields=['interest', 'card'], name='card_basic_interest_idx'),
+            models.Index(fields=['interestFreeDay', 'card'], name='card_basic_free_day_idx'),
+            models.Index(fields=['averageRefund', 'card'], name='card_basic_refund_idx'),
+            models.Index(fields=['freeAirportLounge', 'card'], name='card_basic_lounge_idx'),
+            models.Index(fields=['cardOrg', 'card'], name='card_basic_org_idx'),
+        ]
 
 class Card(AbstractEntity, models.Model):
+    id = CompactUUIDField(primary_key=True, default=uuid7, editable=False)
     name = models.CharField(max_length=512, blank=True, null=True)
     sponsor = models.CharField(max_length=512, blank=True, null=True)
     subtitle = models.CharField(max_length=512, blank=True, null=True)
     rating = models.FloatField(null=True)
     image = models.ImageField(upload_to='media/image/cards', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     def __str__(self):
         return self.name
 
     def image_tag(self):
-        return mark_safe('<img src="/%s" width="150" height="100" />' % (self.image))
+        return image_tag(self)
 
     image_tag.short_description = 'Image'
 
+    class Meta(AbstractEntity.Meta):
+        db_table = 'cards'
+
+
+class CacheVersion(models.Model):
+    """
+    Source of truth for the version tokens of v1.caches, so invalidations reach every
+    process even when the Django cache is process-local.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    token = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
-        db_table = 'cards'
\ No newline at end of file
+        db_table = 'cache_versions'
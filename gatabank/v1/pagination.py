@@ -0,0 +1,90 @@
+import base64
+import binascii
+import json
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+class UpdatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (updated_at, id): a cursor holds the pair of the last row seen
+    and the next page is the rows after it in that order, `(updated_at, id) > (%s, %s)`.
+    Every page is an index range scan with no COUNT(*) and no OFFSET, however many rows
+    share a timestamp.
+    """
+    ordering = ('updated_at', 'id')
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        position = self.decode_position(queryset, request)
+        reverse = position is not None and position[2]
+        if position is not None:
+            queryset = self.seek(queryset, position[0], position[1], reverse)
+        order = ('-updated_at', '-pk') if reverse else ('updated_at', 'pk')
+        rows = list(queryset.order_by(*order)[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+        # the row a cursor names exists, so there is always a page on its other side
+        self.has_next = True if reverse else more
+        self.has_previous = more if reverse else position is not None
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    @staticmethod
+    def seek(queryset, updated_at, pk, reverse):
+        """
+        Rows after (before, when `reverse`) the (updated_at, pk) pair in keyset order.
+        """
+        meta = queryset.model._meta
+        connection = connections[queryset.db]
+        quote = connection.ops.quote_name
+        columns = ', '.join('%s.%s' % (quote(meta.db_table), quote(meta.get_field(name).column))
+                            for name in ('updated_at', meta.pk.name))
+        params = [meta.get_field('updated_at').get_db_prep_value(updated_at, connection),
+                  meta.pk.get_db_prep_value(pk, connection)]
+        lookup = 'updated_at__lte' if reverse else 'updated_at__gte'
+        # the single-column bound lets every backend start the index range scan at the cursor
+        return queryset.filter(**{lookup: updated_at}).extra(
+            where=['(%s) %s (%%s, %%s)' % (columns, '<' if reverse else '>')], params=params)
+
+    def decode_position(self, queryset, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            updated_at, pk, reverse = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            updated_at = parse_datetime(updated_at)
+            pk = queryset.model._meta.pk.to_python(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if updated_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return updated_at, pk, bool(reverse)
+
+    def position_url(self, row, reverse):
+        values = [row.get('updated_at'), row.get('id')] if isinstance(row, dict) else [row.updated_at, row.pk]
+        data = json.dumps([values[0].isoformat(), str(values[1]), reverse])
+        encoded = base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.position_url(self.page[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.position_url(self.page[0], True)
@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from django.db import DatabaseError, connections
+from v1 import stats
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeout(Exception):
+    pass
+
+class Pool(object):
+    """
+    Bounded pool of reusable connections made by `connect`. Checkout hands out an idle
+    connection that passes `validate` (replacing ones that do not), opens a new one while
+    fewer than `max_size` exist, or waits up to `timeout` seconds for a checkin.
+    """
+
+    def __init__(self, name, connect, validate=None, close=None, max_size=10, min_size=0, timeout=10):
+        self.name = name
+        self.connect = connect
+        self.validate = validate or (lambda connection: True)
+        self.close_connection = close or (lambda connection: connection.close())
+        self.max_size = max_size
+        self.min_size = min_size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.idle = deque()
+        self.size = 0
+        self._condition = threading.Condition()
+        self.counters = {
+            'checkouts': 0, 'waits': 0, 'timeouts': 0, 'created': 0, 'closed': 0, 'invalid': 0,
+            'wait_time': 0.0, 'max_wait_time': 0.0,
+        }
+
+    def _open(self):
+        # called with a slot already reserved in self.size
+        try:
+            connection = self.connect()
+        except Exception:
+            with self._condition:
+                self.size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.counters['created'] += 1
+        return connection
+
+    def _discard(self, connection):
+        try:
+            self.close_connection(connection)
+        except Exception:
+            pass
+        with self._condition:
+            self.size -= 1
+            self.counters['closed'] += 1
+            self._condition.notify()
+
+    def checkout(self):
+        started = time.monotonic()
+        waited = False
+        with self._condition:
+            while not self.idle and self.size >= self.max_size:
+                waited = True
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    raise PoolTimeout('No connection available in pool %s after %ss' % (self.name, self.timeout))
+                self._condition.wait(remaining)
+            connection = self.idle.pop() if self.idle else None
+            if connection is None:
+                self.size += 1
+            self.counters['checkouts'] += 1
+            if waited:
+                wait_time = time.monotonic() - started
+                self.counters['waits'] += 1
+                self.counters['wait_time'] += wait_time
+                self.counters['max_wait_time'] = max(self.counters['max_wait_time'], wait_time)
+        if connection is None:
+            return self._open()
+        if not self.validate(connection):
+            self.counters['invalid'] += 1
+            self._discard(connection)
+            with self._condition:
+                self.size += 1
+            return self._open()
+        return connection
+
+    def checkin(self, connection, discard=False):
+        if discard:
+            self._discard(connection)
+            return
+        with self._condition:
+            self.idle.append(connection)
+            self._condition.notify()
+
+    def prewarm(self):
+        connections = []
+        with self._condition:
+            missing = max(0, min(self.min_size, self.max_size) - self.size)
+            self.size += missing
+        try:
+            for _ in range(missing):
+                connections.append(self._open())
+        except Exception:
+            with self._condition:
+                # _open gave back the slot that failed, the ones after it were never tried
+                self.size -= missing - len(connections) - 1
+                self._condition.notify_all()
+            raise
+        finally:
+            for connection in connections:
+                self.checkin(connection)
+
+    def close(self):
+        with self._condition:
+            idle, self.idle = list(self.idle), deque()
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._condition:
+            in_use = self.size - len(self.idle)
+            result = dict(self.counters, size=self.size, idle=len(self.idle), in_use=in_use,
+                          max_size=self.max_size)
+        result['utilization'] = float(in_use) / self.max_size if self.max_size else 0.0
+        result['avg_wait_time'] = result['wait_time'] / result['waits'] if result['waits'] else 0.0
+        return result
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(name, factory):
+    """
+    The process-wide pool called `name`, made by `factory()` on first use. Pools
+    inherited across a fork are replaced rather than sharing sockets with the parent.
+    """
+    pool = _pools.get(name)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None or pool.pid != os.getpid():
+                pool = _pools[name] = factory()
+    return pool
+
+stats.register('db_pools', lambda: {name: pool.stats() for name, pool in list(_pools.items())})
+
+def prewarm_database_pools():
+    """
+    Open MIN_SIZE connections for every pooled database alias, called when a worker starts.
+    A database that is down is only logged: the worker still starts and connects on demand.
+    """
+    for connection in connections.all():
+        if hasattr(connection, 'get_pool'):
+            try:
+                with connection.wrap_database_errors:
+                    connection.get_pool().prewarm()
+            except DatabaseError as e:
+                logger.warning('Could not prewarm the %s connection pool: %s', connection.alias, e)
@@ -0,0 +1,34 @@
+from phonenumber_field.phonenumber import PhoneNumber
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+encoder = JSONEncoder()
+
+def default(obj):
+    if isinstance(obj, PhoneNumber):
+        return str(obj)
+    return encoder.default(obj)
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer writing bytes with orjson. Datetimes, decimals, lazy strings and phone
+    numbers go through the same conversions as the stock encoder, so both produce the
+    same document. Indented, ASCII-only or non-compact output falls back to the stock renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context)):
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        content = orjson.dumps(data, default=default,
+                               option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        # same U+2028/U+2029 escaping as JSONRenderer, keeps the output embeddable in <script>
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
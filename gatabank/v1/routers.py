@@ -0,0 +1,145 @@
+import itertools
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from v1 import stats
+
+# per request (thread or async task): whether reads may go to a replica
+state = Local()
+
+def get_config():
+    config = {'ALIASES': [], 'STICKY_SECONDS': 10, 'MAX_LAG': 5, 'CHECK_INTERVAL': 5, 'PREFIX': '/api/v1/',
+              'PIN_CACHE': 'default'}
+    config.update(getattr(settings, 'V1_REPLICAS', {}))
+    return config
+
+def use_replicas(enabled):
+    state.use_replicas = enabled
+
+def replicas_enabled():
+    return getattr(state, 'use_replicas', False)
+
+@contextmanager
+def primary_reads():
+    """
+    Reads in the block use the primary, for data that outlives the request (snapshots,
+    shared cache entries) and must not be built from a lagging replica.
+    """
+    enabled = replicas_enabled()
+    use_replicas(False)
+    try:
+        yield
+    finally:
+        use_replicas(enabled)
+
+def replica_lag(alias):
+    """
+    Seconds the replica behind `alias` lags its primary, None when it is not replicating.
+    Stand-ins that are not MySQL replicas (SQLite files, a MySQL primary) report 0.
+    """
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor != 'mysql':
+            cursor.execute('SELECT 1')
+            return 0
+        cursor.execute('SHOW SLAVE STATUS')
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+        return dict(zip([column[0] for column in cursor.description], row)).get('Seconds_Behind_Master')
+
+class ReplicaSet(object):
+    """
+    Replica aliases read round-robin. Every CHECK_INTERVAL seconds one request re-measures
+    their lag; replicas that fail the check or lag more than MAX_LAG seconds get no reads
+    until a later check finds them caught up.
+    """
+
+    def __init__(self, aliases, max_lag=5, interval=5):
+        self.aliases = list(aliases)
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag = dict.fromkeys(self.aliases)
+        self.healthy = []
+        self.checked_at = None
+        self.reads = Counter()
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+
+    def check(self):
+        for alias in self.aliases:
+            try:
+                self.lag[alias] = replica_lag(alias)
+            except Exception:
+                self.lag[alias] = None
+        self.healthy = [alias for alias in self.aliases
+                        if self.lag[alias] is not None and self.lag[alias] <= self.max_lag]
+        self.checked_at = time.monotonic()
+
+    def maybe_check(self):
+        if self.checked_at is not None and time.monotonic() - self.checked_at < self.interval:
+            return
+        if self._lock.acquire(blocking=False):
+            try:
+                self.check()
+            finally:
+                self._lock.release()
+
+    def choose(self):
+        self.maybe_check()
+        healthy = self.healthy
+        if not healthy:
+            return None
+        alias = healthy[next(self._counter) % len(healthy)]
+        self.reads[alias] += 1
+        return alias
+
+    def stats(self):
+        return {alias: {'healthy': alias in self.healthy, 'lag': self.lag[alias], 'reads': self.reads[alias]}
+                for alias in self.aliases}
+
+_replica_set = None
+_replica_set_lock = threading.Lock()
+
+def get_replica_set():
+    global _replica_set
+    if _replica_set is None:
+        with _replica_set_lock:
+            if _replica_set is None:
+                config = get_config()
+                _replica_set = ReplicaSet(config['ALIASES'], config['MAX_LAG'], config['CHECK_INTERVAL'])
+    return _replica_set
+
+stats.register('replicas', lambda: get_replica_set().stats())
+
+class ReplicaRouter(object):
+    """
+    Sends reads to a healthy replica while the current request allows it (see
+    v1.middleware.ReplicaRoutingMiddleware); writes, reads inside a transaction and
+    everything outside such requests use the primary.
+    """
+
+    def __init__(self, replicas=None):
+        self._replicas = replicas
+
+    @property
+    def replicas(self):
+        return self._replicas or get_replica_set()
+
+    def db_for_read(self, model, **hints):
+        if not replicas_enabled() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return self.replicas.choose() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in self.replicas.aliases
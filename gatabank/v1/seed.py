@@ -0,0 +1,97 @@
+import random
+from django.contrib.auth.hashers import make_password
+from v1.models import (
+    Bank, BankDiscount, BankFee, BankRequirement,
+    Card, CardBasic, CardBenefit, CardDiscount, CardFee, CardRequirement,
+    City, District, Village,
+    User,
+)
+
+CARD_ORGS = ['VISA', 'MASTERCARD', 'JCB', 'AMEX', 'NAPAS']
+
+def seed_catalogue(cards=100, banks=20, children=2, seed=0):
+    """
+    Bulk-create a synthetic catalogue: `cards` cards and `banks` banks, each with `children`
+    rows in every child table.
+    """
+    rng = random.Random(seed)
+    card_objs = [Card(name='Card %d' % index, sponsor='Sponsor %d' % (index % 10),
+                      subtitle='Synthetic card', rating=round(rng.uniform(1, 5), 1),
+                      image='media/image/cards/card_%d.png' % index)
+                 for index in range(cards)]
+    bank_objs = [Bank(name='Bank %d' % index, image='media/image/banks/bank_%d.png' % index,
+                      minLoanAmount=rng.choice([10, 20, 50]) * 1000000,
+                      maxLoanAmount=rng.choice([300, 500, 1000]) * 1000000,
+                      interestPercentage=rng.randint(8, 30), interestType='Cố định',
+                      minIncome=rng.choice([4, 6, 10]) * 1000000,
+                      minLoanTerm='%d tháng' % rng.choice([6, 12]), maxLoanTerm='%d năm' % rng.choice([3, 5]),
+                      verifiedIn='24h', interestCalMethod=rng.choice(['Dư nợ giảm dần', 'Dư nợ ban đầu']))
+                 for index in range(banks)]
+    Card.objects.bulk_create(card_objs)
+    Bank.objects.bulk_create(bank_objs)
+    basics, benefits, discounts, fees, requirements = [], [], [], [], []
+    for card in card_objs:
+        for index in range(children):
+            basics.append(CardBasic(card=card, freeAirportLounge=rng.randint(0, 8),
+                                    yearlyFee=rng.choice([0, 299000, 599000, 1200000, 2000000]),
+                                    averageRefund=rng.randint(0, 10), maxRefund=rng.randint(0, 5000000),
+                                    cardOrg=rng.choice(CARD_ORGS), interest=rng.randint(18, 36),
+                                    issueFee=rng.choice([0, 100000]), interestFreeDay=rng.choice([45, 55, 60]),
+                                    paymentEachMonth=rng.choice([3, 5])))
+            benefits.append(CardBenefit(card=card, label='Benefit %d' % index, description='Synthetic benefit'))
+            discounts.append(CardDiscount(card=card, label='Discount %d' % index, description='Synthetic discount'))
+            fees.append(CardFee(card=card, cashAdvance='4%', latePayment='6%', foreignTransaction='3%'))
+            requirements.append(CardRequirement(card=card, age=rng.choice([18, 20, 22]),
+                                                personalIdentifier='CMND',
+                                                incomeRequirement=rng.choice([4, 8, 15, 30]) * 1000000,
+                                                homeIdentifier='Sổ hộ khẩu'))
+    bank_fees, bank_requirements, bank_discounts = [], [], []
+    for bank in bank_objs:
+        for index in range(children):
+            bank_fees.append(BankFee(bank=bank, penaltyFee='5%', penaltyInterest='150%',
+                                     earlierPaymentFee='%d%%' % rng.randint(1, 5)))
+            bank_requirements.append(BankRequirement(bank=bank, age='%d - %d' % (rng.choice([18, 20]), rng.choice([60, 65])),
+                                                     personalIdentifier='CMND', incomeIdentifier='Sao kê lương'))
+            bank_discounts.append(BankDiscount(bank=bank, label='Discount %d' % index, description='Synthetic discount'))
+    for model, objs in ((CardBasic, basics), (CardBenefit, benefits), (CardDiscount, discounts),
+                        (CardFee, fees), (CardRequirement, requirements), (BankFee, bank_fees),
+                        (BankRequirement, bank_requirements), (BankDiscount, bank_discounts)):
+        model.objects.bulk_create(objs)
+    return card_objs, bank_objs
+
+def seed_areas(cities=63, districts=10, villages=10):
+    """
+    Bulk-create an area tree shaped like the real one: `districts` districts per city and
+    `villages` villages per district, with dump-style zero-padded codes as ids.
+    """
+    city_objs = [City(id='%02d' % (index + 1), name='City %d' % (index + 1), type='Tỉnh') for index in range(cities)]
+    district_objs, village_objs = [], []
+    for city in city_objs:
+        for index in range(districts):
+            district_objs.append(District(id='%s%03d' % (city.id, index + 1), name='District %d' % (index + 1),
+                                          type='Huyện', city=city))
+    for district in district_objs:
+        for index in range(villages):
+            village_objs.append(Village(id='%s%03d' % (district.id, index + 1), name='Village %d' % (index + 1),
+                                        type='Xã', district=district))
+    for model, objs in ((City, city_objs), (District, district_objs), (Village, village_objs)):
+        model.objects.bulk_create(objs, batch_size=1000)
+    return city_objs, district_objs, village_objs
+
+def seed_users(count=1000, villages=(), password='secret', seed=0):
+    """
+    Bulk-create `count` customers with valid Vietnamese mobile numbers, living in random
+    `villages`, all sharing one password hash.
+    """
+    rng = random.Random(seed)
+    encoded = make_password(password)
+    villages = list(villages)
+    users = []
+    for index in range(count):
+        village = rng.choice(villages) if villages else None
+        users.append(User(phone_number='+8490%07d' % index, password=encoded, is_staff=False,
+                          village=village, district_id=village.district_id if village else None,
+                          city_id=village.district.city_id if village else None,
+                          address='%d Synthetic street' % index))
+    User.objects.bulk_create(users, batch_size=1000)
+    return users
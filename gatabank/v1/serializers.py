@@ -1,4 +1,8 @@
+from collections import OrderedDict
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 from v1.models import (
     Bank, BankDiscount, BankFee, BankRequirement,
     Card, CardBasic, CardBenefit, CardDiscount, CardFee, CardRequirement,
@@ -14,11 +18,113 @@ class AbstractSerializer(serializers.ModelSerializer):
         else:
             return expanded_fields
 
+    def get_fields(self):
+        fields = super(AbstractSerializer, self).get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is None:
+            selected = self.select_fields(fields, self.context.get('request'))
+            if selected is not None:
+                fields = type(fields)((name, field) for name, field in fields.items() if name in selected)
+        return fields
+
+    @staticmethod
+    def get_param_names(request, param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        return set(name.strip() for name in value.split(',') if name.strip())
+
+    @classmethod
+    def get_nested_field_names(cls):
+        return [name for name, field in cls._declared_fields.items()
+                if isinstance(getattr(field, 'child', field), AbstractSerializer)]
+
+    @classmethod
+    def select_fields(cls, names, request):
+        """
+        Names kept by the `?fields=` and `?expand=` query parameters on read requests, or None
+        to keep everything. `fields` limits the top-level fields; nested relations are only
+        included when listed in `fields` or `expand`, or when neither parameter restricts them.
+        """
+        if request is None or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return None
+        fields = cls.get_param_names(request, 'fields')
+        expand = cls.get_param_names(request, 'expand')
+        if fields is None and expand is None:
+            return None
+        nested = set(cls.get_nested_field_names())
+        selected = set()
+        for name in names:
+            if name in nested:
+                if name in (fields or ()) or name in (expand or ()) or (expand is None and fields is None):
+                    selected.add(name)
+            elif fields is None or name in fields:
+                selected.add(name)
+        return selected
+
+    @classmethod
+    def get_prefetch_related(cls, prefix='', request=None):
+        # collect the many-to-many fields and the reverse relations read by nested serializers
+        lookups = []
+        meta = cls.Meta
+        m2m_fields = []
+        for field in meta.model._meta.many_to_many:
+            fields = getattr(meta, 'fields', None)
+            if field.name in getattr(meta, 'exclude', ()) or (fields not in (None, '__all__') and field.name not in fields):
+                continue
+            m2m_fields.append(field.name)
+        nested_fields = cls.get_nested_field_names()
+        selected = cls.select_fields(m2m_fields + nested_fields, request)
+        for name in m2m_fields:
+            if selected is None or name in selected:
+                lookups.append(prefix + name)
+        for name in nested_fields:
+            if selected is not None and name not in selected:
+                continue
+            field = cls._declared_fields[name]
+            lookup = prefix + (field.source or name)
+            lookups.append(lookup)
+            lookups.extend(getattr(field, 'child', field).get_prefetch_related(prefix=lookup + '__'))
+        return lookups
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, request=None):
+        lookups = cls.get_prefetch_related(request=request)
+        if lookups:
+            queryset = queryset.prefetch_related(*lookups)
+        return queryset
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    {size: {'width', 'height', format: url}} from an `image_variants` dict, URLs built
+    like those of the image field.
+    """
+
+    def to_representation(self, value):
+        storage = default_storage
+        request = self.context.get('request')
+        result = OrderedDict()
+        for size, variant in sorted((value or {}).items()):
+            if not isinstance(variant, dict):
+                continue
+            result[size] = OrderedDict()
+            for key, item in sorted(variant.items()):
+                if key in ('width', 'height'):
+                    result[size][key] = item
+                else:
+                    url = storage.url(item)
+                    result[size][key] = request.build_absolute_uri(url) if request is not None else url
+        return result
+
 ## USER
 class UserSerializer(AbstractSerializer):
     class Meta:
         model = User
         exclude = ['is_staff', 'is_superuser']
+        # deleted users keep their number, the default manager would not see them
+        extra_kwargs = {'phone_number': {'validators': [UniqueValidator(queryset=User.all_objects.all())]}}
 
 ## CITY
 class CitySerializer(AbstractSerializer):
@@ -55,15 +161,46 @@ class BankDiscountSerializer(AbstractSerializer):
         exclude = ['created_at','updated_at', 'id', 'bank']
 
 class BankSerializer(AbstractSerializer):
-    bankFees = BankFeeSerializer(source='card_basic_set', many=True)
-    bankRequirements = BankRequirementSerializer(source='card_benefit_set', many=True)
-    bankDiscounts = BankDiscountSerializer(source='card_discount_set', many=True)
+    image_variants = ImageVariantsField()
+    bankFees = BankFeeSerializer(source='bank_fee_set', many=True)
+    bankRequirements = BankRequirementSerializer(source='bank_requirement_set', many=True)
+    bankDiscounts = BankDiscountSerializer(source='bank_discount_set', many=True)
 
     class Meta:
         model = Bank
         fields = '__all__'
         extra_fields = ['bankFees', 'bankRequirements', 'bankDiscounts']
 
+class LoanQuerySerializer(serializers.Serializer):
+    income = serializers.IntegerField(min_value=0)
+    amount = serializers.IntegerField(min_value=1)
+    term = serializers.IntegerField(min_value=1)
+    age = serializers.IntegerField(min_value=0, required=False)
+
+class ScheduleQuerySerializer(serializers.Serializer):
+    amount = serializers.IntegerField(min_value=1)
+    term = serializers.IntegerField(min_value=1, max_value=600)
+
+class ScheduleItemSerializer(ScheduleQuerySerializer):
+    bank = serializers.CharField()
+
+class ScheduleBatchSerializer(serializers.Serializer):
+    items = ScheduleItemSerializer(many=True)
+    includeSchedule = serializers.BooleanField(default=False)
+
+    def validate_items(self, items):
+        if not items or len(items) > 5000:
+            raise serializers.ValidationError('Between 1 and 5000 items are required.')
+        return items
+
+    def validate(self, attrs):
+        # every month of every schedule is a row in the response
+        limit = getattr(settings, 'V1_SCHEDULE_MAX_MONTHS', 12000)
+        if attrs['includeSchedule'] and sum(item['term'] for item in attrs['items']) > limit:
+            raise serializers.ValidationError({'items': [
+                'Schedules are limited to %d months in total, request fewer items or only the totals.' % limit]})
+        return attrs
+
 ## CARD
 class CardBasicSerializer(AbstractSerializer):
     class Meta:
@@ -91,6 +228,7 @@ class CardRequirementSerializer(AbstractSerializer):
         exclude = ['created_at','updated_at', 'id', 'card']
 
 class CardSerializer(AbstractSerializer):
+    image_variants = ImageVariantsField()
     cardBasics = CardBasicSerializer(source='card_basic_set', many=True)
     cardBenefits = CardBenefitSerializer(source='card_benefit_set', many=True)
     cardDiscounts = CardDiscountSerializer(source='card_discount_set', many=True)
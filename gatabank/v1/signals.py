@@ -0,0 +1,93 @@
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from v1 import images
+from v1.authentication import PERMISSIONS_VERSION, user_version_name
+from v1.areas import area_index
+from v1.caches import bump_version, response_caches
+from v1.loans import bank_terms
+from v1.models import (
+    City, District, Village,
+    Bank, BankFee, BankRequirement, BankDiscount,
+    Card, CardBasic, CardBenefit, CardDiscount, CardFee, CardRequirement,
+    User,
+    soft_deleted,
+)
+
+def invalidate_areas(sender, **kwargs):
+    area_index.invalidate()
+    response_caches['areas'].invalidate()
+
+for model in (City, District, Village):
+    post_save.connect(invalidate_areas, sender=model, dispatch_uid='invalidate_areas_%s' % model.__name__)
+    post_delete.connect(invalidate_areas, sender=model, dispatch_uid='invalidate_areas_delete_%s' % model.__name__)
+    soft_deleted.connect(invalidate_areas, sender=model, dispatch_uid='invalidate_areas_soft_delete_%s' % model.__name__)
+
+def invalidate_bank_terms(sender, **kwargs):
+    bank_terms.invalidate()
+
+for model in (Bank, BankFee, BankRequirement):
+    post_save.connect(invalidate_bank_terms, sender=model, dispatch_uid='invalidate_bank_terms_%s' % model.__name__)
+    post_delete.connect(invalidate_bank_terms, sender=model, dispatch_uid='invalidate_bank_terms_delete_%s' % model.__name__)
+    soft_deleted.connect(invalidate_bank_terms, sender=model, dispatch_uid='invalidate_bank_terms_soft_delete_%s' % model.__name__)
+
+def invalidate_responses(namespace, parent):
+    fk = '%s_id' % namespace[:-1]
+    def object_ids(sender, instance=None, pks=None):
+        if instance is not None:
+            return [instance.pk if isinstance(instance, parent) else getattr(instance, fk)]
+        if issubclass(sender, parent):
+            return pks
+        return set(sender.all_objects.filter(pk__in=pks).values_list(fk, flat=True))
+    def receiver(sender, instance=None, pks=None, **kwargs):
+        for object_id in object_ids(sender, instance, pks):
+            response_caches[namespace].invalidate(None if object_id is None else str(object_id))
+    return receiver
+
+invalidate_bank_responses = invalidate_responses('banks', Bank)
+invalidate_card_responses = invalidate_responses('cards', Card)
+
+for receiver, models in ((invalidate_bank_responses, (Bank, BankFee, BankRequirement, BankDiscount)),
+                         (invalidate_card_responses, (Card, CardBasic, CardBenefit, CardDiscount, CardFee, CardRequirement))):
+    for model in models:
+        post_save.connect(receiver, sender=model, dispatch_uid='invalidate_responses_%s' % model.__name__)
+        post_delete.connect(receiver, sender=model, dispatch_uid='invalidate_responses_delete_%s' % model.__name__)
+        soft_deleted.connect(receiver, sender=model, dispatch_uid='invalidate_responses_soft_delete_%s' % model.__name__)
+
+def update_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        images.update_variants(instance)
+
+for model in (Bank, Card):
+    pre_save.connect(update_image_variants, sender=model, dispatch_uid='update_image_variants_%s' % model.__name__)
+
+# no sender filter: admin saves go through the Collaborator proxy, which is its own sender
+def invalidate_user(sender, instance, **kwargs):
+    if isinstance(instance, User):
+        bump_version(user_version_name(instance.pk))
+
+post_save.connect(invalidate_user, dispatch_uid='invalidate_user')
+post_delete.connect(invalidate_user, dispatch_uid='invalidate_user_delete')
+
+def invalidate_deleted_users(sender, pks, **kwargs):
+    if issubclass(sender, User):
+        for pk in pks:
+            bump_version(user_version_name(pk))
+
+soft_deleted.connect(invalidate_deleted_users, dispatch_uid='invalidate_deleted_users')
+
+def invalidate_permissions(sender, instance, action, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, User):
+        bump_version(user_version_name(instance.pk))
+    else:
+        bump_version(PERMISSIONS_VERSION)
+
+for through in (User.groups.through, User.user_permissions.through, Group.permissions.through):
+    m2m_changed.connect(invalidate_permissions, sender=through, dispatch_uid='invalidate_permissions_%s' % through.__name__)
+
+def invalidate_all_permissions(sender, **kwargs):
+    bump_version(PERMISSIONS_VERSION)
+
+for model in (Group, Permission):
+    post_delete.connect(invalidate_all_permissions, sender=model, dispatch_uid='invalidate_permissions_delete_%s' % model.__name__)
@@ -0,0 +1,19 @@
+from collections import OrderedDict
+
+_providers = OrderedDict()
+
+def register(name, provider):
+    """
+    Register a callable returning a dict of counters to publish under `name`.
+    """
+    _providers[name] = provider
+
+def collect():
+    return OrderedDict((name, provider()) for name, provider in _providers.items())
+
+def percentile(values, fraction):
+    """
+    Nearest-rank `fraction` percentile of a non-empty sequence, e.g. 0.99 for p99.
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
@@ -1,3 +1,1120 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+import brotli
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import Group, Permission
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework.throttling import ScopedRateThrottle
+from django.http import HttpResponse
+from django.urls import resolve
+from rest_framework.response import Response
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.views import TokenObtainPairView
+from v1.models import (
+    Bank, BankDiscount, BankFee, BankRequirement,
+    Card, CardBasic, CardBenefit, CardDiscount, CardFee, CardRequirement,
+    City, District, Village,
+    User, CacheVersion,
+)
+from v1.areas import area_index
+from v1.asgi import AsyncReadHandler
+from v1.authentication import CachedJWTAuthentication
+from django.core.cache import cache
+from v1.caches import VersionedSnapshot, bump_version, get_version, response_caches
+from v1.hashing import HashingUnavailable, pool as hashing_pool
+from v1.middleware import ReplicaRoutingMiddleware
+from v1.pool import Pool, PoolTimeout, prewarm_database_pools
+from v1.routers import ReplicaRouter, ReplicaSet, replicas_enabled, use_replicas
+from v1.renderers import FastJSONRenderer
+from v1.compiled import compile_serializer
+from v1.enum import Status
+from v1.compact_ids import get_plan
+from v1.fields import CompactUUIDField, uuid7
+from v1.seed import seed_areas, seed_catalogue, seed_users
+from v1.serializers import BankSerializer, CardSerializer, UserSerializer
+from v1.views import CardViewSet
+from v1.imports import UserImporter
+from v1.loans import bank_terms
+from v1 import images, metrics
+from v1.management.commands.load_areas import iter_dump_rows
 
-# Create your tests here.
+
+def create_card(name='Card'):
+    card = Card.objects.create(name=name, rating=4.5)
+    CardBasic.objects.create(card=card, yearlyFee=500000, interest=25, cardOrg='VISA')
+    CardBenefit.objects.create(card=card, label='Cashback')
+    CardDiscount.objects.create(card=card, label='Dining')
+    CardFee.objects.create(card=card, cashAdvance='4%')
+    CardRequirement.objects.create(card=card, age=20, incomeRequirement=8000000)
+    return card
+
+
+def create_bank(name='Bank'):
+    bank = Bank.objects.create(name=name, minLoanAmount=10000000, maxLoanAmount=500000000,
+                               interestPercentage=12, minIncome=5000000)
+    BankFee.objects.create(bank=bank, earlierPaymentFee='3%')
+    BankRequirement.objects.create(bank=bank, age='20 - 60')
+    BankDiscount.objects.create(bank=bank, label='Online')
+    return bank
+
+
+class EagerLoadingTest(APITestCase):
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_card_list_query_count_is_constant(self):
+        create_card()
+        one, _ = self.count_queries('/api/v1/cards/')
+        for i in range(5):
+            create_card('Card %s' % i)
+        many, response = self.count_queries('/api/v1/cards/')
+        # validators + COUNT + page + one query per nested relation
+        self.assertEqual(one, 8)
+        self.assertEqual(many, one)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(len(response.data['results'][0]['cardBasics']), 1)
+
+    def test_bank_list_query_count_is_constant(self):
+        create_bank()
+        one, _ = self.count_queries('/api/v1/banks/')
+        for i in range(5):
+            create_bank('Bank %s' % i)
+        many, response = self.count_queries('/api/v1/banks/')
+        self.assertEqual(one, 6)
+        self.assertEqual(many, one)
+        self.assertEqual(response.data['results'][0]['bankFees'][0]['earlierPaymentFee'], '3%')
+
+    def test_card_detail_prefetches_nested_relations(self):
+        card = create_card()
+        queries, response = self.count_queries('/api/v1/cards/%s/' % card.id)
+        self.assertEqual(queries, 7)
+        self.assertEqual(response.data['cardRequirements'][0]['incomeRequirement'], 8000000)
+
+
+class AreaIndexTest(APITestCase):
+    def setUp(self):
+        area_index.invalidate()
+        self.city = City.objects.create(id='01', name='Thành phố Hà Nội', type='Thành phố Trung ương')
+        self.district = District.objects.create(id='001', name='Quận Ba Đình', type='Quận', city=self.city)
+        Village.objects.create(id='00001', name='Phường Phúc Xá', type='Phường', district=self.district)
+
+    def test_area_endpoints_are_served_without_queries(self):
+        self.client.get('/api/v1/cities/')
+        with self.assertNumQueries(0):
+            cities = self.client.get('/api/v1/cities/')
+            districts = self.client.get('/api/v1/districts/01')
+            villages = self.client.get('/api/v1/villages/001')
+        self.assertEqual([row['id'] for row in cities.json()['results']], ['01'])
+        self.assertEqual(districts.json()['results'][0]['city'], '01')
+        self.assertEqual(villages.json()['results'][0]['name'], 'Phường Phúc Xá')
+        self.assertEqual(self.client.get('/api/v1/villages/999').data['count'], 0)
+
+    def test_saving_an_area_invalidates_the_index(self):
+        self.client.get('/api/v1/cities/')
+        District.objects.create(id='002', name='Quận Hoàn Kiếm', type='Quận', city=self.city)
+        response = self.client.get('/api/v1/districts/01')
+        self.assertEqual(response.data['count'], 2)
+
+    def test_area_tree_is_precompressed_and_revalidates(self):
+        response = self.client.get('/api/v1/areas/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        tree = json.loads(gzip.decompress(response.content).decode('utf-8'))
+        self.assertEqual(tree[0]['districts'][0]['villages'][0]['id'], '00001')
+        with self.assertNumQueries(0):
+            revalidated = self.client.get('/api/v1/areas/', HTTP_ACCEPT_ENCODING='gzip',
+                                          HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        plain = self.client.get('/api/v1/areas/')
+        self.assertNotEqual(plain['ETag'], response['ETag'])
+        self.assertEqual(json.loads(plain.content.decode('utf-8')), tree)
+
+
+class LoadAreasCommandTest(TestCase):
+    dump = (
+        "INSERT INTO `districts` (`id`, `name`, `type`, `city_id`) VALUES\n"
+        "('618', 'Huyện Ia H\\' Drai', 'Huyện', '62');\n"
+        "INSERT INTO `cities` (`id`, `name`, `type`) VALUES\n"
+        "('62', 'Tỉnh Kon Tum', 'Tỉnh');\n"
+        "INSERT INTO `villages` (`id`, `name`, `type`, `district_id`) VALUES\n"
+        "('23535', 'Xã Ia Dom', 'Xã', '618'),\n"
+        "('23538', 'Xã Ia Dal', 'Xã', '618');\n"
+    )
+
+    def load(self, dump):
+        with tempfile.NamedTemporaryFile('w', suffix='.sql', encoding='utf-8', delete=False) as stream:
+            stream.write(dump)
+        self.addCleanup(os.remove, stream.name)
+        output = io.StringIO()
+        call_command('load_areas', stream.name, batch_size=1, stdout=output)
+        return output.getvalue()
+
+    def test_dump_rows_are_parsed_as_a_stream(self):
+        rows = list(iter_dump_rows(io.StringIO(self.dump)))
+        self.assertEqual(rows[0], ('districts', ['id', 'name', 'type', 'city_id'],
+                                   ['618', "Huyện Ia H' Drai", 'Huyện', '62']))
+        self.assertEqual(len(rows), 4)
+
+    def test_load_is_rerunnable_as_an_incremental_refresh(self):
+        self.load(self.dump)
+        self.assertEqual(Village.objects.filter(district_id='618').count(), 2)
+        output = self.load(self.dump.replace('Xã Ia Dal', 'Xã Ia Dal Mới') +
+                           "INSERT INTO `villages` (`id`, `name`, `type`, `district_id`) VALUES\n"
+                           "('23539', 'Xã Ia Tơi', 'Xã', '618');\n")
+        self.assertIn('villages: 1 created, 1 updated, 1 unchanged', output)
+        self.assertEqual(Village.objects.get(id='23538').name, 'Xã Ia Dal Mới')
+        self.assertEqual(District.objects.get(id='618').city_id, '62')
+
+
+class CardSearchTest(APITestCase):
+    def setUp(self):
+        self.cheap = create_card('Cheap')
+        self.premium = create_card('Premium')
+        self.premium.card_basic_set.update(yearlyFee=1500000, cardOrg='MASTERCARD', freeAirportLounge=6)
+        self.premium.card_requirement_set.update(incomeRequirement=30000000)
+
+    def test_filters_and_ordering(self):
+        response = self.client.get('/api/v1/cards/', {'yearlyFee_max': 1000000})
+        self.assertEqual([card['name'] for card in response.data['results']], ['Cheap'])
+        response = self.client.get('/api/v1/cards/', {'incomeRequirement_min': 10000000, 'cardOrg': 'MASTERCARD'})
+        self.assertEqual([card['name'] for card in response.data['results']], ['Premium'])
+        response = self.client.get('/api/v1/cards/', {'ordering': '-yearlyFee'})
+        self.assertEqual([card['name'] for card in response.data['results']], ['Premium', 'Cheap'])
+
+    def test_search_returns_facet_counts_in_two_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/cards/search/', {'interest_max': 30})
+        facet_queries = [q for q in context.captured_queries if 'COUNT(DISTINCT' in q['sql']]
+        self.assertEqual(len(facet_queries), 2)
+        facets = response.data['facets']
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([bucket['count'] for bucket in facets['yearlyFee']], [0, 1, 0, 1])
+        self.assertEqual(facets['freeAirportLounge'][2]['count'], 1)
+        self.assertEqual(facets['cardOrg'], [{'label': 'MASTERCARD', 'count': 1}, {'label': 'VISA', 'count': 1}])
+
+    def test_facets_ignore_deleted_child_rows(self):
+        CardBasic.objects.create(card=self.premium, yearlyFee=0, freeAirportLounge=0, cardOrg='JCB',
+                                 status=Status.DELETED.name)
+        facets = self.client.get('/api/v1/cards/search/').data['facets']
+        self.assertEqual([bucket['count'] for bucket in facets['yearlyFee']], [0, 1, 0, 1])
+        self.assertEqual([bucket['count'] for bucket in facets['freeAirportLounge']], [0, 0, 1])
+        self.assertEqual([row['label'] for row in facets['cardOrg']], ['MASTERCARD', 'VISA'])
+
+
+class LoanMatchTest(APITestCase):
+    def setUp(self):
+        bank_terms.invalidate()
+        self.reducing = create_bank('Reducing')
+        self.flat = create_bank('Flat')
+        Bank.objects.filter(pk=self.flat.pk).update(interestCalMethod='Tính trên dư nợ ban đầu')
+        self.strict = create_bank('Strict')
+        Bank.objects.filter(pk=self.strict.pk).update(minIncome=50000000, minLoanTerm='6 tháng',
+                                                      maxLoanTerm='3 năm')
+        bank_terms.invalidate()
+
+    def test_matches_are_ranked_by_total_cost(self):
+        response = self.client.get('/api/v1/banks/match/', {
+            'income': 60000000, 'amount': 100000000, 'term': 12, 'age': 30})
+        self.assertEqual(response.status_code, 200)
+        names = [bank['name'] for bank in response.data['results']]
+        self.assertEqual(names[-1], 'Flat')
+        self.assertEqual(set(names[:2]), {'Reducing', 'Strict'})
+        reducing = response.data['results'][0]
+        self.assertEqual(reducing['monthlyPayment'], 8884879)
+        self.assertEqual(reducing['totalInterest'], reducing['totalCost'] - 100000000)
+
+    def test_ineligible_banks_are_excluded(self):
+        response = self.client.get('/api/v1/banks/match/', {
+            'income': 10000000, 'amount': 100000000, 'term': 48, 'age': 65})
+        self.assertEqual(response.data['count'], 0)
+        response = self.client.get('/api/v1/banks/match/', {
+            'income': 10000000, 'amount': 100000000, 'term': 48, 'age': 40})
+        self.assertEqual([bank['name'] for bank in response.data['results']], ['Reducing', 'Flat'])
+        self.assertEqual(self.client.get('/api/v1/banks/match/', {'income': 1}).status_code, 400)
+
+
+class AmortizationTest(APITestCase):
+    def setUp(self):
+        self.reducing = create_bank('Reducing')
+        self.flat = create_bank('Flat')
+        Bank.objects.filter(pk=self.flat.pk).update(interestCalMethod='flat')
+        bank_terms.invalidate()
+
+    def test_reducing_balance_schedule(self):
+        response = self.client.get('/api/v1/banks/%s/schedule/' % self.reducing.pk, {
+            'amount': 12000000, 'term': 12})
+        self.assertEqual(response.status_code, 200)
+        schedule = response.data['schedule']
+        self.assertEqual(len(schedule), 12)
+        self.assertEqual(schedule[0], {'month': 1, 'payment': 1066185, 'principal': 946185,
+                                       'interest': 120000, 'balance': 11053815, 'earlyPayoffFee': 331614})
+        self.assertEqual(schedule[-1]['balance'], 0)
+        self.assertEqual(response.data['totalPayment'], 12794226)
+        self.assertEqual(response.data['earlierPaymentFee'], 3.0)
+        self.assertEqual(self.client.get('/api/v1/banks/missing/schedule/', {
+            'amount': 1, 'term': 1}).status_code, 404)
+
+    def test_batch_schedules_compare_banks_in_one_request(self):
+        items = [{'bank': self.reducing.pk, 'amount': 12000000, 'term': 12},
+                 {'bank': self.flat.pk, 'amount': 12000000, 'term': 12},
+                 {'bank': self.flat.pk, 'amount': 24000000, 'term': 24}]
+        response = self.client.post('/api/v1/banks/schedules/', {'items': items, 'includeSchedule': True},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(b''.join(response.streaming_content))['results']
+        flat = results[1]
+        self.assertEqual(flat['totalInterest'], 1440000)
+        self.assertEqual(set(row['interest'] for row in flat['schedule']), {120000})
+        self.assertEqual(len(results[2]['schedule']), 24)
+        self.assertLess(results[0]['totalInterest'], flat['totalInterest'])
+        totals = self.client.post('/api/v1/banks/schedules/', {'items': items}, format='json').data['results']
+        for total, result in zip(totals, results):
+            self.assertNotIn('schedule', total)
+            self.assertEqual((total['totalPayment'], total['totalInterest']),
+                             (result['totalPayment'], result['totalInterest']))
+        response = self.client.post('/api/v1/banks/schedules/', {'items': [{'bank': 'x', 'amount': 1, 'term': 1}]},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_ids_in_any_uuid_spelling_and_monthly_rates(self):
+        Bank.objects.filter(pk=self.reducing.pk).update(interestPercentage=1, interestType='%/tháng')
+        bank_terms.invalidate()
+        bank_id = self.reducing.pk.hex.upper()
+        response = self.client.get('/api/v1/banks/%s/schedule/' % bank_id, {'amount': 12000000, 'term': 12})
+        self.assertEqual(response.status_code, 200)
+        # 1% a month is the 12% a year of create_bank
+        self.assertEqual((response.data['bank'], response.data['totalPayment']), (str(self.reducing.pk), 12794226))
+        items = [{'bank': bank_id, 'amount': 12000000, 'term': 12}]
+        response = self.client.post('/api/v1/banks/schedules/', {'items': items}, format='json')
+        self.assertEqual(response.data['results'][0]['totalPayment'], 12794226)
+
+    @override_settings(V1_SCHEDULE_MAX_MONTHS=100)
+    def test_schedule_months_are_capped(self):
+        items = [{'bank': str(self.flat.pk), 'amount': 12000000, 'term': 60}] * 2
+        response = self.client.post('/api/v1/banks/schedules/', {'items': items, 'includeSchedule': True},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/v1/banks/schedules/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_batch_schedules_are_throttled(self):
+        cache.clear()
+        items = [{'bank': str(self.flat.pk), 'amount': 12000000, 'term': 12}]
+        with mock.patch.dict(ScopedRateThrottle.THROTTLE_RATES, {'schedules': '2/minute'}):
+            statuses = [self.client.post('/api/v1/banks/schedules/', {'items': items}, format='json').status_code
+                        for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class CursorPaginationTest(APITestCase):
+    def test_users_are_paged_by_cursor_without_count(self):
+        for index in range(5):
+            User.objects.create(phone_number='+8490000000%d' % index)
+        url, seen, page_queries = '/api/v1/users/?page_size=2', [], []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            page_queries.append(len(context.captured_queries))
+            seen.extend(user['phone_number'] for user in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        # one keyset page query, groups and user_permissions prefetches; no aggregate
+        self.assertEqual(set(page_queries), {3})
+        etag = self.client.get('/api/v1/users/?page_size=2')['ETag']
+        self.assertEqual(self.client.get('/api/v1/users/?page_size=2', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_rows_sharing_a_timestamp_are_paged_by_id(self):
+        User.objects.bulk_create([User(phone_number='+8490%07d' % index, is_staff=False) for index in range(1200)])
+        User.objects.update(updated_at=User.objects.first().updated_at)
+        url, seen, sql = '/api/v1/users/?page_size=500&fields=id', [], []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            sql.extend(query['sql'] for query in context.captured_queries)
+            seen.extend(user['id'] for user in response.data['results'])
+            last_page, url = response.data, response.data['next']
+        self.assertEqual(len(seen), 1200)
+        self.assertEqual(len(set(seen)), 1200)
+        self.assertFalse([query for query in sql if 'OFFSET' in query.upper()])
+        back = []
+        url = last_page['previous']
+        while url:
+            response = self.client.get(url)
+            back[:0] = [user['id'] for user in response.data['results']]
+            url = response.data['previous']
+        self.assertEqual(back + [user['id'] for user in last_page['results']], seen)
+
+
+class SparseFieldsetTest(APITestCase):
+    def setUp(self):
+        self.card = create_card()
+
+    def test_fields_drop_unrequested_relations_before_querying(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/cards/', {'fields': 'name,image,rating'})
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertEqual(set(response.data['results'][0]), {'name', 'image', 'rating'})
+
+    def test_expand_selects_nested_relations(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/cards/%s/' % self.card.pk,
+                                       {'fields': 'id,name', 'expand': 'cardBasics'})
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertEqual(set(response.data), {'id', 'name', 'cardBasics'})
+        self.assertEqual(response.data['cardBasics'][0]['cardOrg'], 'VISA')
+        response = self.client.get('/api/v1/cards/', {'expand': 'cardFees'})
+        card = response.data['results'][0]
+        self.assertIn('sponsor', card)
+        self.assertIn('cardFees', card)
+        self.assertNotIn('cardBasics', card)
+
+
+class CompiledSerializerTest(APITestCase):
+    def assertSameOutput(self, serializer_class, queryset, **params):
+        request = Request(APIRequestFactory().get('/api/v1/', params))
+        context = {'request': request}
+        expected = serializer_class(serializer_class.setup_eager_loading(queryset, request), many=True,
+                                    context=context).data
+        compiled = compile_serializer(serializer_class(context=context))
+        self.assertIsNotNone(compiled)
+        self.assertEqual(JSONRenderer().render(compiled.serialize(compiled.values(queryset))),
+                         JSONRenderer().render(expected))
+
+    def test_output_matches_model_serializers(self):
+        seed_catalogue(cards=5, banks=3)
+        self.assertSameOutput(CardSerializer, Card.objects.all())
+        self.assertSameOutput(BankSerializer, Bank.objects.all())
+        self.assertSameOutput(CardSerializer, Card.objects.all(), fields='id,image', expand='cardFees')
+
+    def test_unsupported_fields_fall_back_to_the_serializer(self):
+        self.assertIsNone(compile_serializer(UserSerializer()))
+
+
+class ConditionalRequestTest(APITestCase):
+    def test_unchanged_card_list_and_detail_return_304(self):
+        card = create_card()
+        response = self.client.get('/api/v1/cards/')
+        self.assertTrue(response['ETag'].startswith('W/'))
+        response_caches['cards'].clear()
+        with self.assertNumQueries(1):
+            cached = self.client.get('/api/v1/cards/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        detail = self.client.get('/api/v1/cards/%s/' % card.pk)
+        response_caches['cards'].clear()
+        with self.assertNumQueries(1):
+            cached = self.client.get('/api/v1/cards/%s/' % card.pk,
+                                     HTTP_IF_MODIFIED_SINCE=detail['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertNotEqual(self.client.get('/api/v1/cards/', {'fields': 'name'})['ETag'], response['ETag'])
+
+    def test_changes_invalidate_validators(self):
+        card = create_card()
+        response = self.client.get('/api/v1/cards/')
+        create_card('Another')
+        self.assertEqual(self.client.get('/api/v1/cards/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        detail = self.client.get('/api/v1/cards/%s/' % card.pk)
+        card.save()
+        self.assertEqual(self.client.get('/api/v1/cards/%s/' % card.pk,
+                                         HTTP_IF_NONE_MATCH=detail['ETag']).status_code, 200)
+
+    def test_deleting_an_older_row_invalidates_list_validators(self):
+        older = create_card('Older')
+        create_card('Newer')
+        response = self.client.get('/api/v1/cards/')
+        self.assertFalse(response.has_header('Last-Modified'))
+        Card.all_objects.filter(pk=older.pk).hard_delete()
+        self.assertEqual(self.client.get('/api/v1/cards/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.client.force_authenticate(User.objects.create_superuser('0900000000', 'secret'))
+        older = User.objects.create_user('0911111111', is_staff=False)
+        User.objects.create_user('0922222222', is_staff=False)
+        response = self.client.get('/api/v1/users/')
+        User.all_objects.filter(pk=older.pk).hard_delete()
+        self.assertEqual(self.client.get('/api/v1/users/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_area_lists_revalidate_without_queries(self):
+        area_index.invalidate()
+        City.objects.create(id='01', name='Thành phố Hà Nội')
+        response = self.client.get('/api/v1/cities/')
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/v1/cities/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        for response_cache in response_caches.values():
+            response_cache.clear()
+
+    def test_anonymous_reads_are_served_from_cache(self):
+        card = create_card()
+        response = self.client.get('/api/v1/cards/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/v1/cards/')
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/v1/cards/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/api/v1/cards/', {'format': 'api'})['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/v1/cards/%s/' % card.pk)['X-Cache'], 'MISS')
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'mirror.example.com'])
+    def test_entries_are_keyed_by_host_and_only_cover_list_and_retrieve(self):
+        create_card()
+        self.client.get('/api/v1/cards/')
+        response = self.client.get('/api/v1/cards/', HTTP_HOST='mirror.example.com')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        for path in ('/api/v1/cards/search/', '/api/v1/banks/match/?income=1&amount=1&term=12'):
+            self.client.get(path)
+            self.assertFalse(self.client.get(path).has_header('X-Cache'))
+
+    def test_child_changes_invalidate_only_their_parent(self):
+        card, other = create_card(), create_card('Other')
+        bank = create_bank()
+        for path in ('/api/v1/cards/', '/api/v1/cards/%s/' % card.pk, '/api/v1/cards/%s/' % other.pk,
+                     '/api/v1/banks/%s/' % bank.pk):
+            self.client.get(path)
+        basic = card.card_basic_set.get()
+        basic.yearlyFee = 0
+        basic.save()
+        self.assertEqual(self.client.get('/api/v1/cards/')['X-Cache'], 'MISS')
+        response = self.client.get('/api/v1/cards/%s/' % card.pk)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['cardBasics'][0]['yearlyFee'], 0)
+        self.assertEqual(self.client.get('/api/v1/cards/%s/' % other.pk)['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get('/api/v1/banks/%s/' % bank.pk)['X-Cache'], 'HIT')
+        bank.bank_fee_set.all().delete()
+        self.assertEqual(self.client.get('/api/v1/banks/%s/' % bank.pk)['X-Cache'], 'MISS')
+
+    def test_stats_require_staff(self):
+        before = response_caches['banks'].stats()
+        self.client.get('/api/v1/banks/')
+        self.client.get('/api/v1/banks/')
+        self.assertEqual(self.client.get('/api/v1/stats/').status_code, 401)
+        self.client.force_authenticate(User.objects.create_superuser('0901234567', 'secret'))
+        stats = self.client.get('/api/v1/stats/').json()['response_cache']['banks']
+        self.assertEqual([stats[name] - before[name] for name in ('hits', 'misses', 'stores')], [1, 1, 1])
+
+class RenderingTest(APITestCase):
+    def setUp(self):
+        for response_cache in response_caches.values():
+            response_cache.clear()
+
+    def test_fast_renderer_matches_stock_renderer(self):
+        create_card()
+        user = User.objects.create_user('0901234567', 'secret', address='Hà Nội\u2028')
+        data = {
+            'cards': CardSerializer(Card.objects.all(), many=True).data,
+            'user': UserSerializer(user).data,
+            'raw': [user.created_at, user.id],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render([user.phone_number]), b'["+84901234567"]')
+
+    def test_large_responses_are_compressed(self):
+        for index in range(10):
+            create_card('Card %d' % index)
+        plain = self.client.get('/api/v1/cards/')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        response = self.client.get('/api/v1/cards/', HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0.8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        response = self.client.get('/api/v1/cards/', HTTP_ACCEPT_ENCODING='gzip;q=0.5, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+        self.assertEqual(self.client.get('/api/v1/cards/', HTTP_ACCEPT_ENCODING='gzip, br;q=0.5')['Content-Encoding'],
+                         'gzip')
+        small = self.client.get('/api/v1/cards/', {'page_size': 1, 'fields': 'id'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+class CachedAuthenticationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('0901234567', 'secret')
+        self.user.user_permissions.add(Permission.objects.get(codename='add_card'))
+        self.user_id = str(self.user.pk)
+        self.token = AccessToken.for_user(self.user)
+
+    def authenticate(self):
+        user = CachedJWTAuthentication().get_user(self.token)
+        return str(user.pk), user.has_perm('v1.add_card')
+
+    def test_user_and_permissions_are_reused(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.authenticate(), (self.user_id, True))
+        self.assertTrue(len(queries))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(), (self.user_id, True))
+
+    def test_changes_invalidate_cached_user(self):
+        self.authenticate()
+        self.user.user_permissions.clear()
+        self.assertEqual(self.authenticate(), (self.user_id, False))
+        group = Group.objects.create(name='editors')
+        group.user_set.add(self.user)
+        self.authenticate()
+        group.permissions.add(Permission.objects.get(codename='add_card'))
+        self.assertEqual(self.authenticate(), (self.user_id, True))
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+@override_settings(V1_PASSWORD_HASHING={'WORKERS': 1, 'QUEUE': 0, 'WAIT': 0.1, 'ITERATIONS': 1000})
+class PasswordHashingTest(TestCase):
+    def tearDown(self):
+        hashing_pool.shutdown()
+
+    def test_login_upgrades_hash_to_configured_cost(self):
+        user = User.objects.create_user('0901234567', 'secret')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        user.password = PBKDF2PasswordHasher().encode('secret', 'salt', iterations=500)
+        user.save()
+        self.assertFalse(user.check_password('wrong'))
+        self.assertTrue(user.check_password('secret'))
+        self.assertTrue(User.objects.get(pk=user.pk).password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_full_pool_refuses_with_503(self):
+        User.objects.create_user('0901234567', 'secret')
+        executor, slots = hashing_pool.get_executor({'WORKERS': 1, 'QUEUE': 0})
+        slots.acquire()
+        try:
+            with self.assertRaises(HashingUnavailable):
+                User.objects.get().check_password('secret')
+        finally:
+            slots.release()
+        self.assertTrue(User.objects.get().check_password('secret'))
+
+class UserImportTest(APITestCase):
+    csv = (
+        'phone_number,city,district,village,date_of_birth\n'
+        '0901234567,,,00001,1990-01-02\n'
+        '+84 90 123 4567,,,,\n'
+        '0912345678,02,001,,\n'
+        '12345,,,,\n'
+        '0987654321,,,,\n'
+    )
+
+    def setUp(self):
+        area_index.invalidate()
+        city = City.objects.create(id='01', name='Thành phố Hà Nội')
+        district = District.objects.create(id='001', name='Quận Ba Đình', city=city)
+        Village.objects.create(id='00001', name='Phường Phúc Xá', district=district)
+        User.objects.create_user('0987 654 321', is_staff=False)
+
+    def test_endpoint_reports_every_row(self):
+        self.client.force_authenticate(User.objects.create_superuser('0900000000', 'secret'))
+        upload = SimpleUploadedFile('leads.csv', self.csv.encode('utf-8'))
+        area_index.get()
+        # one lookup and one INSERT per batch, plus the savepoint around the INSERT
+        with self.assertNumQueries(4):
+            response = self.client.post('/api/v1/users/import/', {'file': upload}, format='multipart')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        results, counts = lines[:-1], lines[-1]['counts']
+        self.assertEqual((counts['created'], counts['duplicate'], counts['invalid']), (1, 2, 2))
+        self.assertEqual([row['status'] for row in results],
+                         ['created', 'duplicate', 'invalid', 'invalid', 'duplicate'])
+        user = User.objects.get(pk=results[0]['id'])
+        self.assertEqual((user.city_id, user.district_id, user.village_id), ('01', '001', '00001'))
+        self.assertFalse(user.is_staff or user.has_usable_password())
+
+    def test_files_that_are_not_utf8_are_rejected(self):
+        self.client.force_authenticate(User.objects.create_superuser('0900000000', 'secret'))
+        upload = SimpleUploadedFile('leads.csv', 'phone_number,address\n0901234567,Hà Nội\n'.encode('utf-16'))
+        response = self.client.post('/api/v1/users/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.data['file'][0])
+
+    def test_rows_still_conflicting_after_the_retry_are_marked_failed(self):
+        rows = [{'phone_number': '0901234567'}, {'phone_number': '0912345678'}]
+        importer = UserImporter()
+        with mock.patch.object(User.objects, 'bulk_create', side_effect=IntegrityError('duplicate key')):
+            results = list(importer.run(rows))
+        self.assertEqual([result['status'] for result in results], ['failed', 'failed'])
+        self.assertEqual(importer.counts['failed'], 2)
+
+    def test_command_reads_ndjson(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as stream:
+            stream.write('{"phone_number": "0901234567", "district": "001"}\nnot json\n')
+        self.addCleanup(os.remove, stream.name)
+        output = io.StringIO()
+        call_command('import_users', stream.name, stdout=output, stderr=io.StringIO())
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([result['status'] for result in results], ['created', 'invalid'])
+        self.assertEqual(User.objects.get(pk=results[0]['id']).city_id, '01')
+
+class CountingExecutor(ThreadPoolExecutor):
+    submitted = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted += 1
+        return super(CountingExecutor, self).submit(fn, *args, **kwargs)
+
+# requests that miss the loop run on another thread and connection, so data has to be committed
+class AsyncReadHandlerTest(TransactionTestCase):
+    def setUp(self):
+        for response_cache in response_caches.values():
+            response_cache.clear()
+        for histogram in metrics.HISTOGRAMS:
+            histogram.reset()
+        self.executor = CountingExecutor(1)
+        self.addCleanup(self.executor.shutdown)
+        self.handler = AsyncReadHandler(application=object(), executor=self.executor)
+
+    def request(self, method, path, body=b'', **headers):
+        """
+        Coroutine running one request through the handler, returning (status, headers, body).
+        """
+        scope = {
+            'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'root_path': '',
+            'scheme': 'http', 'server': ('testserver', 80),
+            'headers': [(name.encode('latin1'), value.encode('latin1')) for name, value in headers.items()],
+        }
+        messages = []
+        async def receive():
+            return {'type': 'http.request', 'body': body}
+        async def send(message):
+            messages.append(message)
+        async def run():
+            await self.handler(scope, receive, send)
+            return (messages[0]['status'], dict(messages[0]['headers']),
+                    b''.join(m.get('body', b'') for m in messages[1:]))
+        return run()
+
+    def run_requests(self, *requests):
+        async def run():
+            return await asyncio.gather(*requests)
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+    def get(self, path, **headers):
+        return self.run_requests(self.request('GET', path, **headers))[0]
+
+    def test_cache_hits_are_served_on_the_loop(self):
+        card = create_card()
+        status, headers, body = self.get('/api/v1/cards/%s/' % card.pk)
+        self.assertEqual((status, headers[b'X-Cache'], self.executor.submitted), (200, b'MISS', 1))
+        with self.assertNumQueries(0):
+            status, cached_headers, cached_body = self.get('/api/v1/cards/%s/' % card.pk)
+        self.assertEqual((status, cached_headers[b'X-Cache'], self.executor.submitted), (200, b'HIT', 1))
+        self.assertEqual(cached_body, body)
+        self.assertEqual(cached_headers[b'X-Frame-Options'], headers[b'X-Frame-Options'])
+        # the hit never reached InstrumentationMiddleware, but is measured all the same
+        self.assertEqual(metrics.request_duration.series[('card-detail', 'GET')][2], 2)
+        self.get('/api/v1/cards/%s/' % card.pk, authorization='Bearer token')
+        self.assertEqual(self.executor.submitted, 2)
+
+    def test_disallowed_hosts_fall_back_to_the_handler(self):
+        card = create_card()
+        self.assertEqual(self.get('/api/v1/cards/%s/' % card.pk)[0], 200)
+        self.assertEqual(self.get('/api/v1/cards/%s/' % card.pk, host='evil.example')[0], 400)
+        self.assertEqual(self.executor.submitted, 2)
+
+    def test_area_tree_needs_a_current_index(self):
+        area_index.invalidate()
+        City.objects.create(id='01', name='Thành phố Hà Nội')
+        self.assertEqual(self.get('/api/v1/areas/')[0], 200)
+        self.assertEqual(self.executor.submitted, 1)
+        status, headers, body = self.get('/api/v1/areas/', **{'accept-encoding': 'gzip'})
+        self.assertEqual((headers[b'Content-Encoding'], self.executor.submitted), (b'gzip', 1))
+        self.assertEqual(json.loads(gzip.decompress(body))[0]['id'], '01')
+
+    def test_writes_run_concurrently_on_the_worker_pool(self):
+        executor = CountingExecutor(2)
+        self.addCleanup(executor.shutdown)
+        self.handler = AsyncReadHandler(application=object(), executor=executor)
+        barrier = threading.Barrier(2, timeout=5)
+        def post(view, request, *args, **kwargs):
+            # both requests have to be inside the view at once to pass
+            barrier.wait()
+            return HttpResponse('{}', content_type='application/json')
+        body = b'{"phone_number": "0901234567", "password": "secret"}'
+        with mock.patch.object(TokenObtainPairView, 'post', post):
+            responses = self.run_requests(*[self.request('POST', '/api/token/', body, **{
+                'content-type': 'application/json', 'content-length': str(len(body))}) for _ in range(2)])
+        self.assertEqual([status for status, headers, content in responses], [200, 200])
+        self.assertEqual(executor.submitted, 2)
+
+    def test_streaming_responses_are_sent_as_they_are_produced(self):
+        bank = create_bank()
+        body = json.dumps({'includeSchedule': True, 'items': [
+            {'bank': str(bank.pk), 'amount': 120000000, 'term': 12}]}).encode('utf-8')
+        status, headers, content = self.run_requests(self.request('POST', '/api/v1/banks/schedules/', body, **{
+            'content-type': 'application/json', 'content-length': str(len(body))}))[0]
+        self.assertEqual(status, 200)
+        self.assertEqual(len(json.loads(content.decode('utf-8'))['results'][0]['schedule']), 12)
+
+# outside a test transaction, since reads inside one always use the primary
+class ReplicaRoutingTest(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        self.replicas = ReplicaSet(['replica0', 'replica1'])
+        self.replicas.check = lambda: setattr(self.replicas, 'healthy', ['replica0', 'replica1'])
+        self.router = ReplicaRouter(self.replicas)
+        self.middleware = ReplicaRoutingMiddleware(lambda request: HttpResponse())
+        self.addCleanup(use_replicas, False)
+
+    def route(self, method, path='/api/v1/cards/', **extra):
+        request = getattr(APIRequestFactory(), method)(path, **extra)
+        self.middleware.process_request(request)
+        return self.router.db_for_read(Card)
+
+    def test_safe_v1_requests_read_from_replicas_in_turn(self):
+        self.assertEqual([self.route('get') for _ in range(3)], ['replica0', 'replica1', 'replica0'])
+        self.assertEqual(self.route('get', '/admin/'), 'default')
+        self.assertEqual(self.route('post'), 'default')
+        self.replicas.check = lambda: setattr(self.replicas, 'healthy', [])
+        self.replicas.checked_at = None
+        self.assertEqual(self.route('get'), 'default')
+
+    def test_writers_are_pinned_to_the_primary(self):
+        request = APIRequestFactory().post('/api/v1/cards/', HTTP_AUTHORIZATION='Bearer token')
+        self.middleware.process_request(request)
+        response = self.middleware.process_response(request, HttpResponse(status=201))
+        self.assertEqual(response.cookies['v1_primary']['max-age'], 10)
+        self.assertEqual(self.route('get', HTTP_AUTHORIZATION='Bearer token'), 'default')
+        self.assertEqual(self.route('get', HTTP_COOKIE='v1_primary=1'), 'default')
+        self.assertEqual(self.route('get', HTTP_AUTHORIZATION='Bearer other'), 'replica0')
+
+    def test_pins_need_a_cache_shared_by_workers(self):
+        with override_settings(V1_REPLICAS={'ALIASES': ['replica0']}):
+            self.assertRaises(ImproperlyConfigured, ReplicaRoutingMiddleware, lambda request: HttpResponse())
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        with override_settings(CACHES=dict(settings.CACHES, pins=shared),
+                               V1_REPLICAS={'ALIASES': ['replica0'], 'PIN_CACHE': 'pins'}):
+            middleware = ReplicaRoutingMiddleware(lambda request: HttpResponse())
+            request = APIRequestFactory().post('/api/v1/cards/', HTTP_AUTHORIZATION='Bearer token')
+            middleware.process_response(request, HttpResponse(status=201))
+            # another worker only shares the cache with this one
+            request = APIRequestFactory().get('/api/v1/cards/', HTTP_AUTHORIZATION='Bearer token')
+            self.assertTrue(ReplicaRoutingMiddleware(lambda request: HttpResponse()).is_pinned(request))
+
+    def test_snapshots_and_cache_fills_skip_a_lagging_replica(self):
+        self.replicas.check = lambda: setattr(self.replicas, 'healthy', ['lagging'])
+        use_replicas(True)
+        snapshot = VersionedSnapshot('replica-test', lambda: self.router.db_for_read(Card))
+        self.addCleanup(snapshot.invalidate)
+        self.assertEqual(snapshot.get(), 'default')
+        match = resolve('/api/v1/cards/')
+        request = APIRequestFactory().get('/api/v1/cards/')
+        request.resolver_match = match
+        self.addCleanup(response_caches['cards'].clear)
+        with mock.patch.object(CardViewSet, 'list', lambda view, request: Response(self.router.db_for_read(Card))):
+            response = match.func(request)
+        self.assertEqual((response['X-Cache'], response.data), ('MISS', 'default'))
+        self.assertTrue(replicas_enabled())
+        self.assertEqual(self.router.db_for_read(Card), 'lagging')
+
+    def test_health_check_drops_failing_replicas(self):
+        replicas = ReplicaSet(['default', 'missing'])
+        replicas.check()
+        self.assertEqual(replicas.healthy, ['default'])
+        self.assertEqual(replicas.stats()['missing'], {'healthy': False, 'lag': None, 'reads': 0})
+
+class FakeConnection(object):
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+        self.pool = Pool('test', self.connect, validate=lambda connection: connection.alive,
+                         max_size=2, min_size=1, timeout=0.05)
+
+    def connect(self):
+        self.opened.append(FakeConnection())
+        return self.opened[-1]
+
+    def test_connections_are_reused_up_to_the_bound(self):
+        self.pool.prewarm()
+        self.assertEqual(len(self.opened), 1)
+        first = self.pool.checkout()
+        second = self.pool.checkout()
+        self.assertEqual((first, len(self.opened)), (self.opened[0], 2))
+        self.assertEqual(self.pool.stats()['utilization'], 1.0)
+        with self.assertRaises(PoolTimeout):
+            self.pool.checkout()
+        self.pool.checkin(second)
+        self.assertIs(self.pool.checkout(), second)
+        stats = self.pool.stats()
+        self.assertEqual((stats['checkouts'], stats['waits'], stats['timeouts'], stats['in_use']), (3, 0, 1, 2))
+        self.assertGreaterEqual(stats['max_wait_time'], 0)
+
+    def test_dead_connections_are_replaced_on_checkout(self):
+        self.pool.prewarm()
+        self.opened[0].alive = False
+        connection = self.pool.checkout()
+        self.assertIs(connection, self.opened[1])
+        self.assertTrue(self.opened[0].closed)
+        self.pool.checkin(connection, discard=True)
+        self.assertEqual((self.pool.stats()['invalid'], self.pool.stats()['size']), (1, 0))
+
+    def test_a_failed_prewarm_keeps_the_pool_usable(self):
+        def connect():
+            if self.opened:
+                raise OperationalError('server has gone away')
+            return self.connect()
+        pool = Pool('test', connect, max_size=3, min_size=3)
+        self.assertRaises(OperationalError, pool.prewarm)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['idle']), (1, 1))
+        # the worker starts regardless, with the failure logged
+        database = mock.Mock(alias='default', wrap_database_errors=ExitStack())
+        database.get_pool.return_value = pool
+        with mock.patch('v1.pool.connections') as connections:
+            connections.all.return_value = [database]
+            with self.assertLogs('v1.pool', 'WARNING'):
+                prewarm_database_pools()
+
+def plan_problems(queryset):
+    """
+    Lines of the query plan that read a whole table or sort outside an index.
+    """
+    plan = queryset.explain()
+    if connection.vendor == 'mysql':
+        # tabular EXPLAIN: id select_type table partitions type ...
+        return [line for line in plan.splitlines()
+                if line.split()[4:5] == ['ALL'] or 'Using filesort' in line]
+    return [line for line in plan.splitlines()
+            if re.search(r'\bSCAN (TABLE )?\w+$', line) or 'TEMP B-TREE FOR ORDER BY' in line]
+
+class QueryPlanTest(TestCase):
+    def test_hot_queries_use_indexes(self):
+        active = Status.ACTIVE.name
+        hot = [
+            Card.objects.filter(status=active),
+            Bank.objects.filter(status=active),
+            City.objects.filter(status=active),
+            User.objects.filter(is_staff=False).order_by('updated_at', 'id'),
+            User.objects.filter(is_staff=True, status=active),
+            CardFee.objects.filter(card__in=[uuid7(), uuid7()], status=active),
+            BankFee.objects.filter(bank=uuid7(), status=active),
+        ]
+        for queryset in hot:
+            self.assertEqual(plan_problems(queryset), [], str(queryset.query))
+        self.assertNotEqual(plan_problems(Card.objects.order_by('name')), [])
+
+class SoftDeleteTest(APITestCase):
+    def setUp(self):
+        for response_cache in response_caches.values():
+            response_cache.clear()
+
+    def test_delete_marks_rows_and_children_deleted(self):
+        card, other = create_card(), create_card('Other')
+        self.assertEqual(self.client.get('/api/v1/cards/%s/' % card.pk).status_code, 200)
+        total, counts = card.delete()
+        self.assertEqual((total, counts['v1.Card'], counts['v1.CardFee']), (6, 1, 1))
+        self.assertEqual(card.status, Status.DELETED.name)
+        self.assertEqual(list(Card.objects.values_list('pk', flat=True)), [other.pk])
+        self.assertEqual(Card.all_objects.get(pk=card.pk).status, Status.DELETED.name)
+        self.assertEqual(CardFee.all_objects.filter(card=card, status=Status.DELETED.name).count(), 1)
+        self.assertEqual(self.client.get('/api/v1/cards/%s/' % card.pk).status_code, 404)
+        self.assertEqual([row['id'] for row in self.client.get('/api/v1/cards/').json()['results']], [str(other.pk)])
+        self.assertEqual(Card.all_objects.filter(pk=card.pk).delete(), (0, {}))
+        Card.all_objects.filter(pk=card.pk).hard_delete()
+        self.assertFalse(CardFee.all_objects.filter(card_id=card.pk).exists())
+
+    def test_deleted_users_keep_their_number(self):
+        user = User.objects.create(phone_number='0901234567', is_staff=False)
+        user.delete()
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        serializer = UserSerializer(data={'phone_number': '0901234567'})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('phone_number', serializer.errors)
+
+class CompactUUIDTest(SimpleTestCase):
+    def test_uuid7_sorts_by_creation(self):
+        ids = [uuid7() for _ in range(2000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual([str(value) for value in ids], sorted(str(value) for value in ids))
+        self.assertEqual(set(value.version for value in ids), {7})
+
+    def test_mysql_stores_16_bytes_and_shows_text(self):
+        mysql = type('Connection', (), {'vendor': 'mysql'})()
+        field = CompactUUIDField()
+        value = uuid7()
+        self.assertEqual(field.db_type(mysql), 'binary(16)')
+        self.assertEqual(field.get_db_prep_value(str(value), mysql), value.bytes)
+        self.assertEqual(field.from_db_value(value.bytes, None, mysql), value)
+
+    def test_plan_covers_every_foreign_key(self):
+        plan = get_plan([User, Card])
+        self.assertEqual(plan['users'], ('id', ['id']))
+        self.assertEqual(plan['django_admin_log'][1], ['user_id'])
+        self.assertEqual(plan['users_groups'][1], ['user_id'])
+        self.assertEqual(plan['card_fees'], ('id', ['card_id']))
+
+class SeedTest(TestCase):
+    def test_users_live_in_consistent_areas(self):
+        cities, districts, villages = seed_areas(cities=2, districts=3, villages=4)
+        self.assertEqual((City.objects.count(), District.objects.count(), Village.objects.count()), (2, 6, 24))
+        seed_users(50, villages)
+        self.assertEqual(User.objects.filter(is_staff=False).count(), 50)
+        user = User.objects.select_related('village__district').get(phone_number='+84900000007')
+        self.assertEqual(user.district_id, user.village.district_id)
+        self.assertEqual(user.city_id, user.village.district.city_id)
+        self.assertTrue(user.check_password('secret'))
+
+class MetricsTest(APITestCase):
+    def setUp(self):
+        metrics.traces.clear()
+        for response_cache in response_caches.values():
+            response_cache.clear()
+        for histogram in metrics.HISTOGRAMS:
+            histogram.reset()
+
+    @override_settings(V1_METRICS={'SAMPLE_RATE': 1, 'SLOW_SECONDS': 0})
+    def test_views_are_measured_and_traced(self):
+        seed_catalogue(cards=3, banks=1)
+        self.assertEqual(self.client.get('/api/v1/cards/').status_code, 200)
+        self.client.force_authenticate(User.objects.create_superuser('0900000000', 'secret'))
+        content = self.client.get('/api/v1/metrics/').content.decode('utf-8')
+        self.assertIn('v1_request_duration_seconds_count{view="card-list",method="GET"} 1', content)
+        self.assertIn('v1_db_queries_bucket{view="card-list",method="GET",le="+Inf"} 1', content)
+        self.assertIn('v1_serializer_duration_seconds_count{view="card-list",method="GET"} 1', content)
+        self.assertIn('v1_render_duration_seconds_count{view="card-list",method="GET"} 1', content)
+        self.assertIn('# TYPE v1_stats_response_cache_cards_misses gauge', content)
+        trace = [trace for trace in metrics.traces if trace['view'] == 'card-list'][0]
+        self.assertGreater(trace['queries'], 0)
+        self.assertEqual(trace['queries'], len(trace['sql']))
+        self.assertTrue(any('cards' in query['sql'] for query in trace['sql']))
+
+    def test_only_staff_can_read_without_a_token(self):
+        self.assertEqual(self.client.get('/api/v1/metrics/').status_code, 401)
+        self.client.force_authenticate(User.objects.create_user('0901234567', 'secret', is_staff=False))
+        self.assertEqual(self.client.get('/api/v1/metrics/').status_code, 401)
+        self.client.force_authenticate(User.objects.create_user('0912345678', 'secret', is_staff=True))
+        self.assertEqual(self.client.get('/api/v1/metrics/').status_code, 200)
+
+    @override_settings(V1_METRICS={'TOKEN': 'scrape'})
+    def test_scrapers_can_use_the_configured_token(self):
+        self.assertEqual(self.client.get('/api/v1/metrics/').status_code, 401)
+        self.assertEqual(self.client.get('/api/v1/metrics/', HTTP_AUTHORIZATION='Bearer other').status_code, 401)
+        response = self.client.get('/api/v1/metrics/', HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+def png_upload(name='card.png', size=(1200, 760)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 60)).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+class ImageVariantsTest(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for response_cache in response_caches.values():
+            response_cache.clear()
+
+    def test_upload_makes_hashed_variants(self):
+        card = Card.objects.create(name='Card', image=png_upload())
+        thumb = card.image_variants['thumb']
+        self.assertLessEqual(thumb['width'], 150)
+        self.assertLessEqual(thumb['height'], 100)
+        self.assertTrue(images.re_hashed.search(thumb['webp']))
+        self.assertTrue(card.image.storage.exists(thumb['webp']))
+        self.assertEqual(card.image_variants['full']['width'], 1200)
+        variants = card.image_variants
+        card.name = 'Renamed'
+        card.save()
+        self.assertEqual(card.image_variants, variants)
+
+    def test_api_exposes_variant_urls(self):
+        card = Card.objects.create(name='Card', image=png_upload())
+        for path in ('/api/v1/cards/', '/api/v1/cards/%s/' % card.pk):
+            data = self.client.get(path).json()
+            item = data[0] if isinstance(data, list) else data.get('results', [data])[0]
+            self.assertTrue(item['image_variants']['thumb']['webp'].endswith(card.image_variants['thumb']['webp']))
+            self.assertTrue(item['image_variants']['thumb']['webp'].startswith('http://testserver/'))
+
+    def test_backfill_drops_cached_details(self):
+        card = Card.objects.create(name='Card', image=png_upload())
+        Card.all_objects.filter(pk=card.pk).update(image_variants={})
+        self.assertEqual(self.client.get('/api/v1/cards/%s/' % card.pk).json()['image_variants'], {})
+        call_command('image_variants', stdout=io.StringIO(), stderr=io.StringIO())
+        response = self.client.get('/api/v1/cards/%s/' % card.pk)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('thumb', response.json()['image_variants'])
+
+    def test_hashed_files_are_immutable(self):
+        card = Card.objects.create(name='Card', image=png_upload())
+        request = APIRequestFactory().get('/')
+        root = card.image.storage.location
+        response = images.serve_media(request, card.image_variants['thumb']['png'], document_root=root)
+        self.assertEqual(response['Cache-Control'], images.IMMUTABLE)
+        response = images.serve_media(request, card.image.name, document_root=root)
+        self.assertFalse(response.has_header('Cache-Control'))
+
+class CacheVersionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bumps_reach_processes_with_their_own_cache(self):
+        before = get_version('things')
+        bump_version('things')
+        after = get_version('things')
+        self.assertNotEqual(before, after)
+        # another worker's LocMemCache has nothing cached, the table has the new token
+        cache.clear()
+        self.assertEqual(get_version('things'), after)
+
+    def test_reads_do_not_write_versions(self):
+        # one SELECT each, no INSERT
+        with self.assertNumQueries(2):
+            self.assertEqual(get_version('things:%s' % uuid7()), get_version('others:%s' % uuid7()))
+        card = create_card()
+        response_caches['cards'].clear()
+        count = CacheVersion.objects.count()
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/v1/cards/%s/' % uuid7()).status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/cards/%s/' % card.pk).status_code, 200)
+        self.assertEqual(CacheVersion.objects.count(), count)
+
+    @override_settings(V1_VERSION_TIMEOUT=0.05)
+    def test_cached_versions_expire(self):
+        bump_version('things')
+        version = get_version('things')
+        CacheVersion.objects.filter(name='things').update(token='changed-elsewhere')
+        self.assertEqual(get_version('things'), version)
+        time.sleep(0.1)
+        self.assertEqual(get_version('things'), 'changed-elsewhere')
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from v1.views import (
     BankViewSet, CardViewSet,
-    CityViewList, DistrictViewList, VillageViewList,
+    CityViewList, DistrictViewList, VillageViewList, AreaTreeView, StatsView, MetricsView,
     UserViewSet, CollaboratorViewSet
 )
 
@@ -18,4 +18,7 @@ urlpatterns = [
     path('cities/', CityViewList.as_view()),
     path('districts/<city_id>', DistrictViewList.as_view()),
     path('villages/<district_id>', VillageViewList.as_view()),
+    path('areas/', AreaTreeView.as_view()),
+    path('stats/', StatsView.as_view()),
+    path('metrics/', MetricsView.as_view()),
 ]
\ No newline at end of file
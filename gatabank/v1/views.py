@@ -1,43 +1,430 @@
+import abc
+import calendar
+import hashlib
+import hmac
+import re
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.utils.http import http_date
+from django.views import View
 from rest_framework import viewsets
 from v1.models import (
     Bank, Card,
     City, District, Village,
     User
 )
-from rest_framework.generics import ListAPIView
+from rest_framework.generics import ListAPIView, get_object_or_404
 from v1.serializers import (
     BankSerializer, CardSerializer, 
     CitySerializer, DistrictSerializer, VillageSerializer,
-    UserSerializer
+    UserSerializer, LoanQuerySerializer, ScheduleQuerySerializer, ScheduleBatchSerializer
 )
-from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer, AdminRenderer
+from rest_framework.renderers import BrowsableAPIRenderer, AdminRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.throttling import ScopedRateThrottle
+from django_filters.rest_framework import DjangoFilterBackend
+from v1 import metrics, stats
+from v1.areas import area_index
+from v1.caches import response_caches, versions_in_process
+from v1.compiled import compile_serializer
+from v1.filters import CardFilter, card_facets
+from v1.imports import IMPORT_FORMATS, UserImporter, check_encoding, guess_format, iter_import_rows
+from v1.loans import bank_terms
+from v1.pagination import UpdatedAtCursorPagination
+from v1.renderers import FastJSONRenderer
+from v1.routers import primary_reads
 
-class CityViewList(ListAPIView):
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+def stream_results(count, results):
+    """
+    A {"count": count, "results": [...]} document, encoded one result at a time.
+    """
+    renderer = FastJSONRenderer()
+    yield b'{"count":%d,"results":[' % count
+    for index, item in enumerate(results):
+        yield (b',' if index else b'') + renderer.render(item)
+    yield b']}'
+
+def stream_import(importer, rows):
+    """
+    NDJSON: one line per imported row as it is processed, then {"counts": {...}}.
+    """
+    renderer = FastJSONRenderer()
+    for result in importer.run(rows):
+        yield renderer.render(result) + b'\n'
+    yield renderer.render({'counts': importer.counts}) + b'\n'
+
+class ConditionalMixin(object):
+    """
+    Answers If-None-Match / If-Modified-Since with a 304 before the response is built.
+    ETags are weak and cover the full path and negotiated media type, so `?fields=`,
+    paging and `?format=` each get their own validator.
+    """
+
+    def get_etag(self, request, *parts):
+        key = '|'.join([request.get_full_path(), request.accepted_media_type or ''] + [str(part) for part in parts])
+        return 'W/"%s"' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def conditional_response(self, request, build_response, *parts, last_modified=None):
+        etag = self.get_etag(request, last_modified, *parts)
+        timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = build_response()
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+class ResponseCacheMixin(object):
+    """
+    Serves anonymous GET/HEAD requests to the `cached_actions` from the shared response
+    cache named by `response_cache`. Entries for a detail route follow that object's
+    version, everything else follows the version of the whole namespace.
+    """
+    response_cache = None
+    # computed actions (match, schedule, search) depend on more than the stored rows
+    cached_actions = ('list', 'retrieve')
+
+    @classmethod
+    def get_cache_action(cls, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+        actions = getattr(match.func, 'actions', None)
+        # plain list views have no action map
+        return 'list' if actions is None else actions.get('get')
+
+    @classmethod
+    def get_cache_object_id(cls, kwargs):
+        value = kwargs.get(cls.lookup_url_kwarg or cls.lookup_field)
+        if value is None:
+            return None
+        try:
+            return str(cls.queryset.model._meta.pk.to_python(value))
+        except DjangoValidationError:
+            return None
+
+    @classmethod
+    def cached_response(cls, request, kwargs, count_miss=True, peek=False):
+        """
+        (key, response) for a cacheable request, response is None on a miss and both are
+        None when the request cannot be cached (or, with `peek`, its versions are not cached).
+        """
+        cache = response_caches.get(cls.response_cache)
+        if cache is None or not cache.is_cacheable(request) or cls.get_cache_action(request) not in cls.cached_actions:
+            return None, None
+        key = cache.get_key(request, cls.get_cache_object_id(kwargs), peek=peek)
+        if key is None:
+            return None, None
+        entry = cache.get(key, count_miss=count_miss)
+        if entry is None:
+            return key, None
+        response = entry.to_response(request)
+        response['X-Cache'] = 'HIT'
+        return key, response
+
+    @classmethod
+    def memory_response(cls, request, kwargs):
+        # used by v1.asgi on the event loop, so only when no lookup can block
+        cache = response_caches.get(cls.response_cache)
+        if cache is None or not cache.in_process:
+            return None
+        return cls.cached_response(request, kwargs, count_miss=False, peek=True)[1]
+
+    def dispatch(self, request, *args, **kwargs):
+        key, response = self.cached_response(request, kwargs)
+        if response is not None or key is None:
+            return response or super(ResponseCacheMixin, self).dispatch(request, *args, **kwargs)
+        # the entry is served to every client, so it is not built from a lagging replica
+        with primary_reads():
+            response = super(ResponseCacheMixin, self).dispatch(request, *args, **kwargs)
+            if response.status_code == 200 and hasattr(response, 'render'):
+                response.render()
+        if response.status_code == 200:
+            response_caches[self.response_cache].set(key, response)
+        response['X-Cache'] = 'MISS'
+        return response
+
+class AreaViewList(ResponseCacheMixin, ConditionalMixin, ListAPIView, metaclass=abc.ABCMeta):
+    # rows come pre-serialized from the in-process area index, no DB access
+    response_cache = 'areas'
+
+    @abc.abstractmethod
+    def get_area_rows(self, index):
+        """
+        The serialized rows of this list, from the current v1.areas.AreaIndex.
+        """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, self.list_response, area_index.version)
+
+    def list_response(self):
+        rows = self.get_area_rows(area_index.get())
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(rows)
+
+class CityViewList(AreaViewList):
     queryset = City.objects.all()
     serializer_class = CitySerializer
 
-class DistrictViewList(ListAPIView):
+    def get_area_rows(self, index):
+        return index.cities
+
+class DistrictViewList(AreaViewList):
     serializer_class = DistrictSerializer
     def get_queryset(self):
         return District.objects.filter(city_id = self.kwargs['city_id'])
 
-class VillageViewList(ListAPIView):
+    def get_area_rows(self, index):
+        return index.districts(self.kwargs['city_id'])
+
+class VillageViewList(AreaViewList):
     serializer_class = VillageSerializer
     def get_queryset(self):
         return Village.objects.filter(district_id = self.kwargs['district_id'])
 
-class BankViewSet(viewsets.ModelViewSet):
+    def get_area_rows(self, index):
+        return index.villages(self.kwargs['district_id'])
+
+class AbstractViewSet(ConditionalMixin, viewsets.ModelViewSet):
+    # render list/retrieve through a CompiledSerializer built from .values() rows
+    compiled_serializer = False
+
+    def get_queryset(self):
+        queryset = super(AbstractViewSet, self).get_queryset()
+        return self.get_serializer_class().setup_eager_loading(queryset, request=self.request)
+
+    def get_compiled_serializer(self):
+        if not self.compiled_serializer:
+            return None
+        return compile_serializer(self.get_serializer())
+
+    def list_response(self, queryset):
+        compiled = self.get_compiled_serializer()
+        if compiled is not None:
+            queryset = compiled.values(queryset)
+        page = self.paginate_queryset(queryset)
+        rows = queryset if page is None else page
+        with metrics.serializing():
+            if compiled is not None:
+                data = compiled.serialize(rows)
+            else:
+                data = self.get_serializer(rows, many=True).data
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def conditional_list(self, request, queryset, build_response):
+        if isinstance(self.paginator, UpdatedAtCursorPagination):
+            return self.conditional_page(request, build_response)
+        # ETag only: a row deleted or leaving the filter can leave MAX(updated_at) as it
+        # was, so lists have no Last-Modified and the COUNT(*) catches those changes
+        stats = queryset.aggregate(latest=Max('updated_at'), count=Count('pk'))
+        return self.conditional_response(request, build_response, stats['latest'], stats['count'])
+
+    def conditional_page(self, request, build_response):
+        """
+        Keyset pages skip the table-wide aggregate: the page is read anyway and its
+        (id, updated_at) pairs are the validator, so a 304 only saves the body.
+        """
+        response = build_response()
+        page = getattr(self.paginator, 'page', None)
+        if response.status_code != 200 or page is None:
+            return response
+        rows = [(row['id'], row['updated_at']) if isinstance(row, dict) else (row.pk, row.updated_at)
+                for row in page]
+        etag = self.get_etag(request, self.paginator.has_next, *rows)
+        response = get_conditional_response(request, etag=etag) or response
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_list(request, queryset, lambda: self.list_response(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            updated_at = self.filter_queryset(self.get_queryset()).filter(**lookup).values_list(
+                'updated_at', flat=True).first()
+        except (TypeError, ValueError, DjangoValidationError):
+            # not a valid key for the lookup field, e.g. a malformed uuid
+            raise NotFound()
+        if updated_at is None:
+            return self.retrieve_response(request, *args, **kwargs)
+        return self.conditional_response(request, lambda: self.retrieve_response(request, *args, **kwargs),
+                                         last_modified=updated_at)
+
+    def retrieve_response(self, request, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            instance = self.get_object()
+            with metrics.serializing():
+                return Response(self.get_serializer(instance).data)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = compiled.values(self.filter_queryset(self.get_queryset()))
+        row = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        with metrics.serializing():
+            return Response(compiled.serialize([row])[0])
+
+class AreaTreeView(APIView):
+    queryset = City.objects.all()
+    renderer_classes = [FastJSONRenderer]
+
+    @classmethod
+    def memory_response(cls, request, kwargs):
+        index = area_index.peek() if versions_in_process() else None
+        return None if index is None else cls.tree_response(request, index.tree)
+
+    def get(self, request, *args, **kwargs):
+        return self.tree_response(request, area_index.get().tree)
+
+    @staticmethod
+    def tree_response(request, tree):
+        use_gzip = re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = tree.gzip_etag if use_gzip else tree.etag
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(tree.gzip_content if use_gzip else tree.content,
+                                    content_type='application/json')
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+class StatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(stats.collect())
+
+class MetricsView(View):
+    """
+    Prometheus scrape target for staff users and, when V1_METRICS['TOKEN'] is set, for
+    scrapers sending it as a bearer token.
+    """
+
+    @staticmethod
+    def is_allowed(request):
+        token = metrics.get_config().get('TOKEN')
+        if token and hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer %s' % token):
+            return True
+        authenticators = [authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        try:
+            user = Request(request, authenticators=authenticators).user
+        except APIException:
+            return False
+        return bool(user and user.is_staff)
+
+    def get(self, request, *args, **kwargs):
+        if not self.is_allowed(request):
+            return HttpResponse(status=401)
+        return HttpResponse(metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class BankViewSet(ResponseCacheMixin, AbstractViewSet):
     queryset = Bank.objects.all()
     serializer_class = BankSerializer
+    compiled_serializer = True
+    response_cache = 'banks'
+    # rate of the actions using ScopedRateThrottle, only schedules
+    throttle_scope = 'schedules'
+
+    @action(detail=False)
+    def match(self, request):
+        query = LoanQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        results = bank_terms.get().match(**query.validated_data)
+        return Response({'count': len(results), 'results': results})
+
+    @action(detail=True)
+    def schedule(self, request, pk=None):
+        query = ScheduleQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        terms = bank_terms.get()
+        position = terms.position(pk)
+        if position is None:
+            raise NotFound()
+        return Response(terms.schedules([(position, query.validated_data['amount'], query.validated_data['term'])])[0])
 
-class CardViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny],
+            throttle_classes=[ScopedRateThrottle])
+    def schedules(self, request):
+        batch = ScheduleBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        terms = bank_terms.get()
+        items = batch.validated_data['items']
+        positions = [terms.position(item['bank']) for item in items]
+        unknown = sorted(set(item['bank'] for item, position in zip(items, positions) if position is None))
+        if unknown:
+            raise ValidationError({'items': ['Unknown bank: %s' % ', '.join(unknown)]})
+        loans = [(position, item['amount'], item['term']) for item, position in zip(items, positions)]
+        if not batch.validated_data['includeSchedule']:
+            results = terms.schedules(loans, include_schedule=False)
+            return Response({'count': len(results), 'results': results})
+        return StreamingHttpResponse(stream_results(len(loans), terms.iter_schedules(loans)),
+                                     content_type='application/json')
+
+class CardViewSet(ResponseCacheMixin, AbstractViewSet):
     queryset = Card.objects.all()
     serializer_class = CardSerializer
+    compiled_serializer = True
+    response_cache = 'cards'
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = CardFilter
+
+    @action(detail=False)
+    def search(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_list(request, queryset, lambda: self.search_response(queryset))
+
+    def search_response(self, queryset):
+        facets = card_facets(queryset)
+        response = self.list_response(queryset)
+        if not isinstance(response.data, dict):
+            response.data = {'results': response.data}
+        response.data['facets'] = facets
+        return response
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(AbstractViewSet):
     queryset = User.objects.filter(is_staff=False)
     serializer_class = UserSerializer
+    pagination_class = UpdatedAtCursorPagination
 
-class CollaboratorViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_users(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['No file was submitted.']})
+        format = request.data.get('format') or guess_format(upload.name)
+        if format not in IMPORT_FORMATS:
+            raise ValidationError({'format': ['Expected one of: %s' % ', '.join(IMPORT_FORMATS)]})
+        try:
+            check_encoding(upload)
+        except ValueError as e:
+            raise ValidationError({'file': [str(e)]})
+        return StreamingHttpResponse(stream_import(UserImporter(), iter_import_rows(upload, format)),
+                                     content_type='application/x-ndjson')
+
+class CollaboratorViewSet(AbstractViewSet):
     queryset = User.objects.filter(is_staff=True)
-    serializer_class = UserSerializer
\ No newline at end of file
+    serializer_class = UserSerializer
+    pagination_class = UpdatedAtCursorPagination
\ No newline at end of file